@@ -1,46 +1,218 @@
+import argparse
 import time
-from src.extract_dataset import extract_huggingface_dataset
-from src.transform_data import transform_dataset
+from src.extract_dataset import extract_huggingface_dataset, extract_dataset_shards
+from src.transform_data import transform_dataset, transform_dataset_to_parquet
 from utils.file_handling import load_hf_dataset_as_parquet, polars_to_parquet
-from src.load_data_to_db import load_parquet_to_duckdb
-from utils.create_duckdb_table import create_grouped_table
+from src.load_data_to_db import load_parquet_to_duckdb, load_text_side_table
+from src.create_table import export_duckdb_tables_to_sqlite
+from src.query_service import publish_serving_snapshot
+from utils.create_duckdb_table import create_product_stats_table, create_top_products_table
+from utils.rollup_tables import create_rollup_table, ROLLUP_DIMENSIONS, KEYED_ROLLUP_DIMENSIONS
 from utils.write_duckdb_to_xls import export_table_to_excel
 from utils.insert_to_table import insert_product_url_from_web
+from utils.stage_cache import StageCache
+from utils.profiling import PipelineProfiler
+from utils.duckdb_session import DuckDBSession
+from utils.stage_scheduler import PipelineStage, StageScheduler
+from utils.file_handling import count_parquet_rows
+
+# Stage selection: --only runs just the named stages, --from a stage and everything downstream of it
+parser = argparse.ArgumentParser(description="Amazon reviews ETL pipeline")
+parser.add_argument("--only", nargs="+", metavar="STAGE", help="Run only these stages")
+parser.add_argument("--from", dest="from_stage", metavar="STAGE", help="Run this stage and everything after it")
+parser.add_argument("--workers", type=int, default=3, help="Stages that may run at the same time")
+parser.add_argument("--enrich-workers", type=int, default=8, help="Product URL searches in flight (1: one at a time)")
+parser.add_argument("--requests-per-second", type=float, default=None,
+                    help="Request rate limit per host for the URL searches (default: no limit)")
+args = parser.parse_args()
 
 # Measure the time taken
 start_time = time.time()
 
+# Stages are skipped when their inputs, parameters and code are unchanged since the last run
+stage_cache = StageCache("./data/output/stage_manifest.json")
+# Per-stage wall/CPU time, peak RSS, I/O and rows; duckdb_profiling=True also saves a profile per query
+profiler = PipelineProfiler("./data/output/metrics", duckdb_profiling=False)
+# The database file is opened once for the whole run; the settings also apply to the in-memory transform queries
+database_path = "./data/output/amazon_sales_db.duckDB"
+duckdb_session = DuckDBSession(database_path, threads=None, memory_limit=None,
+                               temp_directory="./data/tmp/duckdb").open()
+
 # # Step 1: Extract
 dataset_name = "kevykibbz/Amazon_Customer_Review_2023"
-dataset = extract_huggingface_dataset(dataset_name)
-
-# # Turn df to parquet file format
+# Direct mode scans the dataset's original Parquet shards instead of saving and re-encoding the dataset
+direct_shard_extraction = True
+shard_folder = "./data/raw/shards"
 parquet_dataset_path = "./data/output/amazon_reviews_table.parquet"
-parquet_path = load_hf_dataset_as_parquet(dataset, parquet_dataset_path)
+raw_parquet_path = shard_folder if direct_shard_extraction else parquet_dataset_path
+def extract(stage):
+    if direct_shard_extraction:
+        # The downloaded shards never change, so a rerun reuses them instead of downloading them again
+        stage_cache.run_stage("extract", extract_dataset_shards, dataset_name, shard_folder,
+                              outputs=[shard_folder], keep_outputs=[shard_folder])
+    else:
+        dataset = extract_huggingface_dataset(dataset_name)
+
+        # # Turn df to parquet file format
+        stage_cache.run_stage(
+            "extract", load_hf_dataset_as_parquet, dataset, parquet_dataset_path,
+            params={"dataset_name": dataset_name}, outputs=[parquet_dataset_path])
+    stage.rows_out = count_parquet_rows(raw_parquet_path)
 
 # # Step 2: Transform
-df_cleaned = transform_dataset(parquet_path)
+# Streaming mode writes the cleaned Parquet batch by batch instead of building the full DataFrame
+streaming_transform = True
+cleaned_parquet_path = "./data/output/amazon_reviews_df_cleaned.parquet"
+transform_code = ["src/text_normalizer.py"]
+def transform_to_parquet(raw_parquet_path, output_path):
+    return polars_to_parquet(transform_dataset(raw_parquet_path), output_path)
+
+# Hash dedup compares whole rows only where row hashes repeat, with its helper tables in a scratch file that can spill
+transform_options = {"dedup": "hash", "spill_db_path": "./data/tmp/transform_spill.duckdb"} if streaming_transform else {}
+# "ranking" keeps only the columns the post-processing needs; title/text/images go to a side file
+column_profile = "ranking"
+review_texts_path = "./data/output/amazon_reviews_texts.parquet"
+transform_outputs = [cleaned_parquet_path]
+if streaming_transform and column_profile != "full":
+    transform_options.update(column_profile=column_profile, side_table_path=review_texts_path)
+    transform_outputs.append(review_texts_path)
+
+def transform(stage):
+    stage.rows_in = count_parquet_rows(raw_parquet_path)
+    stage_cache.run_stage(
+        "transform", transform_dataset_to_parquet if streaming_transform else transform_to_parquet,
+        raw_parquet_path, cleaned_parquet_path,
+        inputs=[raw_parquet_path], upstream=["extract"], outputs=transform_outputs, code_files=transform_code,
+        **transform_options)
+    stage.rows_out = count_parquet_rows(cleaned_parquet_path)
 
 # # Step 3: Load
-parquet_path = polars_to_parquet(df_cleaned, "./data/output/amazon_reviews_df_cleaned.parquet")
-database_path = "./data/output/amazon_sales_db.duckDB"
 table_name = "amazon_reviews"
-load_parquet_to_duckdb(database_path, table_name, parquet_path)
+# asin, parent_asin and user_id are stored as integer keys into dim_product/dim_user (kept across runs),
+# so grouping and joins run on integers; amazon_reviews_decoded shows the original IDs
+surrogate_keys = True
+def load(stage):
+    stage.rows_in = count_parquet_rows(cleaned_parquet_path)
+    stage_cache.run_stage(
+        "load", load_parquet_to_duckdb, database_path, table_name, cleaned_parquet_path, column_profile=column_profile,
+        surrogate_keys=surrogate_keys,
+        inputs=[cleaned_parquet_path], upstream=["transform"], output_db_path=database_path, output_tables=[table_name])
+
+def load_texts(stage):
+    stage_cache.run_stage(
+        "load_texts", load_text_side_table, database_path, table_name, review_texts_path,
+        surrogate_keys=surrogate_keys,
+        inputs=[review_texts_path], upstream=["load"], output_db_path=database_path,
+        output_tables=[f"{table_name}_text"])
 
 # Post-processing
-# Create count of top product table
-top_product_table = create_grouped_table(
-    database_path, "top_products_count", group_column="asin", limit=10000, 
-    filter_column='rating', filter_operator = '=', filter_value=5)
+# Compute every product metric in one pass, then rank the top products by 5-star count from it
+stats_options = {"group_column": "asin_key", "dimension_table": "dim_product"} if surrogate_keys else {}
+def product_stats(stage):
+    stage_cache.run_stage(
+        "product_stats", create_product_stats_table, database_path, "product_stats", **stats_options,
+        upstream=["load"], output_db_path=database_path, output_tables=["product_stats"])
+
+# Product x rating x month rollup for dashboards; incremental loads refresh it from the new rows only
+def rollup(stage):
+    stage_cache.run_stage(
+        "rollup", create_rollup_table, database_path, "reviews_rollup_asin_rating_month",
+        dimensions=KEYED_ROLLUP_DIMENSIONS if surrogate_keys else ROLLUP_DIMENSIONS,
+        upstream=["load"], output_db_path=database_path, output_tables=["reviews_rollup_asin_rating_month"])
+
+top_product_table = "top_products_count"
+def group(stage):
+    stage_cache.run_stage(
+        "group", create_top_products_table,
+        database_path, top_product_table, "rating_5_count", metric_alias="count", limit=10000,
+        upstream=["product_stats"], output_db_path=database_path, output_tables=[top_product_table])
+
 excel_output_path = "./data/output/"
-export_table_to_excel(database_path, top_product_table, excel_output_path)
+def export_top_products(stage):
+    stage_cache.run_stage(
+        "export_top_products", export_table_to_excel, database_path, top_product_table, excel_output_path,
+        upstream=["group"], outputs=[f"{excel_output_path}{top_product_table}.xlsx"])
 
 input_table = top_product_table   # table with asin
 output_table = "product_url_table"
-insert_product_url_from_web(database_path, input_table, output_table)
-export_table_to_excel(database_path, output_table, excel_output_path)
+# The URLs found so far are exported every few flushes, so results are usable while the search runs
+partial_export_every = 5
+def export_partial_urls(processed):
+    export_partial_urls.flushes = getattr(export_partial_urls, "flushes", 0) + 1
+    if export_partial_urls.flushes % partial_export_every == 1:
+        export_table_to_excel(database_path, output_table, f"{excel_output_path}partial_")
+        scheduler.mark_output(f"partial {output_table} ({processed} searched)")
+
+# A rerun (after a crash or a new top-N table) resumes the job: finished searches are kept until their cached
+# result expires (cache_ttl_days, negative_ttl_days), only the rest run
+def enrich(stage):
+    stage_cache.run_stage(
+        "enrich", insert_product_url_from_web, database_path, input_table, output_table,
+        flush_size=100, on_flush=export_partial_urls, resume=True,
+        run_options={"max_workers": args.enrich_workers, "requests_per_second": args.requests_per_second},
+        upstream=["group"], output_db_path=database_path, output_tables=[output_table], keep_outputs=[output_table])
+
+def export_product_urls(stage):
+    stage_cache.run_stage(
+        "export_product_urls", export_table_to_excel, database_path, output_table, excel_output_path,
+        upstream=["enrich"], outputs=[f"{excel_output_path}{output_table}.xlsx"])
+
+# SQLite copy of the top-N and enrichment tables for consumers that cannot read DuckDB
+sqlite_output_path = f"{excel_output_path}amazon_top_products.sqlite"
+def export_sqlite(stage):
+    stage_cache.run_stage(
+        "export_sqlite", export_duckdb_tables_to_sqlite, database_path, [top_product_table, output_table],
+        sqlite_output_path, indexes={top_product_table: ["Product_ID"], output_table: ["Product_ID"]},
+        upstream=["group", "enrich"], outputs=[sqlite_output_path])
+
+# Read-only copy of the tables the query service answers from (python -m src.query_service serve);
+# published once the stats and rollup are complete and again with the URLs, never while a table is being rebuilt.
+# The service reloads it when it changes; a publish swaps the file in, so the old snapshot is kept until then
+serving_snapshot_path = "./data/output/serving_snapshot.duckdb"
+def publish_serving(stage):
+    stage_cache.run_stage(
+        "publish_serving", publish_serving_snapshot, database_path, serving_snapshot_path,
+        upstream=["product_stats", "rollup"], outputs=[serving_snapshot_path], keep_outputs=[serving_snapshot_path])
+
+def publish_serving_urls(stage):
+    stage_cache.run_stage(
+        "publish_serving_urls", publish_serving_snapshot, database_path, serving_snapshot_path,
+        upstream=["publish_serving", "enrich"], outputs=[serving_snapshot_path], keep_outputs=[serving_snapshot_path])
+
+# Independent branches run concurrently: the top-products export and the rollup overlap with the web search
+stages = [
+    PipelineStage("extract", extract),
+    PipelineStage("transform", transform, depends_on=["extract"]),
+    PipelineStage("load", load, depends_on=["transform"]),
+    PipelineStage("product_stats", product_stats, depends_on=["load"]),
+    PipelineStage("rollup", rollup, depends_on=["load"]),
+    PipelineStage("group", group, depends_on=["product_stats"]),
+    PipelineStage("export_top_products", export_top_products, depends_on=["group"], output=True),
+    PipelineStage("enrich", enrich, depends_on=["group"]),
+    PipelineStage("export_product_urls", export_product_urls, depends_on=["enrich"], output=True),
+    PipelineStage("export_sqlite", export_sqlite, depends_on=["group", "enrich"], output=True),
+    PipelineStage("publish_serving", publish_serving, depends_on=["product_stats", "rollup"], output=True),
+    PipelineStage("publish_serving_urls", publish_serving_urls, depends_on=["publish_serving", "enrich"]),
+]
+if review_texts_path in transform_outputs:
+    stages.append(PipelineStage("load_texts", load_texts, depends_on=["load"]))
+scheduler = StageScheduler(stages, max_workers=args.workers, profiler=profiler)
+try:
+    # Stages left out by --only/--from must have run before, since their manifest entries feed the fingerprints
+    try:
+        selected = scheduler.select_stages(args.only, args.from_stage)
+    except ValueError as e:
+        parser.error(str(e))
+    not_run = sorted({dependency for name in selected for dependency in scheduler.stages[name].depends_on
+                      if dependency not in selected and dependency not in stage_cache.manifest["stages"]})
+    if not_run:
+        parser.error(f"stages {not_run} have not run yet; run them first or include them in --only/--from")
+    scheduler.run(only=args.only, from_stage=args.from_stage)
+finally:
+    duckdb_session.close()
+    profiler.write_report()
 
 end_time = time.time()
 
 # Calculate how long it takes to run the script
-print(f"Time taken for extraction, transformation, loading and post-processing of data: {end_time - start_time} seconds")
\ No newline at end of file
+print(f"Time taken for extraction, transformation, loading and post-processing of data: {end_time - start_time} seconds")
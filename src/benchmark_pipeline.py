@@ -0,0 +1,349 @@
+import json
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import pyarrow.parquet as pq
+from utils.duckdb_session import connect_to_duckdb
+from utils.profiling import measure_peak_memory
+
+# Row counts the suite runs at by default
+BENCHMARK_SCALES = (1_000_000, 10_000_000, 50_000_000)
+
+# Stages benchmarked in pipeline order; each stage reads what the previous one wrote
+BENCHMARK_STAGES = ("transform", "load", "group", "export")
+
+# Pipeline configurations the stages are benchmarked with. "pipeline" is what etl_main runs: hash dedup,
+# the "ranking" column profile with a text side file, surrogate keys and top-N from product_stats.
+# "exact_full" is the functions' defaults: exact dedup of full rows, string keys and a direct group-by.
+BENCHMARK_CONFIGS = ("pipeline", "exact_full")
+
+REVIEW_WORDS = ["great", "product", "works", "as", "described", "would", "buy", "again", "battery", "life",
+                "poor", "quality", "love", "it", "size", "fits", "perfectly", "fast", "shipping", "cheap"]
+
+
+def generate_synthetic_reviews(
+    parquet_path: str,
+    num_rows: int,
+    duplicate_rate: float = 0.01,
+    null_rate: float = 0.01,
+    blank_id_rate: float = 0.005,
+    unverified_rate: float = 0.08,
+    num_products: int = None,
+    num_users: int = None,
+    seed: int = 42,
+    row_group_size: int = 122_880
+):
+    """
+    Write a synthetic review Parquet file with the schema of the Amazon_Customer_Review_2023 dataset.
+
+    Columns: rating, title, text, images, asin, parent_asin, user_id, timestamp, helpful_vote,
+    verified_purchase. Every value is derived from a hash of the row's key and the seed, so the
+    same arguments always produce the same file. Duplicated rows reuse the key of another row
+    and are therefore exact copies. Product popularity is skewed so a few products get most reviews.
+
+    Args:
+        parquet_path (str): Parquet file to create (skipped if it already exists)
+        num_rows (int): Number of rows
+        duplicate_rate (float): Fraction of rows that are exact copies of another row
+        null_rate (float): Fraction of NULLs in each nullable column (both product ids NULL at this rate too)
+        blank_id_rate (float): Fraction of rows where both product ids are whitespace/empty
+        unverified_rate (float): Fraction of rows with verified_purchase = FALSE
+        num_products (int): Distinct products (default num_rows / 50)
+        num_users (int): Distinct users (default num_rows / 5)
+        seed (int): Random seed
+        row_group_size (int): Rows per Parquet row group
+
+    Returns:
+        str: Path to the Parquet file
+    """
+    if os.path.exists(parquet_path):
+        print(f"Synthetic dataset {parquet_path} already exists. Skipping generation.")
+        return parquet_path
+    os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+
+    num_products = num_products or max(num_rows // 50, 1)
+    num_users = num_users or max(num_rows // 5, 1)
+    words = ", ".join(f"'{word}'" for word in REVIEW_WORDS)
+
+    # h(tag, n) is an integer in [0, n) and u(tag) a number in [0, 1), derived from the row key, the seed and a tag
+    def h(tag, modulus, *extra):
+        return f"CAST(hash(k, {seed}, '{tag}'{''.join(', ' + e for e in extra)}) % {modulus} AS BIGINT)"
+
+    def u(tag):
+        return f"({h(tag, 1_000_000)} / 1000000.0)"
+
+    def nullable(tag, expr):
+        return f"CASE WHEN {u(tag)} < {null_rate} THEN NULL ELSE {expr} END"
+
+    def sentence(tag, min_words, max_words):
+        # Words separated mostly by single spaces, sometimes by tabs, newlines or space runs like real reviews
+        return f"""array_to_string(list_transform(
+            range({min_words} + {h(tag + '_len', max_words - min_words + 1)}),
+            lambda j: ([{words}])[1 + {h(tag, len(REVIEW_WORDS), 'j')}]
+                 || CASE {h(tag + '_sep', 40, 'j')} WHEN 0 THEN '\t' WHEN 1 THEN '\n' WHEN 2 THEN '   '
+                         ELSE ' ' END), '')"""
+
+    product = f"CAST(floor({num_products} * pow({u('product')}, 2)) AS BIGINT)"
+    both_ids_null = f"{u('ids_null')} < {null_rate}"
+    both_ids_blank = f"{u('ids_blank')} < {blank_id_rate}"
+
+    con = connect_to_duckdb()
+    tmp_path = parquet_path + ".tmp"
+    try:
+        con.execute(f"""
+        COPY (
+            WITH keys AS (
+                SELECT CASE WHEN (hash(i, {seed}, 'dup') % 1000000) / 1000000.0 < {duplicate_rate}
+                            THEN CAST(hash(i, {seed}, 'dup_of') % {num_rows} AS BIGINT)
+                            ELSE i END AS k
+                FROM range({num_rows}) t(i)
+            )
+            SELECT
+                {nullable('rating', f"CAST(1 + floor(5 * pow({u('rating_value')}, 0.4)) AS DOUBLE)")} AS rating,
+                {nullable('title', sentence('title', 1, 8))} AS title,
+                {nullable('text', sentence('text', 5, 60))} AS text,
+                CASE WHEN {u('images')} < 0.05
+                     THEN [{{'attachment_type': 'IMAGE',
+                             'large_image_url': 'https://m.media-amazon.com/images/I/' || k || '._SL1600_.jpg',
+                             'medium_image_url': 'https://m.media-amazon.com/images/I/' || k || '._SL800_.jpg',
+                             'small_image_url': 'https://m.media-amazon.com/images/I/' || k || '._SL256_.jpg'}}]
+                     ELSE [] END AS images,
+                CASE WHEN {both_ids_null} THEN NULL WHEN {both_ids_blank} THEN ' '
+                     ELSE 'B' || lpad(CAST({product} AS VARCHAR), 9, '0') END AS asin,
+                CASE WHEN {both_ids_null} THEN NULL WHEN {both_ids_blank} THEN ''
+                     ELSE 'P' || lpad(CAST({product} // 3 AS VARCHAR), 9, '0') END AS parent_asin,
+                'U' || lpad(CAST({h('user', num_users)} AS VARCHAR), 27, '0') AS user_id,
+                1262304000000 + {h('timestamp', 441_504_000_000)} AS "timestamp",
+                CAST(floor(pow({u('helpful')}, 8) * 200) AS BIGINT) AS helpful_vote,
+                {nullable('verified', f"{u('verified_value')} >= {unverified_rate}")} AS verified_purchase
+            FROM keys
+        ) TO '{tmp_path}' (FORMAT parquet, ROW_GROUP_SIZE {row_group_size})
+        """)
+        os.replace(tmp_path, parquet_path)
+    finally:
+        con.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    print(f"Synthetic dataset with {num_rows} rows written to {parquet_path}")
+    return parquet_path
+
+
+def run_benchmark_stage(stage: str, paths: dict, config: str = "pipeline"):
+    """
+    Run one pipeline stage on the benchmark files and return its rows in, runtime and peak RSS.
+
+    Args:
+        stage (str): One of BENCHMARK_STAGES
+        paths (dict): raw, cleaned, texts, spill, db and export paths of the benchmark run
+        config (str): One of BENCHMARK_CONFIGS
+
+    Returns:
+        dict: {"rows", "seconds", "peak_rss_mb"}
+    """
+    # Imported here so each stage runs with a fresh import in its own worker process
+    from src.transform_data import transform_dataset_to_parquet
+    from src.load_data_to_db import load_parquet_to_duckdb
+    from utils.create_duckdb_table import create_grouped_table, create_product_stats_table, create_top_products_table
+    from utils.write_duckdb_to_xls import export_table_to_excel
+
+    if config not in BENCHMARK_CONFIGS:
+        raise ValueError(f"Unknown benchmark config '{config}'. Expected one of {BENCHMARK_CONFIGS}.")
+    pipeline = config == "pipeline"
+
+    def product_stats_top_products(db_path):
+        create_product_stats_table(db_path, "product_stats", group_column="asin_key", dimension_table="dim_product")
+        return create_top_products_table(db_path, "top_products_count", "rating_5_count", metric_alias="count",
+                                         limit=10000)
+
+    if stage == "transform":
+        rows = pq.ParquetFile(paths["raw"]).metadata.num_rows
+        fn, args = transform_dataset_to_parquet, (paths["raw"], paths["cleaned"])
+        kwargs = {"dedup": "hash", "spill_db_path": paths["spill"], "column_profile": "ranking",
+                  "side_table_path": paths["texts"]} if pipeline else {}
+    elif stage == "load":
+        rows = pq.ParquetFile(paths["cleaned"]).metadata.num_rows
+        fn, args = load_parquet_to_duckdb, (paths["db"], "amazon_reviews", paths["cleaned"])
+        kwargs = {"column_profile": "ranking", "surrogate_keys": True} if pipeline else {}
+    elif stage == "group":
+        rows = pq.ParquetFile(paths["cleaned"]).metadata.num_rows
+        if pipeline:
+            fn, args, kwargs = product_stats_top_products, (paths["db"],), {}
+        else:
+            fn, args = create_grouped_table, (paths["db"], "top_products_count")
+            kwargs = {"group_column": "asin", "limit": 10000,
+                      "filter_column": "rating", "filter_operator": "=", "filter_value": 5}
+    elif stage == "export":
+        con = connect_to_duckdb(paths["db"], read_only=True)
+        rows = con.execute("SELECT COUNT(*) FROM top_products_count").fetchone()[0]
+        con.close()
+        fn, args, kwargs = export_table_to_excel, (paths["db"], "top_products_count", paths["export"]), {}
+    else:
+        raise ValueError(f"Unknown benchmark stage '{stage}'. Expected one of {BENCHMARK_STAGES}.")
+
+    _result, seconds, peak_rss = measure_peak_memory(fn, *args, **kwargs)
+    return {"rows": rows, "seconds": round(seconds, 3), "peak_rss_mb": round(peak_rss / 1024**2, 1)}
+
+
+def current_commit():
+    """Returns the git commit of the working tree (suffixed with '-dirty' if it has changes), or 'unknown'."""
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_dir,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo_dir,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def load_benchmark_history(history_path: str):
+    """Returns every benchmark record of the JSON Lines history file (empty list if it does not exist)."""
+    if not os.path.exists(history_path):
+        return []
+    with open(history_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_baseline(history, record, baseline_commit: str = None):
+    """
+    Returns the most recent earlier record of the same stage, config and dataset from another commit
+    (or from baseline_commit if given), or None.
+    """
+    keys = ("stage", "num_rows", "duplicate_rate", "null_rate")
+    for previous in reversed(history):
+        if any(previous[key] != record[key] for key in keys):
+            continue
+        # Records from before configs were benchmarked ran the functions' defaults
+        if previous.get("config", "exact_full") != record["config"]:
+            continue
+        if baseline_commit is not None:
+            if previous["commit"] == baseline_commit:
+                return previous
+        elif previous["commit"] != record["commit"]:
+            return previous
+    return None
+
+
+def compare_to_baseline(record, baseline, threshold: float = 0.10):
+    """
+    Flag throughput drops and peak RSS increases of more than threshold against the baseline.
+
+    Returns:
+        list: Regression messages (empty if none)
+    """
+    if baseline is None:
+        return []
+    regressions = []
+    if record["rows_per_second"] < baseline["rows_per_second"] * (1 - threshold):
+        regressions.append(f"throughput {baseline['rows_per_second']:.0f} -> {record['rows_per_second']:.0f} rows/s")
+    if record["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + threshold):
+        regressions.append(f"peak RSS {baseline['peak_rss_mb']} -> {record['peak_rss_mb']} MiB")
+    return regressions
+
+
+def run_benchmark_suite(
+    scales=BENCHMARK_SCALES,
+    stages=BENCHMARK_STAGES,
+    configs=BENCHMARK_CONFIGS,
+    work_dir: str = "./data/benchmark",
+    history_path: str = "./data/benchmark/history.jsonl",
+    duplicate_rate: float = 0.01,
+    null_rate: float = 0.01,
+    baseline_commit: str = None,
+    threshold: float = 0.10,
+    seed: int = 42
+):
+    """
+    Run the pipeline stages on synthetic datasets of every scale and track regressions across commits.
+
+    Synthetic datasets are generated once per scale/rate combination and reused by later runs.
+    The stages run once per configuration in configs, each in its own run folder. Every stage runs
+    in its own worker process, so peak RSS is per stage. Results are appended to
+    a JSON Lines history tagged with the git commit and compared with the latest run of another
+    commit (or baseline_commit). Nothing is downloaded.
+
+    Args:
+        scales (tuple): Row counts to benchmark
+        stages (tuple): Stages to run, in pipeline order (subset of BENCHMARK_STAGES)
+        configs (tuple): Pipeline configurations to run the stages with (subset of BENCHMARK_CONFIGS)
+        work_dir (str): Folder for the synthetic datasets and stage outputs
+        history_path (str): JSON Lines file the results are appended to
+        duplicate_rate (float): Fraction of duplicated rows in the synthetic data
+        null_rate (float): Fraction of NULLs per nullable column in the synthetic data
+        baseline_commit (str): Commit to compare against (default: the previous benchmarked commit)
+        threshold (float): Relative throughput drop / memory increase reported as a regression
+        seed (int): Random seed of the synthetic data
+
+    Returns:
+        list: Benchmark records, each with a "regressions" list
+    """
+    history = load_benchmark_history(history_path)
+    commit = current_commit()
+    records = []
+
+    for num_rows in scales:
+        dataset_name = f"reviews_{num_rows}_dup{duplicate_rate}_null{null_rate}_seed{seed}"
+        raw_path = generate_synthetic_reviews(os.path.join(work_dir, "datasets", f"{dataset_name}.parquet"),
+                                              num_rows, duplicate_rate=duplicate_rate, null_rate=null_rate, seed=seed)
+        for config in configs:
+            # Stage outputs are rebuilt on every run so each stage does its full work
+            run_dir = os.path.join(work_dir, "runs", dataset_name, config)
+            paths = {
+                "raw": raw_path,
+                "cleaned": os.path.join(run_dir, "cleaned.parquet"),
+                "texts": os.path.join(run_dir, "texts.parquet"),
+                "spill": os.path.join(run_dir, "transform_spill.duckdb"),
+                "db": os.path.join(run_dir, "benchmark.duckdb"),
+                "export": run_dir + os.sep,
+            }
+            os.makedirs(run_dir, exist_ok=True)
+            for path in (paths["cleaned"], paths["texts"], paths["db"], paths["db"] + ".wal"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+            for stage in stages:
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    stats = pool.submit(run_benchmark_stage, stage, paths, config).result()
+                record = {
+                    "commit": commit,
+                    "run_at": datetime.now().isoformat(timespec="seconds"),
+                    "stage": stage,
+                    "config": config,
+                    "num_rows": num_rows,
+                    "duplicate_rate": duplicate_rate,
+                    "null_rate": null_rate,
+                    "rows": stats["rows"],
+                    "seconds": stats["seconds"],
+                    "rows_per_second": round(stats["rows"] / stats["seconds"], 1) if stats["seconds"] else None,
+                    "peak_rss_mb": stats["peak_rss_mb"],
+                }
+                baseline = find_baseline(history, record, baseline_commit)
+                record["baseline_commit"] = baseline["commit"] if baseline else None
+                record["regressions"] = compare_to_baseline(record, baseline, threshold)
+                records.append(record)
+
+                os.makedirs(os.path.dirname(os.path.abspath(history_path)), exist_ok=True)
+                with open(history_path, "a") as f:
+                    f.write(json.dumps({key: value for key, value in record.items() if key != "regressions"}) + "\n")
+
+    print(f"\nBenchmark results for commit {commit}:")
+    for record in records:
+        status = "REGRESSION: " + "; ".join(record["regressions"]) if record["regressions"] else "ok"
+        print(f"{record['stage']:<10} {record['config']:<10} {record['num_rows']:>12} rows {record['seconds']:>10} s "
+              f"{record['rows_per_second']:>14} rows/s {record['peak_rss_mb']:>10} MiB  "
+              f"(vs {record['baseline_commit'] or 'no baseline'}) {status}")
+    return records
+
+""" EXAMPLE USAGE
+from src.benchmark_pipeline import generate_synthetic_reviews, run_benchmark_suite
+
+generate_synthetic_reviews("./data/benchmark/datasets/reviews_1m.parquet", 1_000_000, duplicate_rate=0.02, null_rate=0.05)
+# Quick check at 1M rows, compared with the previous benchmarked commit
+run_benchmark_suite(scales=(1_000_000,))
+# Only the configuration etl_main runs
+run_benchmark_suite(scales=(1_000_000,), configs=("pipeline",))
+# Full suite at 1M/10M/50M rows, compared with a given commit
+run_benchmark_suite(baseline_commit="220229d") """
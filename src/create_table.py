@@ -1,5 +1,11 @@
+import json
+import os
 import sqlite3
+import time
 import pandas as pd
+import polars as pl
+import pyarrow as pa
+from utils.duckdb_session import connect_to_duckdb
 
 def build_create_table_query(df, table_name: str, id_primary_key: bool = True):
     """
@@ -74,4 +80,275 @@ def create_table_in_sqlite(db_path: str, create_table_sql: str, table_name):
 db_path = 'data/db/sales_database.db'
 table_name = "amazon_reviews"
 create_sql_query = build_create_table_query(df, table_name)
-create_table_in_sqlite(db_path, create_sql_query, table_name) """
\ No newline at end of file
+create_table_in_sqlite(db_path, create_sql_query, table_name) """
+
+
+def arrow_type_to_sqlite(arrow_type):
+    """
+    Map an Arrow type to a SQLite column type.
+
+    Integers and booleans become INTEGER (True -> 1), floats and decimals REAL, binary BLOB.
+    Dates, times and timestamps are stored as ISO strings and lists/structs/maps as JSON, both TEXT.
+    """
+    if pa.types.is_dictionary(arrow_type):
+        return arrow_type_to_sqlite(arrow_type.value_type)
+    if pa.types.is_integer(arrow_type) or pa.types.is_boolean(arrow_type) or pa.types.is_duration(arrow_type):
+        return "INTEGER"
+    if pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type):
+        return "REAL"
+    if pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type) or pa.types.is_fixed_size_binary(arrow_type):
+        return "BLOB"
+    return "TEXT"
+
+
+def build_create_table_query_from_schema(schema, table_name: str, id_primary_key: bool = False):
+    """
+    Build a CREATE TABLE SQL query from an Arrow schema (e.g. df.to_arrow().schema for a Polars DataFrame).
+
+    Args:
+        schema (pyarrow.Schema): Schema to map with arrow_type_to_sqlite
+        table_name (str): Name of the table to create
+        id_primary_key (bool): Whether to add an auto-increment 'id' primary key column
+
+    Returns:
+        str: CREATE TABLE SQL query
+    """
+    columns_sql = ", ".join(f'"{field.name}" {arrow_type_to_sqlite(field.type)}' for field in schema)
+    if id_primary_key:
+        columns_sql = "id INTEGER PRIMARY KEY AUTOINCREMENT, " + columns_sql
+    return f'CREATE TABLE IF NOT EXISTS "{table_name}" ({columns_sql});'
+
+
+def arrow_column_to_sqlite_values(column, con):
+    """
+    Convert an Arrow column to a list of values sqlite3 can bind, following arrow_type_to_sqlite.
+
+    Casts are done vectorized in Arrow (nested values are rendered as JSON by DuckDB on con) and the
+    Python values are built by Polars, which is several times faster than pyarrow's to_pylist.
+    """
+    column_type = column.type
+    if pa.types.is_dictionary(column_type):
+        return arrow_column_to_sqlite_values(column.cast(column_type.value_type), con)
+    if pa.types.is_timestamp(column_type) or pa.types.is_date(column_type) or pa.types.is_time(column_type):
+        column = column.cast(pa.string())
+    elif pa.types.is_decimal(column_type):
+        column = column.cast(pa.float64())
+    elif pa.types.is_duration(column_type):
+        column = column.cast(pa.int64())
+    elif pa.types.is_nested(column_type):
+        con.register("nested_column", pa.table({"value": column}))
+        column = con.execute("SELECT CAST(to_json(value) AS VARCHAR) AS value FROM nested_column").fetch_arrow_table()["value"]
+        con.unregister("nested_column")
+    return pl.from_arrow(column).to_list()
+
+
+def as_record_batch_reader(data, batch_size: int = 100_000):
+    """Returns a RecordBatchReader for a Polars DataFrame, pandas DataFrame, Arrow table or reader."""
+    if isinstance(data, pa.RecordBatchReader):
+        return data
+    if isinstance(data, pl.DataFrame):
+        data = data.to_arrow()
+    elif isinstance(data, pd.DataFrame):
+        data = pa.Table.from_pandas(data, preserve_index=False)
+    return data.to_reader(max_chunksize=batch_size)
+
+
+def write_arrow_to_sqlite(
+    data,
+    db_path: str,
+    table_name: str,
+    indexes=(),
+    batch_size: int = 100_000,
+    rows_per_transaction: int = 1_000_000,
+    replace: bool = True
+):
+    """
+    Bulk load Arrow record batches into a SQLite table.
+
+    Batches are converted column-wise and inserted with executemany inside large transactions.
+    The journal is switched to WAL with synchronous=OFF for the load (a crash during the load can
+    lose the new rows, but not corrupt the database); afterwards the WAL is checkpointed and the
+    previous journal mode restored. If the load fails, the open transaction is rolled back and the
+    connection is still restored and closed.
+    With replace, the rows are loaded into '<table_name>__loading' and swapped in with the indexes in
+    one transaction, so readers see either the old or the new table and a failed load keeps the old one.
+    Indexes are created after the rows are in, which is much faster than maintaining them per insert.
+
+    Args:
+        data: Polars/pandas DataFrame, pyarrow Table or RecordBatchReader
+        db_path (str): Path to the SQLite database file
+        table_name (str): Table to create
+        indexes (list): Columns (or tuples of columns) to index after the load
+        batch_size (int): Rows per executemany call
+        rows_per_transaction (int): Rows inserted before each COMMIT
+        replace (bool): Replace the table if it exists (otherwise rows are appended)
+
+    Returns:
+        int: Number of rows written
+    """
+    reader = as_record_batch_reader(data, batch_size)
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    # The new rows go to a loading table first when they replace the table
+    load_table = f"{table_name}__loading" if replace else table_name
+    # In-memory DuckDB connection used to render nested columns as JSON
+    convert_con = None
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -262144")  # 256 MiB page cache
+
+        if replace:
+            conn.execute(f'DROP TABLE IF EXISTS "{load_table}"')
+        conn.execute(build_create_table_query_from_schema(reader.schema, load_table))
+        placeholders = ", ".join("?" for _ in reader.schema)
+        insert_sql = f'INSERT INTO "{load_table}" VALUES ({placeholders})'
+
+        convert_con = connect_to_duckdb()
+        num_rows = 0
+        rows_in_transaction = 0
+        conn.execute("BEGIN")
+        for batch in reader:
+            columns = [arrow_column_to_sqlite_values(column, convert_con) for column in batch.columns]
+            conn.executemany(insert_sql, zip(*columns))
+            num_rows += batch.num_rows
+            rows_in_transaction += batch.num_rows
+            if rows_in_transaction >= rows_per_transaction:
+                conn.execute("COMMIT")
+                conn.execute("BEGIN")
+                rows_in_transaction = 0
+        conn.execute("COMMIT")
+
+        # Swap the loaded table in; the index names follow table_name, so they are created after the rename
+        conn.execute("BEGIN")
+        if replace:
+            conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+            conn.execute(f'ALTER TABLE "{load_table}" RENAME TO "{table_name}"')
+        for index_columns in indexes:
+            index_columns = (index_columns,) if isinstance(index_columns, str) else tuple(index_columns)
+            index_name = f"idx_{table_name}_{'_'.join(index_columns)}"
+            column_list = ", ".join(f'"{col}"' for col in index_columns)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({column_list})')
+        conn.execute("COMMIT")
+        if indexes:
+            conn.execute("ANALYZE")
+    except Exception:
+        # Only the open transaction is lost; when appending, batches committed before the failure stay
+        # in the table, when replacing, the partly loaded table is dropped and the old one is kept
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        if replace:
+            conn.execute(f'DROP TABLE IF EXISTS "{load_table}"')
+        raise
+    finally:
+        if convert_con is not None:
+            convert_con.close()
+        # Also after a failure: durable writes again, the WAL folded back into the database file
+        # and the journal mode the database had before
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        try:
+            restored_mode = conn.execute(f"PRAGMA journal_mode = {journal_mode}").fetchone()[0]
+        except sqlite3.OperationalError:
+            restored_mode = "wal"
+        if restored_mode != journal_mode:
+            # Leaving WAL needs the database to itself; with other connections open it stays in WAL
+            print(f"SQLite database {db_path} is in use; journal mode left at WAL.")
+        conn.close()
+    print(f"{num_rows} rows written to SQLite table '{table_name}' in {db_path}")
+    return num_rows
+
+
+def export_duckdb_tables_to_sqlite(duckdb_path: str, tables, sqlite_path: str, indexes=None, batch_size: int = 100_000):
+    """
+    Copy DuckDB tables (e.g. the top-N and enrichment tables) into a SQLite database, streaming Arrow batches.
+
+    Args:
+        duckdb_path (str): Path to the DuckDB database file
+        tables (list): Tables to copy (same names in SQLite, replaced if they exist)
+        sqlite_path (str): Path to the SQLite database file
+        indexes (dict): Table -> columns to index in SQLite after the load (optional)
+        batch_size (int): Rows per Arrow batch
+
+    Returns:
+        dict: Table -> number of rows written
+    """
+    indexes = indexes or {}
+    con = connect_to_duckdb(duckdb_path)
+    rows_written = {}
+    try:
+        for table_name in tables:
+            reader = con.execute(f"SELECT * FROM {table_name}").fetch_record_batch(batch_size)
+            rows_written[table_name] = write_arrow_to_sqlite(reader, sqlite_path, table_name,
+                                                             indexes=indexes.get(table_name, ()),
+                                                             batch_size=batch_size)
+    finally:
+        con.close()
+    return rows_written
+
+
+def benchmark_sqlite_load(num_rows: int = 1_000_000, output_dir: str = "./data/benchmark/sqlite/"):
+    """
+    Compare the rows/sec of write_arrow_to_sqlite with pandas DataFrame.to_sql on a table shaped like
+    product_url_table plus a datetime and a list column.
+
+    Args:
+        num_rows (int): Rows in the sample table
+        output_dir (str): Folder for the SQLite files
+
+    Returns:
+        dict: method -> {"seconds", "rows_per_second"}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    con = connect_to_duckdb()
+    sample = con.execute(f"""
+        SELECT
+            'B' || lpad(CAST(i AS VARCHAR), 9, '0') AS Product_ID,
+            CAST(hash(i) % 5000 AS BIGINT) AS count,
+            'Stanley Quencher H2.0 Tumbler with Handle and Straw 30 oz ' || i AS Product_Name,
+            'https://www.amazon.ca/dp/B' || lpad(CAST(i AS VARCHAR), 9, '0') AS URL,
+            TIMESTAMP '2023-01-01' + to_seconds(CAST(i AS BIGINT)) AS first_review_at,
+            [CAST(i % 5 + 1 AS INTEGER), CAST(i % 3 + 1 AS INTEGER)] AS ratings
+        FROM range({num_rows}) t(i)
+    """).fetch_arrow_table()
+    con.close()
+
+    def load_with_pandas(db_path):
+        df = sample.to_pandas()
+        df["ratings"] = df["ratings"].map(lambda value: json.dumps(value.tolist()))
+        conn = sqlite3.connect(db_path)
+        df.to_sql("products", conn, if_exists="replace", index=False)
+        conn.execute('CREATE INDEX idx_products_Product_ID ON products ("Product_ID")')
+        conn.commit()
+        conn.close()
+
+    methods = {
+        "pandas_to_sql": load_with_pandas,
+        "arrow_executemany": lambda db_path: write_arrow_to_sqlite(sample, db_path, "products", indexes=["Product_ID"]),
+    }
+    report = {}
+    for method, load in methods.items():
+        db_path = os.path.join(output_dir, f"{method}.sqlite")
+        for path in (db_path, db_path + "-wal", db_path + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        start_time = time.time()
+        load(db_path)
+        seconds = time.time() - start_time
+        report[method] = {"seconds": round(seconds, 2), "rows_per_second": round(num_rows / seconds)}
+        print(f"{method:<18} {num_rows} rows in {seconds:.2f} s ({num_rows / seconds:,.0f} rows/sec)")
+    return report
+
+""" EXAMPLE USAGE
+# SQLite copy of the top-N and enrichment tables for downstream consumers
+export_duckdb_tables_to_sqlite("./data/output/amazon_sales_db.duckDB", ["top_products_count", "product_url_table"],
+                               "./data/output/amazon_top_products.sqlite",
+                               indexes={"top_products_count": ["Product_ID"], "product_url_table": ["Product_ID"]})
+# Any Polars DataFrame, with datetime and list columns
+write_arrow_to_sqlite(df_cleaned, "data/db/sales_database.db", "amazon_reviews", indexes=["asin", ("user_id", "timestamp")])
+benchmark_sqlite_load(1_000_000) """
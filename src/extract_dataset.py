@@ -1,6 +1,9 @@
+import glob
 import os
+import shutil
 import time
 from datasets import load_dataset
+from utils.file_handling import EXPORT_SUCCESS_MARKER
 
 def extract_huggingface_dataset(dataset_name: str, dataset_folder: str = './data/raw', retries: int = 5, wait_time: int = 7):
     """
@@ -58,9 +61,133 @@ def extract_huggingface_dataset(dataset_name: str, dataset_folder: str = './data
     
     return dataset
 
+def find_split_shards(dataset_dir: str, split: str = "train", extension: str = "parquet"):
+    """
+    Returns the sorted shard files of a split inside a downloaded dataset folder.
+
+    Matches the common hub layouts: data/train-00000-of-00010.parquet, <config>/train/0000.parquet
+    and save_to_disk folders (train/data-00000-of-00004.arrow).
+    """
+    files = glob.glob(os.path.join(dataset_dir, "**", f"*.{extension}"), recursive=True)
+    split_files = [
+        path for path in files
+        if os.path.basename(path).startswith(f"{split}-")
+        or split in os.path.relpath(os.path.dirname(path), dataset_dir).split(os.sep)
+    ]
+    return sorted(split_files)
+
+
+def link_shards(shard_paths, shard_folder: str):
+    """
+    Expose shard files in one folder without copying them: hard link, else symlink, else copy.
+    Shards already in the folder are kept; a copy is written to a temporary file and renamed,
+    so an interrupted copy is never mistaken for a shard.
+
+    Returns:
+        str: The shard folder
+    """
+    os.makedirs(shard_folder, exist_ok=True)
+    for index, shard_path in enumerate(shard_paths):
+        target = os.path.join(shard_folder, f"{index:05d}-{os.path.basename(shard_path)}")
+        if os.path.exists(target):
+            continue
+        source = os.path.realpath(shard_path)
+        try:
+            os.link(source, target)
+        except OSError:
+            try:
+                os.symlink(source, target)
+            except OSError:
+                print(f"Could not link {source}, copying it instead.")
+                shutil.copyfile(source, target + ".tmp")
+                os.replace(target + ".tmp", target)
+    return shard_folder
+
+
+def extract_dataset_shards(dataset_name: str, shard_folder: str = './data/raw/shards', split: str = "train",
+                           local_dir: str = None, retries: int = 5, wait_time: int = 7):
+    """
+    Get the Parquet shards of a Hugging Face dataset split without converting them.
+
+    Instead of load_dataset -> save_to_disk -> load_dataset -> to_parquet, the original Parquet
+    shards are downloaded to the hub cache (or taken from local_dir) and linked into shard_folder.
+    DuckDB and Polars scan that folder directly. A _SUCCESS marker is written once every shard is
+    in place, and only a folder with the marker is reused, so an interrupted run is completed.
+    If the dataset repository has no Parquet files, the hub's auto-converted Parquet branch is used.
+
+    Args:
+        dataset_name (str): Name of the Hugging Face dataset (e.g., "kevykibbz/Amazon_Customer_Review_2023").
+        shard_folder (str, optional): Folder exposing the split's shards. Defaults to './data/raw/shards'.
+        split (str, optional): Split to extract. Defaults to 'train'.
+        local_dir (str, optional): Local folder standing in for the hub (no download).
+        retries (int, optional): Number of download retries if the download fails. Defaults to 5.
+        wait_time (int, optional): Seconds to wait between retries. Defaults to 7.
+
+    Returns:
+        str: Folder containing the split's Parquet shards.
+    """
+    success_marker = os.path.join(shard_folder, EXPORT_SUCCESS_MARKER)
+    if os.path.isfile(success_marker):
+        print(f"Shards found in {shard_folder}. Skipping download.")
+        return shard_folder
+
+    if local_dir is not None:
+        shard_paths = find_split_shards(local_dir, split)
+    else:
+        from huggingface_hub import snapshot_download
+        shard_paths = []
+        for revision in (None, "refs/convert/parquet"):
+            for attempt in range(1, retries + 1):
+                try:
+                    snapshot_dir = snapshot_download(dataset_name, repo_type="dataset", revision=revision,
+                                                     allow_patterns=["*.parquet"])
+                    break
+                except Exception as e:
+                    print(f"Attempt {attempt}/{retries} failed: {e}")
+                    if attempt < retries:
+                        print(f"Retrying in {wait_time} seconds...")
+                        time.sleep(wait_time)
+                    else:
+                        raise RuntimeError(f"Failed to download dataset after {retries} attempts.")
+            shard_paths = find_split_shards(snapshot_dir, split)
+            if shard_paths:
+                break
+
+    if not shard_paths:
+        raise FileNotFoundError(f"No Parquet shards found for split '{split}' of {dataset_name}.")
+
+    link_shards(shard_paths, shard_folder)
+    # Mark the folder as complete
+    open(success_marker, "w").close()
+    print(f"{len(shard_paths)} '{split}' shards available in {shard_folder}")
+    return shard_folder
+
+
+def load_arrow_shards(dataset_path: str, split: str = "train"):
+    """
+    Memory-map the Arrow files of a dataset saved with save_to_disk (or the datasets cache) as one
+    zero-copy pyarrow Table, e.g. to register it with DuckDB or pass it to pl.from_arrow.
+
+    Args:
+        dataset_path (str): Folder with the dataset's .arrow files
+        split (str): Split to load
+
+    Returns:
+        pyarrow.Table: Memory-mapped table of the split
+    """
+    from utils.file_handling import read_memory_mapped_arrow
+
+    arrow_files = find_split_shards(dataset_path, split, extension="arrow")
+    if not arrow_files:
+        raise FileNotFoundError(f"No Arrow files found for split '{split}' in {dataset_path}.")
+    return read_memory_mapped_arrow(arrow_files)
+
 """ EXAMPLE USAGE
 from extract_dataset import extract_huggingface_dataset
 
 dataset_name = "kevykibbz/Amazon_Customer_Review_2023"
 dataset = extract_huggingface_dataset(dataset_name)
+
+# Use the dataset's Parquet shards directly (no save_to_disk or Parquet re-encoding)
+parquet_path = extract_dataset_shards(dataset_name)
 """
@@ -1,27 +1,35 @@
+import glob
+import os
 import duckdb
 import polars as pl
+from utils.file_handling import resolve_parquet_path, resolve_profile_columns, count_parquet_rows, REVIEW_KEY_COLUMNS
+from utils.duckdb_session import connect_to_duckdb
+from utils.create_duckdb_table import (check_table_exists, update_grouped_table_incrementally,
+                                       update_product_stats_incrementally)
+from utils.rollup_tables import refresh_rollup_incrementally, KEYED_ROLLUP_DIMENSIONS
+from utils.table_validation import validate_table_metadata
+from utils.surrogate_keys import extend_dimension_tables, build_keyed_select, create_decoded_view, keyed_column_name
 
 
-def connect_to_duckdb(db_path: str):
-    """Method that connects to duckdb"""
-    return duckdb.connect(db_path)
+def validate_table(con, table_name: str, parquet_df_path, checksum_row_groups=None):
+    """
+    Function that validates that the table was loaded completely
 
-def validate_table(con, table_name: str, parquet_df_path):
-    """Function that validates that the table was loaded completely"""
-    num_df_rows = con.execute(
-    "SELECT COUNT(*) FROM parquet_scan(?)", 
-    [parquet_df_path]).fetchone()[0]
-    table_rows = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    Row counts, null counts and min/max from the Parquet footers are compared with DuckDB's table
+    statistics, so neither side is scanned. checksum_row_groups also compares the content of that many
+    sampled row groups ("all" for every row group).
+    """
+    report = validate_table_metadata(con, table_name, parquet_df_path, checksum_row_groups)
 
     # Optional verbose/printing
-    print(f"Parquet DF rows:  {num_df_rows}")
-    print(f"DuckDB table rows: {table_rows}")
+    print(f"Parquet DF rows:  {report['parquet_rows']}")
+    print(f"DuckDB table rows: {report['table_rows']}")
 
-    if num_df_rows == table_rows:
+    if report["valid"]:
         print("✔ Data loaded successfully.")
         return True
     else:
-        print("✘ Row count mismatch. Data not loaded correctly.")
+        print("✘ Table does not match the Parquet file. Data not loaded correctly.")
         return False
 
 def preview_duckdb_table(con, table_name: str, n: int = 5):
@@ -40,15 +48,23 @@ def preview_duckdb_table(con, table_name: str, n: int = 5):
     print(preview_table)
     print("-" * 50)
 
-def load_parquet_to_duckdb(db_path: str, table_name, parquet_df_path):
+def load_parquet_to_duckdb(db_path: str, table_name, parquet_df_path, column_profile="full", checksum_row_groups=None,
+                           surrogate_keys=False):
     """
     Function that writes a parquet file to a DuckDB table
     
     Args:
         db_path (str): Path to the DuckDB database file
         table_name (str): table in db to be created
-        parquet_df_path (str): file where the df is stored as parquet
+        parquet_df_path (str): file where the df is stored as parquet (or a partitioned dataset directory)
+        column_profile: Name in COLUMN_PROFILES ("full", "ranking") or a list of columns; only these
+            columns are read from the Parquet file and stored
+        checksum_row_groups: Row groups whose content validate_table compares with the table (None: metadata only)
+        surrogate_keys (bool): Store asin, parent_asin and user_id as integer keys (asin_key, parent_asin_key,
+            user_key) from the dim_product/dim_user tables; '<table_name>_decoded' shows the original IDs
     """
+    parquet_df_path = resolve_parquet_path(parquet_df_path)
+
     # Create a connection
     con = connect_to_duckdb(db_path)
     print("Connection successful")
@@ -63,7 +79,7 @@ def load_parquet_to_duckdb(db_path: str, table_name, parquet_df_path):
     if table_exists:
         print(f"Table: {table_name} exists in database: {db_path}")
         # Validate table
-        validate_table(con, table_name, parquet_df_path)
+        validate_table(con, table_name, parquet_df_path, checksum_row_groups)
         preview_duckdb_table(con, table_name)
         # Close connection
         con.close()
@@ -72,18 +88,29 @@ def load_parquet_to_duckdb(db_path: str, table_name, parquet_df_path):
     # Table does NOT exist - create it
     print(f"Table {table_name} does NOT exist. Creating....")
 
-    # Write directly from Parquet path into a DuckDB table
-    con.execute(f"""
-        CREATE TABLE IF NOT EXISTS {table_name} AS
-        SELECT * FROM '{parquet_df_path}'
-        """)
+    # Only the columns of the profile are read from the Parquet file
+    available_columns = [col for col, *_ in con.execute(f"DESCRIBE SELECT * FROM '{parquet_df_path}'").fetchall()]
+    profile_columns = resolve_profile_columns(column_profile, available_columns)
+    column_list = ", ".join(f'"{col}"' for col in profile_columns)
+
+    if surrogate_keys:
+        # New IDs get the next free keys, then the fact table is written with the keys instead of the IDs
+        source_sql = f"(SELECT {column_list} FROM '{parquet_df_path}')"
+        new_ids = extend_dimension_tables(con, source_sql, columns=profile_columns)
+        print(f"New IDs added to the dimension tables: {new_ids}")
+        con.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS {build_keyed_select(source_sql, profile_columns)}")
+        create_decoded_view(con, table_name)
+    else:
+        # Write directly from Parquet path into a DuckDB table
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table_name} AS
+            SELECT {column_list} FROM '{parquet_df_path}'
+            """)
     print(f"Table {table_name} created")
     
 
-    # Verify that table was created
-    num_table_rows = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
     # Validate table
-    table_valid = validate_table(con, table_name, parquet_df_path)
+    table_valid = validate_table(con, table_name, parquet_df_path, checksum_row_groups)
     preview_duckdb_table(con, table_name)
     
     # Close connection
@@ -93,9 +120,223 @@ def load_parquet_to_duckdb(db_path: str, table_name, parquet_df_path):
     else:
         print(f"✘ Table '{table_name}' created but validation failed.")
 
+def load_text_side_table(db_path: str, table_name, side_parquet_path, key_columns=REVIEW_KEY_COLUMNS, surrogate_keys=False):
+    """
+    Load the wide text columns written by transform_dataset_to_parquet(side_table_path=...) into
+    '<table_name>_text' and create the view '<table_name>_with_text' that joins them to the reviews by key.
+
+    The join only runs when the view is queried, so the reviews table itself stays narrow.
+
+    Args:
+        db_path (str): Path to the DuckDB database file
+        table_name (str): Reviews table the texts belong to
+        side_parquet_path (str): Parquet file with the key columns and title/text/images
+        key_columns (tuple): Columns identifying a review
+        surrogate_keys (bool): The reviews table was loaded with surrogate_keys=True; the text table is
+            keyed the same way and joined on the integer keys
+
+    Returns:
+        str: Name of the view
+    """
+    text_table = f"{table_name}_text"
+    view_name = f"{table_name}_with_text"
+    side_parquet_path = resolve_parquet_path(side_parquet_path)
+    if surrogate_keys:
+        key_columns = [keyed_column_name(col) for col in key_columns]
+    key_match = " AND ".join(f'r."{col}" IS NOT DISTINCT FROM t."{col}"' for col in key_columns)
+    key_list = ", ".join(f'"{col}"' for col in key_columns)
+
+    con = connect_to_duckdb(db_path)
+    if surrogate_keys:
+        source_sql = f"read_parquet('{side_parquet_path}')"
+        columns = [col for col, *_ in con.execute(f"DESCRIBE SELECT * FROM {source_sql}").fetchall()]
+        extend_dimension_tables(con, source_sql, columns=columns)
+        con.execute(f"CREATE OR REPLACE TABLE {text_table} AS {build_keyed_select(source_sql, columns)}")
+    else:
+        con.execute(f"CREATE OR REPLACE TABLE {text_table} AS SELECT * FROM '{side_parquet_path}'")
+    con.execute(f"""
+        CREATE OR REPLACE VIEW {view_name} AS
+        SELECT r.*, t.* EXCLUDE ({key_list})
+        FROM {table_name} r
+        LEFT JOIN {text_table} t ON {key_match}
+    """)
+    num_rows = con.execute(f"SELECT COUNT(*) FROM {text_table}").fetchone()[0]
+    con.close()
+    print(f"Table '{text_table}' loaded with {num_rows} rows; view '{view_name}' joins it to '{table_name}'.")
+    return view_name
+
+NATURAL_KEY = REVIEW_KEY_COLUMNS
+
+
+def list_parquet_files(parquet_source):
+    """Returns the sorted Parquet files of a file path, a directory (searched recursively) or a glob pattern."""
+    if os.path.isdir(parquet_source):
+        parquet_source = os.path.join(parquet_source, "**", "*.parquet")
+    return sorted(glob.glob(parquet_source, recursive=True))
+
+
+def create_load_manifest(con, manifest_table: str):
+    """Creates the table that records which Parquet files were loaded."""
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {manifest_table} (
+            file_path VARCHAR,
+            file_size BIGINT,
+            modified_at DOUBLE,
+            rows_in_file BIGINT,
+            rows_loaded BIGINT,
+            loaded_at TIMESTAMP
+        )
+    """)
+
+
+def get_new_parquet_files(con, manifest_table: str, parquet_files):
+    """Returns the files that are not in the manifest or changed (size/mtime) since they were loaded."""
+    loaded = set(con.execute(f"SELECT file_path, file_size, modified_at FROM {manifest_table}").fetchall())
+    new_files = []
+    for file_path in parquet_files:
+        stat = os.stat(file_path)
+        if (os.path.abspath(file_path), stat.st_size, stat.st_mtime) not in loaded:
+            new_files.append(file_path)
+    return new_files
+
+
+def load_parquet_incremental(
+    db_path: str,
+    table_name,
+    parquet_source,
+    natural_key=NATURAL_KEY,
+    manifest_table=None,
+    grouped_tables=None,
+    rollup_tables=None,
+    surrogate_keys=False,
+    stats_tables=None
+):
+    """
+    Append only new Parquet files to a DuckDB table, deduplicating on a natural key.
+
+    Each new file is loaded in its own transaction: rows already in the table (same natural key)
+    and duplicates inside the file are skipped, and every derived grouped table, rollup table and
+    product stats table is refreshed from the new rows only. The file is recorded in the manifest
+    table after its COMMIT. If a file fails, its transaction is rolled back and the error re-raised;
+    the files loaded before it stay loaded.
+
+    Args:
+        db_path (str): Path to the DuckDB database file
+        table_name (str): table in db to append to (created from the first file if missing)
+        parquet_source (str): Parquet file, directory of Parquet files or glob pattern
+        natural_key (tuple): Columns identifying a review
+        manifest_table (str): Table tracking loaded files (default '<table_name>_load_manifest')
+        grouped_tables (list): kwargs for update_grouped_table_incrementally, one dict per derived table,
+            e.g. [{"table_name": "top_products_count", "filter_column": "rating", "filter_operator": "=", "filter_value": 5}]
+        rollup_tables (list): kwargs for refresh_rollup_incrementally, one dict per rollup table,
+            e.g. [{"rollup_table": "reviews_rollup_asin_rating_month"}]
+        surrogate_keys (bool): The table stores integer keys (load_parquet_to_duckdb(surrogate_keys=True)); new IDs
+            get new keys, existing IDs keep theirs, and the natural key is compared on the keys. Grouped tables
+            then default to grouping on asin_key decoded through dim_product, and rollups to KEYED_ROLLUP_DIMENSIONS
+        stats_tables (list): kwargs for update_product_stats_incrementally, one dict per stats table. By default
+            'product_stats' is refreshed if it exists, since the top-N tables and the query service read it
+
+    Returns:
+        int: Number of rows added
+    """
+    manifest_table = manifest_table or f"{table_name}_load_manifest"
+    grouped_tables = grouped_tables or []
+    rollup_tables = rollup_tables or []
+    if surrogate_keys:
+        # The keyed table has asin_key instead of asin; the outputs still show the product IDs
+        grouped_tables = [{"group_column": "asin_key", "dimension_table": "dim_product", **grouped_table}
+                          for grouped_table in grouped_tables]
+        rollup_tables = [{"dimensions": KEYED_ROLLUP_DIMENSIONS, **rollup_table} for rollup_table in rollup_tables]
+    stored_key = [keyed_column_name(col) for col in natural_key] if surrogate_keys else natural_key
+    key_match = " AND ".join(f'n."{col}" IS NOT DISTINCT FROM t."{col}"' for col in stored_key)
+    key_columns = ", ".join(f'"{col}"' for col in natural_key)
+
+    con = connect_to_duckdb(db_path)
+    print("Connection successful")
+    try:
+        create_load_manifest(con, manifest_table)
+        if stats_tables is None:
+            stats_tables = [{"stats_table": "product_stats"}] if check_table_exists(con, "product_stats") else []
+        if surrogate_keys:
+            stats_tables = [{"group_column": "asin_key", "dimension_table": "dim_product", **stats_table}
+                            for stats_table in stats_tables]
+
+        new_files = get_new_parquet_files(con, manifest_table, list_parquet_files(parquet_source))
+        print(f"{len(new_files)} new Parquet file(s) to load into '{table_name}'.")
+
+        total_rows_added = 0
+        for file_path in new_files:
+            stat = os.stat(file_path)
+            con.begin()
+            file_rows = f"(SELECT DISTINCT ON ({key_columns}) * FROM read_parquet(?))"
+            if surrogate_keys:
+                columns = [col for col, *_ in con.execute("DESCRIBE SELECT * FROM read_parquet(?)", [file_path]).fetchall()]
+                extend_dimension_tables(con, "read_parquet(?)", [file_path], columns=columns)
+                file_rows = f"({build_keyed_select(file_rows, columns)})"
+            if not check_table_exists(con, table_name):
+                con.execute(f"CREATE TABLE {table_name} AS SELECT * FROM {file_rows} LIMIT 0", [file_path])
+                if surrogate_keys:
+                    create_decoded_view(con, table_name)
+
+            # Stage the rows of this file that are not in the table yet
+            con.execute(f"""
+                CREATE OR REPLACE TEMP TABLE new_rows_staging AS
+                SELECT n.*
+                FROM {file_rows} n
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {table_name} t
+                    WHERE {key_match}
+                )
+            """, [file_path])
+            rows_added = con.execute("SELECT COUNT(*) FROM new_rows_staging").fetchone()[0]
+            # Columns the table does not store (e.g. left out by its column profile) are not inserted
+            table_columns = [col for col, *_ in con.execute(f"DESCRIBE {table_name}").fetchall()]
+            staged_columns = {col for col, *_ in con.execute("DESCRIBE new_rows_staging").fetchall()}
+            insert_columns = ", ".join(f'"{col}"' for col in table_columns if col in staged_columns)
+            con.execute(f"INSERT INTO {table_name} BY NAME SELECT {insert_columns} FROM new_rows_staging")
+
+            for grouped_table in grouped_tables:
+                update_grouped_table_incrementally(con, delta_table="new_rows_staging", source_table=table_name, **grouped_table)
+            for rollup_table in rollup_tables:
+                refresh_rollup_incrementally(con, delta_table="new_rows_staging", source_table=table_name, **rollup_table)
+            for stats_table in stats_tables:
+                update_product_stats_incrementally(con, delta_table="new_rows_staging", source_table=table_name,
+                                                   **stats_table)
+
+            con.commit()
+
+            # Only record the file once its rows are committed. If the process dies in between, the next
+            # run loads the file again and the natural key check skips all of its rows.
+            rows_in_file = count_parquet_rows(file_path)
+            con.execute(f"INSERT INTO {manifest_table} VALUES (?, ?, ?, ?, ?, current_localtimestamp())",
+                        [os.path.abspath(file_path), stat.st_size, stat.st_mtime, rows_in_file, rows_added])
+            total_rows_added += rows_added
+            print(f"Loaded {file_path}: {rows_added} new rows ({rows_in_file - rows_added} duplicates skipped)")
+
+        con.execute("DROP TABLE IF EXISTS new_rows_staging")
+    except Exception:
+        # Roll back the file being loaded; files committed before it stay loaded and recorded
+        try:
+            con.rollback()
+        except duckdb.TransactionException:
+            pass  # the failure happened outside a file's transaction
+        raise
+    finally:
+        con.close()
+    print(f"Incremental load complete: {total_rows_added} rows added to '{table_name}'.")
+    return total_rows_added
+
+
 """ EXAMPLE USAGE
 parquet_path = polars_to_parquet(df_cleaned, "./data/output/df_cleaned.parquet")
 # Path to the DuckDb database file
 db_path = 'data/db/sales_database.duckdb'
 table_name = "amazon_reviews"
-load_parquet_to_duckdb(db_path, table_name, parquet_path) """
\ No newline at end of file
+load_parquet_to_duckdb(db_path, table_name, parquet_path)
+# Narrow table for the rankings, texts joined lazily through a view
+load_parquet_to_duckdb(db_path, table_name, parquet_path, column_profile="ranking")
+load_text_side_table(db_path, table_name, "./data/output/df_review_texts.parquet")
+# Append only new review drops and keep the top products table current
+load_parquet_incremental(db_path, table_name, "./data/incoming/",
+    grouped_tables=[{"table_name": "top_products_count", "filter_column": "rating", "filter_operator": "=", "filter_value": 5}],
+    rollup_tables=[{"rollup_table": "reviews_rollup_asin_rating_month"}]) """
\ No newline at end of file
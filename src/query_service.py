@@ -0,0 +1,529 @@
+import argparse
+import json
+import os
+import queue
+import random
+import threading
+import time
+import duckdb
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from urllib.request import urlopen
+from urllib.error import HTTPError
+from utils.duckdb_session import connect_to_duckdb
+from utils.create_duckdb_table import check_table_exists
+from utils.surrogate_keys import DIMENSION_TABLES
+from utils.rollup_tables import ROLLUP_MEASURES
+
+# Tables copied into the serving snapshot (the ones that exist are copied)
+SERVING_TABLES = ("product_stats", "product_url_table", "reviews_rollup_asin_rating_month", "dim_product")
+DEFAULT_SNAPSHOT_PATH = "./data/output/serving_snapshot.duckdb"
+
+
+def publish_serving_snapshot(db_path: str, snapshot_path: str = DEFAULT_SNAPSHOT_PATH, tables=SERVING_TABLES):
+    """
+    Copy the tables the query service reads into a separate DuckDB file and swap it in atomically.
+
+    The pipeline keeps the main database open for writing, which DuckDB's file lock does not allow
+    alongside a reader in another process, so the service reads this snapshot instead. The snapshot is
+    written to a temporary file and renamed, and the service reopens it when the file changes.
+    Tables with a Product_ID column are sorted and indexed on it for fast lookups.
+
+    Args:
+        db_path (str): Path to the DuckDB database file
+        snapshot_path (str): Snapshot file the service reads
+        tables (list): Tables to copy
+
+    Returns:
+        str: Path to the snapshot
+    """
+    os.makedirs(os.path.dirname(snapshot_path) or ".", exist_ok=True)
+    # Unique per process and thread, so concurrent publishes cannot collide
+    tmp_path = f"{snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    snapshot_alias = f"serving_snapshot_{threading.get_ident()}"
+
+    con = connect_to_duckdb(db_path)
+    existing = [table for table in tables if check_table_exists(con, table)]
+    con.execute(f"ATTACH '{tmp_path}' AS {snapshot_alias}")
+    try:
+        for table in existing:
+            columns = [col for col, *_ in con.execute(f"DESCRIBE {table}").fetchall()]
+            order_by = "ORDER BY Product_ID" if "Product_ID" in columns else ""
+            con.execute(f"CREATE TABLE {snapshot_alias}.{table} AS SELECT * FROM {table} {order_by}")
+            if "Product_ID" in columns:
+                con.execute(f"CREATE INDEX idx_{table}_product_id ON {snapshot_alias}.{table} (Product_ID)")
+    finally:
+        con.execute(f"DETACH {snapshot_alias}")
+        con.close()
+    os.replace(tmp_path, snapshot_path)
+    print(f"Serving snapshot published to {snapshot_path} with tables {existing}")
+    return snapshot_path
+
+
+class ReadOnlyConnectionPool:
+    """
+    A fixed number of cursors on one read-only DuckDB connection, shared by the request threads.
+
+    Args:
+        db_path (str): DuckDB file to open read-only
+        size (int): Number of cursors (queries that can run at the same time)
+    """
+
+    def __init__(self, db_path: str, size: int = 4):
+        self.connection = connect_to_duckdb(db_path, read_only=True)
+        self.cursors = queue.Queue()
+        for _ in range(size):
+            self.cursors.put(self.connection.cursor())
+        self.size = size
+        self.borrowed = 0
+        self.retired = False
+        self.closed = False
+        self.closed_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Count a borrower before it takes a cursor, so retire() cannot close the pool under it."""
+        with self.lock:
+            if self.retired:
+                raise RuntimeError("The connection pool has been retired.")
+            self.borrowed += 1
+
+    def release(self):
+        with self.lock:
+            self.borrowed -= 1
+            close_now = self.retired and self.borrowed == 0
+        if close_now:
+            self.close()
+
+    @contextmanager
+    def cursor(self, reserved: bool = False):
+        """Borrow a cursor for the duration of a query (reserved=True: reserve() was already called)."""
+        if not reserved:
+            self.reserve()
+        try:
+            cursor = self.cursors.get()
+            try:
+                yield cursor
+            finally:
+                self.cursors.put(cursor)
+        finally:
+            self.release()
+
+    def retire(self):
+        """Close the pool once the queries still running on it are done."""
+        with self.lock:
+            self.retired = True
+            close_now = self.borrowed == 0
+        if close_now:
+            self.close()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        # Every cursor is back in the queue once nothing is borrowed
+        while True:
+            try:
+                self.cursors.get_nowait().close()
+            except queue.Empty:
+                break
+        self.connection.close()
+        self.closed_event.set()
+
+
+class LRUResultCache:
+    """
+    Bounded least-recently-used cache of query results.
+
+    Args:
+        max_entries (int): Results kept before the least recently used one is evicted (0 disables caching)
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class QueryService:
+    """
+    Read-only top-N and product queries over a DuckDB file, with a connection pool and a result cache.
+
+    The file's identity (inode, size, modification time) is checked on every request. When the pipeline
+    publishes a new snapshot the old pool is closed once the queries still running on it finish, then a
+    new pool is opened and the cache is cleared. The old pool has to be closed first: while a connection
+    to the path is open, DuckDB hands a new connection the database instance already open for the old
+    file instead of reading the new one.
+
+    Args:
+        db_path (str): DuckDB file to serve (normally the snapshot from publish_serving_snapshot)
+        pool_size (int): Queries that can run at the same time
+        cache_size (int): Results kept in the LRU cache (0 disables it)
+        stats_table (str): Product stats table (create_product_stats_table)
+        url_table (str): Enrichment table with Product_Name and URL
+        rollup_table (str): Product x rating x month rollup (used for rating-filtered metrics other than counts)
+        max_limit (int): Largest top-N limit accepted
+    """
+
+    def __init__(self, db_path: str = DEFAULT_SNAPSHOT_PATH, pool_size: int = 4, cache_size: int = 1024,
+                 stats_table: str = "product_stats", url_table: str = "product_url_table",
+                 rollup_table: str = "reviews_rollup_asin_rating_month", max_limit: int = 10000):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.cache = LRUResultCache(cache_size)
+        self.stats_table = stats_table
+        self.url_table = url_table
+        self.rollup_table = rollup_table
+        self.max_limit = max_limit
+        self.lock = threading.Lock()
+        self.pool = None
+        self.version = None
+        self.reloads = 0
+        self.refresh_if_changed()
+
+    def data_version(self):
+        stat = os.stat(self.db_path)
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def refresh_if_changed(self):
+        """Reopen the pool and clear the cache if the database file changed since it was opened."""
+        version = self.data_version()
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            # New queries wait on the lock meanwhile; the running ones release the old pool without it
+            if self.pool is not None:
+                self.pool.retire()
+                self.pool.closed_event.wait()
+            try:
+                new_pool = ReadOnlyConnectionPool(self.db_path, self.pool_size)
+            except duckdb.Error:
+                # The old pool is closed either way; the next request tries again
+                self.version = None
+                raise
+            with new_pool.cursor() as cursor:
+                tables = {row[0] for row in cursor.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+                metrics = [
+                    col for col, col_type, *_ in cursor.execute(f"DESCRIBE {self.stats_table}").fetchall()
+                    if col_type.upper() in ("BIGINT", "INTEGER", "HUGEINT", "DOUBLE", "FLOAT") and col != "product_key"
+                ]
+                rollup_columns = {}
+                if self.rollup_table in tables:
+                    rollup_columns = {col: col_type.upper() for col, col_type, *_ in
+                                      cursor.execute(f"DESCRIBE {self.rollup_table}").fetchall()}
+            self.tables, self.metrics, self.rollup_columns = tables, metrics, rollup_columns
+            self.pool = new_pool
+            self.cache.clear()
+            self.version = version
+            self.reloads += 1
+        print(f"Query service serving {self.db_path} (version {version})")
+
+    def run_query(self, cache_key, sql: str, params):
+        """Run a query through the cache; returns the rows as a list of dicts."""
+        self.refresh_if_changed()
+        # Taken together under the lock, so a reload cannot retire the pool between reading and reserving it
+        with self.lock:
+            version, pool = self.version, self.pool
+            pool.reserve()
+        key = (version, cache_key)
+        rows = self.cache.get(key)
+        if rows is not None:
+            pool.release()
+            return rows
+        with pool.cursor(reserved=True) as cursor:
+            result = cursor.execute(sql, params)
+            columns = [description[0] for description in result.description]
+            rows = [dict(zip(columns, row)) for row in result.fetchall()]
+        self.cache.put(key, rows)
+        return rows
+
+    def url_join(self):
+        if self.url_table not in self.tables:
+            return "", ""
+        return ", u.Product_Name, u.URL", f"LEFT JOIN {self.url_table} u ON u.Product_ID = t.Product_ID"
+
+    def top_products(self, metric: str = "review_count", rating: int = None, limit: int = 100, min_reviews: int = None):
+        """
+        Top products by a product_stats metric, optionally counting only reviews with one star rating.
+
+        rating with metric 'review_count' ranks by the rating_<n>_count column; other metrics with a
+        rating are summed from the rollup table.
+
+        Returns:
+            list: Rows with Product_ID, the metric (as 'value') and Product_Name/URL when enriched
+        """
+        limit = int(limit)
+        rating = int(rating) if rating is not None else None
+        min_reviews = int(min_reviews) if min_reviews is not None else None
+        if not 0 < limit <= self.max_limit:
+            raise ValueError(f"limit must be between 1 and {self.max_limit}")
+        if rating is not None and rating not in range(1, 6):
+            raise ValueError("rating must be between 1 and 5")
+        extra_columns, url_join = self.url_join()
+        params = []
+
+        if rating is not None and metric != "review_count":
+            if metric not in ROLLUP_MEASURES:
+                raise ValueError(f"Rating filter is only available for 'review_count' and {list(ROLLUP_MEASURES)}.")
+            if metric not in self.rollup_columns:
+                raise ValueError(f"Rating filter on '{metric}' needs the rollup table '{self.rollup_table}'")
+            product_column = "r.Product_ID"
+            dim_join = ""
+            if "asin_key" in self.rollup_columns:
+                # Rollups built on surrogate keys store the product key; decode it through dim_product
+                id_column, key_column = DIMENSION_TABLES["dim_product"]
+                product_column = f"d.{id_column}"
+                dim_join = f"JOIN dim_product d ON d.{key_column} = r.asin_key"
+            source = f"""(
+                SELECT {product_column} AS Product_ID, SUM(r.{metric}) AS value
+                FROM {self.rollup_table} r {dim_join}
+                WHERE r.rating = ?
+                GROUP BY ALL
+            )"""
+            params.append(int(rating))
+        else:
+            column = f"rating_{int(rating)}_count" if rating is not None else metric
+            if column not in self.metrics:
+                raise ValueError(f"Unknown metric '{metric}'. Expected one of {self.metrics}.")
+            min_reviews_clause = "WHERE review_count >= ?" if min_reviews is not None else ""
+            if min_reviews is not None:
+                params.append(int(min_reviews))
+            source = f"(SELECT Product_ID, {column} AS value FROM {self.stats_table} {min_reviews_clause})"
+
+        sql = f"""
+            SELECT t.Product_ID, t.value{extra_columns}
+            FROM (SELECT * FROM {source} ORDER BY value DESC NULLS LAST, Product_ID LIMIT ?) t
+            {url_join}
+            ORDER BY t.value DESC NULLS LAST, t.Product_ID
+        """
+        params.append(limit)
+        return self.run_query(("top", metric, rating, limit, min_reviews), sql, params)
+
+    def product(self, product_id: str):
+        """Stats of one product plus its Product_Name and URL when enriched; None if unknown."""
+        stats = self.run_query(("product", product_id),
+                               f"SELECT * FROM {self.stats_table} WHERE Product_ID = ?", [product_id])
+        if not stats:
+            return None
+        row = dict(stats[0])
+        if self.url_table in self.tables:
+            enriched = self.run_query(("url", product_id),
+                                      f"SELECT Product_Name, URL FROM {self.url_table} WHERE Product_ID = ?", [product_id])
+            row.update(enriched[0] if enriched else {"Product_Name": None, "URL": None})
+        return row
+
+    def health(self):
+        return {"db_path": self.db_path, "version": list(self.version), "reloads": self.reloads,
+                "cache_entries": len(self.cache.entries), "cache_hits": self.cache.hits,
+                "cache_misses": self.cache.misses, "metrics": self.metrics}
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /top?metric=review_count&rating=5&limit=100&min_reviews=10
+    GET /product/<Product_ID>
+    GET /health
+    """
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == "/top":
+                body = self.service.top_products(
+                    metric=query.get("metric", "review_count"), rating=query.get("rating"),
+                    limit=query.get("limit", 100), min_reviews=query.get("min_reviews"))
+            elif url.path.startswith("/product/"):
+                body = self.service.product(url.path[len("/product/"):])
+                if body is None:
+                    return self.send_json(404, {"error": "unknown product"})
+            elif url.path == "/health":
+                body = self.service.health()
+            else:
+                return self.send_json(404, {"error": "unknown path"})
+        except ValueError as e:
+            return self.send_json(400, {"error": str(e)})
+        except duckdb.Error as e:
+            return self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+        self.send_json(200, body)
+
+    def send_json(self, status: int, body):
+        payload = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # one line per request would dominate the latency
+
+
+class QueryHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 makes bursts of clients wait for a SYN retry (~1 s)
+    request_queue_size = 128
+
+
+def start_query_server(service: QueryService, host: str = "127.0.0.1", port: int = 8765):
+    """
+    Start the HTTP server in a background thread (one thread per request).
+
+    Returns:
+        ThreadingHTTPServer: Call shutdown() to stop it
+    """
+    handler = type("BoundQueryRequestHandler", (QueryRequestHandler,), {"service": service})
+    server = QueryHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Query service listening on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def percentile(sorted_values, fraction: float):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def benchmark_query_service(db_path: str = DEFAULT_SNAPSHOT_PATH, concurrency=(1, 8, 32), num_requests: int = 2000,
+                            cache_sizes=(0, 1024), pool_size: int = 4, seed: int = 42):
+    """
+    Measure p50/p99 latency and throughput of the HTTP service under concurrent clients.
+
+    The request mix is 30% top-N queries (random metric, rating and limit) and 70% lookups of
+    products drawn from the stats table. Each combination runs against a fresh server.
+
+    Args:
+        db_path (str): DuckDB file to serve
+        concurrency (tuple): Numbers of concurrent clients
+        num_requests (int): Requests per run
+        cache_sizes (tuple): Result cache sizes to compare (0 = no cache)
+        pool_size (int): Connection pool size
+        seed (int): Seed of the request mix
+
+    Returns:
+        dict: (cache_size, clients) -> {"p50_ms", "p99_ms", "requests_per_second", "errors"}
+    """
+    con = connect_to_duckdb(db_path, read_only=True)
+    product_ids = [row[0] for row in con.execute(
+        "SELECT Product_ID FROM product_stats USING SAMPLE 2000 ROWS").fetchall()]
+    con.close()
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(num_requests):
+        if rng.random() < 0.3:
+            metric = rng.choice(["review_count", "helpful_votes", "avg_rating"])
+            rating = f"&rating={rng.randint(1, 5)}" if metric == "review_count" and rng.random() < 0.5 else ""
+            paths.append(f"/top?metric={metric}{rating}&limit={rng.choice([10, 100, 1000])}")
+        else:
+            paths.append(f"/product/{rng.choice(product_ids)}")
+
+    report = {}
+    for cache_size in cache_sizes:
+        for clients in concurrency:
+            service = QueryService(db_path, pool_size=pool_size, cache_size=cache_size)
+            server = start_query_server(service, port=0)
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+            errors = []
+
+            def request(path):
+                start_time = time.perf_counter()
+                try:
+                    with urlopen(base_url + path) as response:
+                        response.read()
+                except HTTPError as e:
+                    if e.code != 404:
+                        errors.append(e)
+                return time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                latencies = sorted(pool.map(request, paths))
+            seconds = time.perf_counter() - start_time
+            server.shutdown()
+            server.server_close()
+            service.pool.retire()
+            report[(cache_size, clients)] = {
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                "requests_per_second": round(num_requests / seconds),
+                "errors": len(errors),
+            }
+
+    for (cache_size, clients), stats in report.items():
+        print(f"cache={cache_size:<5} clients={clients:<4} p50 {stats['p50_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms  "
+              f"{stats['requests_per_second']:>6} req/s  {stats['errors']} errors")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read-only top products query service")
+    parser.add_argument("command", choices=["serve", "top", "product", "publish", "benchmark"])
+    parser.add_argument("product_id", nargs="?", help="Product_ID for the product command")
+    parser.add_argument("--db", default=DEFAULT_SNAPSHOT_PATH, help="DuckDB file to serve (or the source for publish)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--metric", default="review_count")
+    parser.add_argument("--rating", type=int)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--cache-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        publish_serving_snapshot(args.db)
+    elif args.command == "benchmark":
+        benchmark_query_service(args.db, pool_size=args.pool_size)
+    else:
+        query_service = QueryService(args.db, pool_size=args.pool_size, cache_size=args.cache_size)
+        if args.command == "top":
+            print(json.dumps(query_service.top_products(args.metric, args.rating, args.limit), indent=2, default=str))
+        elif args.command == "product":
+            print(json.dumps(query_service.product(args.product_id), indent=2, default=str))
+        else:
+            http_server = start_query_server(query_service, port=args.port)
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                http_server.shutdown()
+
+""" EXAMPLE USAGE
+# After the pipeline ran (it publishes the snapshot itself), or from an existing database:
+python -m src.query_service publish --db ./data/output/amazon_sales_db.duckDB
+python -m src.query_service serve --port 8765
+curl "http://127.0.0.1:8765/top?metric=review_count&rating=5&limit=100"
+curl "http://127.0.0.1:8765/product/B08BHXG144"
+python -m src.query_service top --metric helpful_votes --limit 20
+python -m src.query_service benchmark """
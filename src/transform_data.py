@@ -1,5 +1,44 @@
-import duckdb
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.profiling import measure_peak_memory
+from utils.duckdb_session import connect_to_duckdb
+from src.text_normalizer import build_text_normalizer_exprs, TEXT_NORMALIZATION_CONFIG
+from utils.file_handling import (resolve_parquet_path, write_partitioned_parquet, resolve_profile_columns,
+                                 WIDE_TEXT_COLUMNS, REVIEW_KEY_COLUMNS)
+from utils.table_validation import read_parquet_footer_stats
+
+
+def build_datetime_of_review_expr():
+    """Returns the expression converting the milliseconds timestamp to datetime YYYY-MM-DD 09:57:33.520000."""
+    return pl.from_epoch("timestamp", time_unit="ms").alias("datetime_of_review")
+
+
+def clean_review_columns(df_no_dupes_purchase_true: pl.DataFrame):
+    """
+    Clean the text columns and derive datetime_of_review from the millisecond timestamp.
+
+    Args:
+        df_no_dupes_purchase_true (pl.DataFrame): Deduplicated, filtered reviews
+
+    Returns:
+        polars.DataFrame: Cleaned DataFrame
+    """
+    # Clean up text: lowercase, collapse whitespace/control character runs and trim
+    df_cleaned_texts = (df_no_dupes_purchase_true.lazy().with_columns(build_text_normalizer_exprs())
+        .collect(streaming=True) # process operation in batches
+    )
+    print("Texts columns have been cleaned")
+
+    # Convert milliseconds timestamp to datetime with polars from_epoch function
+    df_clean_ready_to_use = df_cleaned_texts.with_columns(build_datetime_of_review_expr())
+    print(f"Schema with timestamp added: {df_clean_ready_to_use.schema}")
+    print(df_clean_ready_to_use.head())
+
+    return df_clean_ready_to_use
 
 
 def transform_dataset(parquet_dataset_path):
@@ -14,13 +53,16 @@ def transform_dataset(parquet_dataset_path):
     """
     table_name = "data_no_dupes"
 
+    # A partitioned dataset directory is scanned through a glob
+    parquet_dataset_path = resolve_parquet_path(parquet_dataset_path)
+
     # Connect to DuckDB
-    con = duckdb.connect()  # in-memory database
+    con = connect_to_duckdb()  # in-memory database
 
     # Check the count of data to ensure number of rows matches the number of rows in dataset  == 33913690
-    num_rows_df = con.execute(
-    "SELECT COUNT(*) FROM parquet_scan(?)", 
-    [parquet_dataset_path]).fetchone()[0]
+    # (read from the Parquet footers, not by scanning the data)
+    footer_stats = read_parquet_footer_stats(parquet_dataset_path)
+    num_rows_df = footer_stats["num_rows"]
 
     # Get schema (column names and types)
     schema_info = con.execute(f"DESCRIBE SELECT * FROM '{parquet_dataset_path}'").fetchall()
@@ -43,19 +85,13 @@ def transform_dataset(parquet_dataset_path):
     num_rows_no_dupes_df = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
     print(f"Number of rows after duplicates removed: {num_rows_no_dupes_df}")
 
-    # Build a query that counts nulls for each column
-    null_count_exprs = [
-        f"SUM(CASE WHEN {col} IS NULL THEN 1 ELSE 0 END) AS {col}"
-        for col, _type, *_ in schema_info
-    ]
-    query = f"SELECT {', '.join(null_count_exprs)} FROM '{table_name}';"
-
-    # Count null values per column
-    result_nulls = con.execute(query).fetchone()
-
-    # Map column names to null counts as a dictionary
-    total_null_values = {col: count for (col, *_), count in zip(schema_info, result_nulls)}
-    print("Total null values: ", total_null_values)
+    # Null values per column from the Parquet footers (counted before deduplication, which cannot add nulls).
+    # The footers have no per-column counts for nested columns such as images, so those are not reported
+    total_null_values = {col: stats["null_count"] for col, stats in footer_stats["columns"].items()}
+    nested_columns = [col for col, *_ in schema_info if col not in total_null_values]
+    print("Total null values (from the Parquet footers, before duplicates removed): ", total_null_values)
+    if nested_columns:
+        print("Null values not counted for nested columns: ", nested_columns)
 
     # Count whitespaces/empty strings in product id columns
     asin_space_only, parent_asin_space_only = con.execute(f"""
@@ -68,34 +104,35 @@ def transform_dataset(parquet_dataset_path):
     print("Sum of whitespace product ids: ", asin_space_only, parent_asin_space_only)
 
     # Drop rows where both 'asin' and 'parent_asin' is null
-    if total_null_values['asin'] > 0 or total_null_values['parent_asin'] > 0:
-        con.execute(f"""
+    # The remaining row counts come from the number of rows each DELETE removed instead of recounting the table
+    # (a null count is None when the footer has no statistics for the column)
+    remaining_rows = num_rows_no_dupes_df
+    if total_null_values.get('asin') != 0 or total_null_values.get('parent_asin') != 0:
+        remaining_rows -= con.execute(f"""
             DELETE FROM {table_name}
             WHERE asin IS NULL
             AND parent_asin IS NULL
-        """)
-        remaining_rows = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        """).fetchone()[0]
         print("Remaining rows after dropping product id nulls:", remaining_rows)
     
     # Drop rows where both 'asin' and 'parent_asin' is whitespace/empty string
     if asin_space_only > 0 or parent_asin_space_only > 0:
-        con.execute(f"""
+        remaining_rows -= con.execute(f"""
             DELETE FROM {table_name}
             WHERE TRIM(asin) = ''
             AND TRIM(parent_asin) = ''
-        """)
-        remaining_rows = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        """).fetchone()[0]
         print("Remaining rows after dropping product id where value is space only:", remaining_rows)
     
     # Filter verified purchases
-    con.execute(f"""
+    remaining_rows -= con.execute(f"""
         DELETE FROM {table_name}
         WHERE verified_purchase = FALSE
         OR verified_purchase IS NULL
-    """)
+    """).fetchone()[0]
 
     # Count the number of rows after filtering verified purchases == 31097566
-    num_rows_purchase_true_df = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    num_rows_purchase_true_df = remaining_rows
     print(f"Number of rows with verified purchases: {num_rows_purchase_true_df}")
 
     # Read the table into a Polars DataFrame
@@ -108,35 +145,399 @@ def transform_dataset(parquet_dataset_path):
     print(f"Polars DataFrame shape: {df_no_dupes_purchase_true.shape}")
     print(f"Schema: {df_no_dupes_purchase_true.schema}")
 
-    # Clean up text: Convert to lowercase and remove extra spaces
-    text_cols_to_clean = ["title", "text"]
-    df_cleaned_texts = (df_no_dupes_purchase_true.lazy().with_columns(
-        [
-            (
-                pl.col(texts)
-                .str.to_lowercase()
-                .str.replace("\t", " ")           # literal replacement
-                .str.replace("\n", " ")           # literal replacement
-                .str.replace("\r", " ")           # literal replacement
-                .str.replace("  ", " ")           # collapse doubles
-                .str.replace("  ", " ")           # run twice to remove triples
-                #.str.lstrip_chars()                      # remove trailing and leading whitespace
-            )
-            for texts in text_cols_to_clean
-        ])
-        .collect(streaming=True) # process operation in batches
-    )
-    print("Texts columns have been cleaned")
+    return clean_review_columns(df_no_dupes_purchase_true)
 
-    # Convert milliseconds timestamp to datetime YYYY-MM-DD 09:57:33.520000 with polars from_epoch function
-    df_clean_ready_to_use = df_cleaned_texts.with_columns(
-        pl.from_epoch("timestamp", time_unit="ms").alias("datetime_of_review")
-    )
-    print(f"Schema with timestamp added: {df_clean_ready_to_use.schema}")
-    print(df_clean_ready_to_use.head())
 
-    return df_clean_ready_to_use
+def build_review_filter(asin_column="asin", parent_asin_column="parent_asin"):
+    """
+    Returns the WHERE predicate that keeps verified purchases with at least one usable product id.
+
+    Matches the DELETEs in transform_dataset: a row is dropped when both ids are NULL,
+    when both ids are blank, or when verified_purchase is FALSE or NULL.
+    """
+    return f"""
+        ({asin_column} IS NULL AND {parent_asin_column} IS NULL) IS NOT TRUE
+        AND (TRIM({asin_column}) = '' AND TRIM({parent_asin_column}) = '') IS NOT TRUE
+        AND verified_purchase IS TRUE
+    """
+
+
+def collect_dataset_diagnostics(con, parquet_dataset_path, schema_info):
+    """
+    Compute all diagnostic counts of the raw Parquet file in a single aggregate pass.
+
+    Every count is taken before deduplication: the per-stage row counts are the raw rows left by each
+    filter, duplicates included.
+
+    Args:
+        con: DuckDB connection object
+        parquet_dataset_path: file where the df is stored as parquet
+        schema_info (list): Output of DESCRIBE on the Parquet file
+
+    Returns:
+        dict: total_rows, null counts per column, whitespace product ids and per-stage row counts (before dedup)
+    """
+    columns = [col for col, _type, *_ in schema_info]
+    null_count_exprs = [f'COUNT(*) FILTER (WHERE "{col}" IS NULL) AS "null_{col}"' for col in columns]
+    no_null_ids = "(asin IS NULL AND parent_asin IS NULL) IS NOT TRUE"
+    no_blank_ids = "(TRIM(asin) = '' AND TRIM(parent_asin) = '') IS NOT TRUE"
+    result = con.execute(f"""
+        SELECT
+            COUNT(*) AS total_rows,
+            {', '.join(null_count_exprs)},
+            COUNT(*) FILTER (WHERE TRIM(asin) = '') AS asin_whitespace,
+            COUNT(*) FILTER (WHERE TRIM(parent_asin) = '') AS parent_asin_whitespace,
+            COUNT(*) FILTER (WHERE {no_null_ids}) AS rows_after_null_ids,
+            COUNT(*) FILTER (WHERE {no_null_ids} AND {no_blank_ids}) AS rows_after_blank_ids,
+            COUNT(*) FILTER (WHERE {build_review_filter()}) AS rows_after_verified_purchase
+        FROM parquet_scan(?)
+    """, [parquet_dataset_path]).fetchone()
+
+    nulls = dict(zip(columns, result[1:1 + len(columns)]))
+    (asin_whitespace, parent_asin_whitespace, rows_after_null_ids,
+     rows_after_blank_ids, rows_after_verified_purchase) = result[1 + len(columns):]
+    return {
+        "total_rows": result[0],
+        "null_values": nulls,
+        "asin_whitespace": asin_whitespace,
+        "parent_asin_whitespace": parent_asin_whitespace,
+        "rows_after_null_ids": rows_after_null_ids,
+        "rows_after_blank_ids": rows_after_blank_ids,
+        "rows_after_verified_purchase": rows_after_verified_purchase,
+    }
+
+
+def transform_dataset_single_pass(parquet_dataset_path):
+    """
+    Transform the raw Parquet file into a cleaned DataFrame with the filters pushed into one query.
+
+    Produces the same rows as transform_dataset. The product id and verified purchase filters
+    run before the DISTINCT, so the dedup only sees rows that are kept, and all diagnostics
+    come from one aggregate scan of the raw file, so they are all counted before duplicates are
+    removed (the deduplicated row count is printed after the DISTINCT).
+
+    Args:
+        parquet_dataset_path: file where the df is stored as parquet
+
+    Returns:
+        polars.DataFrame: Transformed DataFrame
+    """
+    table_name = "data_no_dupes"
+
+    # A partitioned dataset directory is scanned through a glob
+    parquet_dataset_path = resolve_parquet_path(parquet_dataset_path)
+
+    # Connect to DuckDB
+    con = connect_to_duckdb()  # in-memory database
+
+    # Get schema (column names and types)
+    schema_info = con.execute(f"DESCRIBE SELECT * FROM '{parquet_dataset_path}'").fetchall()
+
+    # All diagnostic counts in one pass over the raw file
+    diagnostics = collect_dataset_diagnostics(con, parquet_dataset_path, schema_info)
+    print(f"Number of rows: {diagnostics['total_rows']}")
+    print(f"Number of columns: {len(schema_info)}")
+    # Counted on the raw rows, so duplicates are still included
+    print("Total null values (before duplicates removed): ", diagnostics["null_values"])
+    print("Sum of whitespace product ids (before duplicates removed): ",
+          diagnostics["asin_whitespace"], diagnostics["parent_asin_whitespace"])
+    print("Rows left after dropping product id nulls (before duplicates removed):", diagnostics["rows_after_null_ids"])
+    print("Rows left after dropping product id where value is space only (before duplicates removed):",
+          diagnostics["rows_after_blank_ids"])
+    print(f"Number of rows with verified purchases (before duplicates removed): "
+          f"{diagnostics['rows_after_verified_purchase']}")
+
+    # Filter, then deduplicate, in a single statement
+    con.execute(f"""
+    CREATE TABLE {table_name} AS
+    SELECT DISTINCT *
+    FROM '{parquet_dataset_path}'
+    WHERE {build_review_filter()}
+    """)
+    num_rows_no_dupes_df = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    print(f"Number of verified purchase rows after duplicates removed: {num_rows_no_dupes_df}")
+
+    # Read the table into a Polars DataFrame
+    df_no_dupes_purchase_true = pl.from_arrow(con.execute(f"SELECT * FROM {table_name}").arrow())
+
+    # Close connection
+    con.close()
+
+    print(f"Polars DataFrame shape: {df_no_dupes_purchase_true.shape}")
+    print(f"Schema: {df_no_dupes_purchase_true.schema}")
+
+    return clean_review_columns(df_no_dupes_purchase_true)
+
+
+def prepare_hash_dedup(con, parquet_dataset_path, where_clause: str = "TRUE", dedup_columns=None, columns=None):
+    """
+    Deduplicate on a 64-bit hash of each row (or of dedup_columns) and return the deduplicated query.
+
+    The hash of every row is grouped first, which needs memory for 8-byte hashes only instead of
+    whole rows. Rows whose hash is unique cannot have a duplicate and are passed through untouched.
+    Only the rows sharing a hash are copied to the 'dup_hash_rows' table and compared exactly,
+    so a hash collision never drops a distinct row.
+
+    Args:
+        con: DuckDB connection object (a disk-backed database lets the helper tables spill)
+        parquet_dataset_path: file where the df is stored as parquet
+        where_clause (str): Filter applied before deduplication
+        dedup_columns (list): Columns identifying a duplicate (default: every output column, like SELECT DISTINCT)
+        columns (list): Columns to output (default: every column of the file)
+
+    Returns:
+        tuple: (deduplicated SELECT query, stats dict with rows_in, rows_sharing_hash, duplicates_removed, hash_collisions)
+    """
+    columns = list(columns) if columns else [
+        col for col, *_ in con.execute("DESCRIBE SELECT * FROM parquet_scan(?)", [parquet_dataset_path]).fetchall()]
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    dedup_columns = list(dedup_columns) if dedup_columns else columns
+    key_list = ", ".join(f'"{col}"' for col in dedup_columns)
+    row_hash = f"hash({key_list})"
+
+    # Hashes seen more than once; everything else is unique. The grand total grouping set counts the
+    # rows in the same pass (hash() is never NULL, so its NULL row_hash marks the total)
+    con.execute(f"""
+        CREATE OR REPLACE TABLE dup_row_hashes AS
+        SELECT row_hash, COUNT(*) AS num_rows
+        FROM (SELECT {row_hash} AS row_hash FROM parquet_scan(?) WHERE {where_clause})
+        GROUP BY GROUPING SETS ((row_hash), ())
+        HAVING COUNT(*) > 1 OR GROUPING(row_hash) = 1
+    """, [parquet_dataset_path])
+    rows_in = con.execute("SELECT num_rows FROM dup_row_hashes WHERE row_hash IS NULL").fetchone()[0]
+    # A NULL left in the table would make the NOT IN below filter out every unique row
+    con.execute("DELETE FROM dup_row_hashes WHERE row_hash IS NULL")
+    # Copy only the rows sharing a hash for the exact comparison
+    con.execute(f"""
+        CREATE OR REPLACE TABLE dup_hash_rows AS
+        SELECT {row_hash} AS row_hash, {column_list}
+        FROM parquet_scan(?)
+        WHERE {where_clause}
+        AND {row_hash} IN (SELECT row_hash FROM dup_row_hashes)
+    """, [parquet_dataset_path])
+
+    rows_sharing_hash, distinct_rows, hash_collisions = con.execute(f"""
+        WITH exact AS (SELECT DISTINCT row_hash, {key_list} FROM dup_hash_rows)
+        SELECT
+            (SELECT COUNT(*) FROM dup_hash_rows),
+            (SELECT COUNT(*) FROM exact),
+            (SELECT COUNT(*) FROM (SELECT row_hash FROM exact GROUP BY row_hash HAVING COUNT(*) > 1))
+    """).fetchone()
+    stats = {
+        "rows_in": rows_in,
+        "rows_sharing_hash": rows_sharing_hash,
+        "duplicates_removed": rows_sharing_hash - distinct_rows,
+        "hash_collisions": hash_collisions,
+    }
+    print(f"Hash dedup: {stats['duplicates_removed']} duplicates removed from {rows_in} rows "
+          f"({rows_sharing_hash} rows compared exactly, {hash_collisions} hash collisions)")
+
+    exact_dedup = (f"SELECT DISTINCT {column_list} FROM dup_hash_rows" if dedup_columns == columns
+                   else f"SELECT DISTINCT ON ({key_list}) {column_list} FROM dup_hash_rows")
+    query = f"""
+        SELECT {column_list}
+        FROM parquet_scan('{parquet_dataset_path}')
+        WHERE {where_clause}
+        AND {row_hash} NOT IN (SELECT row_hash FROM dup_row_hashes)
+        UNION ALL
+        {exact_dedup}
+    """
+    return query, stats
+
+
+def clean_review_batch(batch, derive_datetime: bool = True):
+    """
+    Apply the text cleanup and datetime_of_review derivation to one Arrow record batch.
+
+    Only the configured text columns present in the batch are normalized, so projected batches work too.
+    """
+    df_batch = pl.from_arrow(pa.Table.from_batches([batch]))
+    text_config = {col: options for col, options in TEXT_NORMALIZATION_CONFIG.items() if col in df_batch.columns}
+    df_batch = df_batch.with_columns(build_text_normalizer_exprs(text_config))
+    if derive_datetime:
+        df_batch = df_batch.with_columns(build_datetime_of_review_expr())
+    return df_batch.to_arrow()
+
+
+def write_cleaned_parquet(reader, output_path: str, derive_datetime: bool = True):
+    """
+    Clean the record batches of reader one by one and append them to a Parquet file.
+
+    Returns:
+        int: Number of rows written
+    """
+    # Derive the output schema by cleaning an empty batch
+    schema = clean_review_batch(pa.RecordBatch.from_pylist([], schema=reader.schema), derive_datetime).schema
+    rows_written = 0
+    with pq.ParquetWriter(output_path, schema, compression="snappy") as writer:
+        for batch in reader:
+            writer.write_table(clean_review_batch(batch, derive_datetime))
+            rows_written += batch.num_rows
+            print(f"Rows cleaned and written: {rows_written}")
+    return rows_written
+
+
+def transform_dataset_to_parquet(parquet_dataset_path, parquet_df_file_path, batch_size: int = 500_000,
+                                 partition_by=None, dedup: str = "exact", dedup_columns=None,
+                                 spill_db_path: str = None, memory_limit: str = None, column_profile="full",
+                                 side_table_path: str = None, **partition_options):
+    """
+    Transform the raw Parquet file and write the cleaned rows straight to a Parquet file.
+
+    Rows are filtered and deduplicated in DuckDB and streamed out of the query as Arrow
+    record batches, which are cleaned batch by batch and appended to the output file.
+    Python-side memory is bounded by batch_size instead of the dataset size.
+    The file is written to a temporary path and renamed when complete.
+
+    With a column profile such as "ranking" only the profile's columns are read, deduplicated
+    and written; side_table_path additionally writes the wide text columns (title, text, images)
+    once per review key to a separate file, to be joined by key only when needed.
+
+    Args:
+        parquet_dataset_path: file where the df is stored as parquet
+        parquet_df_file_path (str): Path to the cleaned Parquet file to create
+        batch_size (int): Number of rows cleaned and written per batch
+        partition_by (tuple): Rewrite the cleaned rows as a Hive-partitioned dataset by these columns (optional)
+        dedup (str): "exact" runs SELECT DISTINCT over whole rows, "hash" deduplicates on row hashes
+            first and compares only rows sharing a hash (see prepare_hash_dedup), which needs far less memory
+        dedup_columns (list): Columns identifying a duplicate in "hash" mode (default: every column)
+        spill_db_path (str): Scratch DuckDB file used instead of an in-memory database, so the
+            intermediate tables can spill to disk (deleted afterwards) (optional)
+        memory_limit (str): DuckDB memory cap for the transform, e.g. '8GB' (optional)
+        column_profile: Name in COLUMN_PROFILES ("full", "ranking") or a list of columns to keep
+        side_table_path (str): Parquet file for the review key plus the wide text columns (optional)
+        **partition_options: row_group_size, compression and sort_by for write_partitioned_parquet
+
+    Returns:
+        str: Path to the cleaned Parquet file
+    """
+    if dedup not in ("exact", "hash"):
+        raise ValueError("dedup must be 'exact' or 'hash'")
+    # Ensure the file output directory exists
+    os.makedirs(os.path.dirname(parquet_df_file_path), exist_ok=True)
+
+    if os.path.exists(parquet_df_file_path):
+        print(f"Parquet file {parquet_df_file_path} already exists. Skipping transform.")
+        return parquet_df_file_path
+
+    # A partitioned dataset directory is scanned through a glob
+    parquet_dataset_path = resolve_parquet_path(parquet_dataset_path)
+
+    # Connect to DuckDB (in-memory database unless a scratch file is given)
+    settings = {"memory_limit": memory_limit} if memory_limit else {}
+    con = connect_to_duckdb(spill_db_path or ":memory:", **settings)
+
+    available_columns = [col for col, *_ in con.execute(
+        "DESCRIBE SELECT * FROM parquet_scan(?)", [parquet_dataset_path]).fetchall()]
+    columns = resolve_profile_columns(column_profile, available_columns)
+    column_list = ", ".join(f'"{col}"' for col in columns)
+
+    if dedup == "hash":
+        query, _dedup_stats = prepare_hash_dedup(con, parquet_dataset_path, build_review_filter(), dedup_columns, columns)
+    else:
+        query = f"""
+        SELECT DISTINCT {column_list}
+        FROM '{parquet_dataset_path}'
+        WHERE {build_review_filter()}
+        """
+
+    tmp_path = parquet_df_file_path + ".tmp"
+    side_tmp_path = side_table_path + ".tmp" if side_table_path else None
+    try:
+        # Filter and deduplicate in a single statement, streamed out as record batches
+        write_cleaned_parquet(con.execute(query).fetch_record_batch(batch_size), tmp_path)
+        if side_table_path:
+            os.makedirs(os.path.dirname(side_table_path) or ".", exist_ok=True)
+            wide_columns = [col for col in WIDE_TEXT_COLUMNS if col in available_columns]
+            key_list = ", ".join(f'"{col}"' for col in REVIEW_KEY_COLUMNS)
+            side_reader = con.execute(f"""
+            SELECT DISTINCT ON ({key_list}) {key_list}, {', '.join(f'"{col}"' for col in wide_columns)}
+            FROM '{parquet_dataset_path}'
+            WHERE {build_review_filter()}
+            """).fetch_record_batch(batch_size)
+            write_cleaned_parquet(side_reader, side_tmp_path, derive_datetime=False)
+            os.replace(side_tmp_path, side_table_path)
+            print(f"✔ Text side table saved to Parquet: {side_table_path}")
+        if partition_by:
+            write_partitioned_parquet(tmp_path, parquet_df_file_path, partition_by=partition_by, **partition_options)
+        else:
+            os.replace(tmp_path, parquet_df_file_path)
+    finally:
+        con.close()
+        for leftover in (tmp_path, side_tmp_path):
+            if leftover and os.path.exists(leftover):
+                os.remove(leftover)
+        if spill_db_path:
+            for scratch_file in (spill_db_path, spill_db_path + ".wal"):
+                if os.path.exists(scratch_file):
+                    os.remove(scratch_file)
+
+    print(f"✔ Cleaned data saved to Parquet successfully: {parquet_df_file_path}")
+    return parquet_df_file_path
+
+
+def transform_dataset_streaming_rows(parquet_dataset_path):
+    """Run the streaming transform into a temporary file and return the number of rows written."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = transform_dataset_to_parquet(parquet_dataset_path, os.path.join(tmp_dir, "cleaned.parquet"))
+        return pq.ParquetFile(output_path).metadata.num_rows
+
+
+def transform_dataset_hash_dedup_rows(parquet_dataset_path):
+    """Run the streaming transform with hash dedup into a temporary file and return the number of rows written."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = transform_dataset_to_parquet(parquet_dataset_path, os.path.join(tmp_dir, "cleaned.parquet"),
+                                                   dedup="hash", spill_db_path=os.path.join(tmp_dir, "spill.duckdb"))
+        return pq.ParquetFile(output_path).metadata.num_rows
+
+
+TRANSFORM_MODES = {
+    "current": transform_dataset,
+    "single_pass": transform_dataset_single_pass,
+    "streaming": transform_dataset_streaming_rows,
+    "streaming_hash_dedup": transform_dataset_hash_dedup_rows,
+}
+
+
+def measure_transform_mode(mode, parquet_dataset_path):
+    """Run one transform mode and return its runtime, peak RSS and output row count."""
+    result, seconds, peak_rss = measure_peak_memory(TRANSFORM_MODES[mode], parquet_dataset_path)
+    rows = result if isinstance(result, int) else result.height
+    return {"seconds": round(seconds, 2), "peak_rss_mb": round(peak_rss / 1024**2, 1), "rows": rows}
+
+
+def compare_transform_modes(parquet_dataset_path):
+    """
+    Run every transform mode on the same file and report runtime and peak RSS next to each other.
+
+    Each mode runs in its own worker process so peak RSS is not inflated by the previous run.
+
+    Args:
+        parquet_dataset_path: file where the df is stored as parquet
+
+    Returns:
+        dict: mode -> {"seconds", "peak_rss_mb", "rows"}
+    """
+    report = {}
+    for mode in TRANSFORM_MODES:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            report[mode] = pool.submit(measure_transform_mode, mode, parquet_dataset_path).result()
+
+    for mode, stats in report.items():
+        print(f"{mode:<12} {stats['seconds']:>10} s {stats['peak_rss_mb']:>10} MiB peak RSS {stats['rows']:>12} rows")
+    return report
+
 
 """ EXAMPLE USAGE
 parquet_dataset_path = '/data/datafile.parquet'
-df_cleaned = transform_dataset(parquet_dataset_path) """
+df_cleaned = transform_dataset(parquet_dataset_path)
+df_cleaned = transform_dataset_single_pass(parquet_dataset_path)
+compare_transform_modes(parquet_dataset_path)
+# Streaming mode: writes the cleaned Parquet file without building the full DataFrame
+parquet_path = transform_dataset_to_parquet(parquet_dataset_path, './data/output/df_cleaned.parquet')
+# Only the columns the rankings need, with the review texts in a side file
+parquet_path = transform_dataset_to_parquet(parquet_dataset_path, './data/output/df_cleaned.parquet', column_profile="ranking",
+                                            side_table_path='./data/output/df_review_texts.parquet')
+# Hash dedup in a disk-backed scratch database with a memory cap
+parquet_path = transform_dataset_to_parquet(parquet_dataset_path, './data/output/df_cleaned.parquet', dedup="hash",
+                                            spill_db_path='./data/tmp/transform_spill.duckdb', memory_limit='8GB') """
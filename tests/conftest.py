@@ -0,0 +1,94 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import duckdb
+import pytest
+import requests
+
+# The pipeline modules import each other as src.* / utils.* from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def write_reviews():
+    """Write synthetic cleaned reviews start..start+n-1 (8 per product) to Parquet; overlapping ranges repeat reviews."""
+    def write(path, start, n):
+        duckdb.connect().execute(f"""
+            COPY (
+                SELECT
+                    (i % 5 + 1)::BIGINT AS rating,
+                    'title ' || i AS title,
+                    'text ' || i AS text,
+                    'B' || lpad((i // 8)::VARCHAR, 9, '0') AS asin,
+                    'P' || lpad((i // 16)::VARCHAR, 9, '0') AS parent_asin,
+                    'U' || (i % 97)::VARCHAR AS user_id,
+                    (1600000000000 + i * 86400000)::BIGINT AS "timestamp",
+                    (i % 7)::BIGINT AS helpful_vote,
+                    true AS verified_purchase
+                FROM range({start}, {start + n}) t(i)
+            ) TO '{path}' (FORMAT parquet)
+        """)
+        return str(path)
+    return write
+
+
+class StubSearchServer:
+    """
+    Local HTTP server standing in for the search engine.
+
+    GET /search/<product_id> answers after `latency` seconds with one amazon result, or 500 for IDs
+    in `failing`; every request is logged as (Host header, product ID, time.monotonic()).
+    """
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.failing = set()
+        self.requests = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                product_id = self.path.rsplit("/", 1)[-1]
+                with stub.lock:
+                    stub.requests.append((self.headers["Host"].split(":")[0], product_id, time.monotonic()))
+                time.sleep(stub.latency)
+                if product_id in stub.failing:
+                    self.send_response(500)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = json.dumps([{"title": f"Product {product_id}",
+                                    "url": f"https://www.amazon.com/dp/{product_id}"}]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def search_fn(self, host: str = "127.0.0.1"):
+        """A search function for enrich_product_ids_concurrently / insert_product_url_from_web."""
+        def search(product_id, session=None):
+            response = (session or requests).get(f"http://{host}:{self.port}/search/{product_id}", timeout=10)
+            response.raise_for_status()
+            return response.json()
+        return search
+
+
+@pytest.fixture
+def stub_search_server():
+    server = StubSearchServer()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
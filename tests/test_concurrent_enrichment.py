@@ -0,0 +1,111 @@
+import time
+import duckdb
+import pytest
+import requests
+from utils.concurrent_enrichment import enrich_product_ids_concurrently
+from utils.insert_to_table import insert_product_url_from_web
+
+PRODUCT_IDS = [f"B{i:09d}" for i in range(16)]
+
+
+def timed_enrichment(product_ids, search_fn, **kwargs):
+    start_time = time.monotonic()
+    results = enrich_product_ids_concurrently(product_ids, search_fn=search_fn, **kwargs)
+    return results, time.monotonic() - start_time
+
+
+def test_wall_clock_scales_with_concurrency(stub_search_server):
+    stub_search_server.latency = 0.1
+    search = stub_search_server.search_fn()
+    sequential, sequential_seconds = timed_enrichment(PRODUCT_IDS, search, max_workers=1)
+    concurrent, concurrent_seconds = timed_enrichment(PRODUCT_IDS, search, max_workers=8)
+
+    assert sequential == concurrent
+    assert concurrent["B000000003"] == ("Product B000000003", "https://www.amazon.com/dp/B000000003")
+    assert sequential_seconds >= 16 * 0.1
+    assert concurrent_seconds < sequential_seconds / 3
+
+
+def test_rate_limit_applies_per_request_host(stub_search_server):
+    stub_search_server.latency = 0.0
+    product_ids = PRODUCT_IDS[:11]
+    _results, one_host_seconds = timed_enrichment(
+        product_ids, stub_search_server.search_fn("127.0.0.1"), max_workers=8, requests_per_second=10)
+    # 1 burst token, then one request every 0.1 s
+    assert one_host_seconds >= 0.9
+    times = sorted(t for host, _id, t in stub_search_server.requests)
+    assert all(later - earlier >= 0.08 for earlier, later in zip(times, times[1:]))
+
+    # The same searches spread over two hosts get two budgets
+    search_127, search_localhost = stub_search_server.search_fn("127.0.0.1"), stub_search_server.search_fn("localhost")
+
+    def two_host_search(product_id, session):
+        search = search_127 if int(product_id[1:]) % 2 else search_localhost
+        return search(product_id, session)
+
+    stub_search_server.requests.clear()
+    _results, two_host_seconds = timed_enrichment(product_ids, two_host_search, max_workers=8, requests_per_second=10)
+    assert {host for host, _id, _t in stub_search_server.requests} == {"127.0.0.1", "localhost"}
+    assert two_host_seconds < one_host_seconds * 0.75
+
+
+def test_search_without_session_is_limited_per_call(stub_search_server):
+    stub_search_server.latency = 0.0
+    search = stub_search_server.search_fn()
+    session = requests.Session()
+    _results, seconds = timed_enrichment(PRODUCT_IDS[:6], lambda product_id: search(product_id, session),
+                                         max_workers=4, requests_per_second=10)
+    session.close()
+    assert seconds >= 0.45
+
+
+def test_failed_searches_are_reported(stub_search_server):
+    stub_search_server.failing = {"B000000002", "B000000005"}
+    errors = {}
+    results = enrich_product_ids_concurrently(
+        PRODUCT_IDS[:8], search_fn=stub_search_server.search_fn(), max_workers=4,
+        on_error=lambda product_id, error: errors.setdefault(product_id, error))
+    assert set(errors) == {"B000000002", "B000000005"}
+    assert set(results) == set(PRODUCT_IDS[:8]) - set(errors)
+
+    # Without on_error a failed lookup counts as no result
+    results = enrich_product_ids_concurrently(PRODUCT_IDS[:8], search_fn=stub_search_server.search_fn(), max_workers=4)
+    assert results["B000000002"] == ("No result", "")
+
+
+@pytest.fixture
+def input_db(tmp_path):
+    db_path = str(tmp_path / "db.duckdb")
+    con = duckdb.connect(db_path)
+    con.execute("CREATE TABLE top_products_count AS SELECT unnest(?) AS Product_ID, 1 AS count", [PRODUCT_IDS])
+    con.close()
+    return db_path
+
+
+def read_job(db_path):
+    con = duckdb.connect(db_path, read_only=True)
+    urls = dict(con.execute("SELECT Product_ID, URL FROM product_url_table").fetchall())
+    job = {product_id: (status, retries) for product_id, status, retries in con.execute(
+        "SELECT Product_ID, status, retry_count FROM product_url_table_job").fetchall()}
+    con.close()
+    return urls, job
+
+
+def test_concurrent_enrichment_retries_failures_up_to_max_retries(stub_search_server, input_db):
+    stub_search_server.failing = {"B000000004"}
+    enrich = dict(search_fn=stub_search_server.search_fn(), max_workers=8, cache_table=None, flush_size=5, max_retries=2)
+    insert_product_url_from_web(input_db, "top_products_count", "product_url_table", **enrich)
+    urls, job = read_job(input_db)
+    assert job["B000000004"] == ("failed", 1)
+    assert urls["B000000004"] == ""
+    assert sum(status == "done" for status, _retries in job.values()) == 15
+
+    insert_product_url_from_web(input_db, "top_products_count", "product_url_table", resume=True, **enrich)
+    assert read_job(input_db)[1]["B000000004"] == ("failed", 2)
+
+    # Given up after max_retries, even once the search would succeed
+    stub_search_server.failing = set()
+    stub_search_server.requests.clear()
+    insert_product_url_from_web(input_db, "top_products_count", "product_url_table", resume=True, **enrich)
+    assert stub_search_server.requests == []
+    assert read_job(input_db)[1]["B000000004"] == ("failed", 2)
@@ -0,0 +1,60 @@
+import sqlite3
+import pyarrow as pa
+import pytest
+from src.create_table import write_arrow_to_sqlite
+
+
+def batches(n_batches, fail_after=None):
+    for i in range(n_batches):
+        if i == fail_after:
+            raise RuntimeError("source failed")
+        yield pa.record_batch({"Product_ID": [f"B{i}{j}" for j in range(10)], "count": list(range(10))})
+
+
+def reader(n_batches, fail_after=None):
+    schema = pa.schema([("Product_ID", pa.string()), ("count", pa.int64())])
+    return pa.RecordBatchReader.from_batches(schema, batches(n_batches, fail_after))
+
+
+def test_write_arrow_to_sqlite(tmp_path):
+    db_path = str(tmp_path / "out.sqlite")
+    assert write_arrow_to_sqlite(reader(3), db_path, "top", indexes=["Product_ID"]) == 30
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT COUNT(*), SUM("count") FROM top').fetchone() == (30, 135)
+    assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall() == [("idx_top_Product_ID",)]
+    conn.close()
+
+
+def test_failed_append_rolls_back_and_releases_the_database(tmp_path):
+    db_path = str(tmp_path / "out.sqlite")
+    with pytest.raises(RuntimeError):
+        write_arrow_to_sqlite(reader(4, fail_after=3), db_path, "top", rows_per_transaction=20, replace=False)
+
+    conn = sqlite3.connect(db_path, timeout=0)
+    # The first 20 rows were committed, the open transaction with the third batch was rolled back
+    assert conn.execute("SELECT COUNT(*) FROM top").fetchone()[0] == 20
+    # Not left locked by the failed load
+    conn.execute("BEGIN EXCLUSIVE")
+    conn.execute("ROLLBACK")
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    conn.close()
+
+
+def test_failed_replace_keeps_the_old_table(tmp_path):
+    db_path = str(tmp_path / "out.sqlite")
+    write_arrow_to_sqlite(reader(3), db_path, "top", indexes=["Product_ID"])
+    with pytest.raises(RuntimeError):
+        write_arrow_to_sqlite(reader(4, fail_after=3), db_path, "top", indexes=["Product_ID"], rows_per_transaction=20)
+
+    conn = sqlite3.connect(db_path, timeout=0)
+    assert conn.execute('SELECT COUNT(*), SUM("count") FROM top').fetchone() == (30, 135)
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '%top%' ORDER BY name").fetchall() == [("idx_top_Product_ID",), ("top",)]
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    conn.close()
+
+    # A successful replace swaps in the new rows with their index
+    assert write_arrow_to_sqlite(reader(2), db_path, "top", indexes=["Product_ID"]) == 20
+    conn = sqlite3.connect(db_path, timeout=0)
+    assert conn.execute('SELECT COUNT(*), SUM("count") FROM top').fetchone() == (20, 90)
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '%top%' ORDER BY name").fetchall() == [("idx_top_Product_ID",), ("top",)]
+    conn.close()
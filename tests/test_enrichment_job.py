@@ -0,0 +1,125 @@
+import duckdb
+import pytest
+from utils.insert_to_table import insert_product_url_from_web
+from utils.stage_cache import StageCache
+
+PRODUCT_IDS = [f"B{i:09d}" for i in range(16)]
+
+
+class SimulatedCrash(BaseException):
+    """Stands in for the process dying: not an Exception, so the enrichment does not record it as a failed search."""
+
+
+def crashing_search(search_fn, crash_after: int):
+    """Wrap search_fn so that the search after the first crash_after searches crashes the run."""
+    calls = []
+
+    def search(product_id, session=None):
+        if len(calls) >= crash_after:
+            raise SimulatedCrash(product_id)
+        calls.append(product_id)
+        return search_fn(product_id, session)
+    return search
+
+
+def write_input_table(db_path, product_ids):
+    con = duckdb.connect(db_path)
+    con.execute("CREATE OR REPLACE TABLE top_products_count AS SELECT unnest(?) AS Product_ID, 1 AS count", [product_ids])
+    con.close()
+
+
+def read_output(db_path):
+    con = duckdb.connect(db_path, read_only=True)
+    urls = dict(con.execute("SELECT Product_ID, URL FROM product_url_table").fetchall())
+    statuses = dict(con.execute("SELECT Product_ID, status FROM product_url_table_job").fetchall())
+    con.close()
+    return urls, statuses
+
+
+def searched_ids(stub_search_server):
+    return sorted(product_id for _host, product_id, _time in stub_search_server.requests)
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_resume_after_crash_searches_only_unfinished_ids(tmp_path, stub_search_server, max_workers):
+    db_path = str(tmp_path / "db.duckdb")
+    write_input_table(db_path, PRODUCT_IDS)
+    enrich = dict(max_workers=max_workers, cache_table=None, flush_size=5)
+
+    with pytest.raises(SimulatedCrash):
+        insert_product_url_from_web(db_path, "top_products_count", "product_url_table",
+                                    search_fn=crashing_search(stub_search_server.search_fn(), 12), **enrich)
+    urls, statuses = read_output(db_path)
+    done = {product_id for product_id, status in statuses.items() if status == "done"}
+    # Only whole flushes of 5 were committed (both of them when searching one at a time); results buffered at the crash are lost
+    assert len(done) == 10 if max_workers == 1 else len(done) in (5, 10)
+    assert all(urls[product_id].endswith(product_id) for product_id in done)
+
+    stub_search_server.requests.clear()
+    insert_product_url_from_web(db_path, "top_products_count", "product_url_table", resume=True,
+                                search_fn=stub_search_server.search_fn(), **enrich)
+    urls, statuses = read_output(db_path)
+    assert searched_ids(stub_search_server) == sorted(set(PRODUCT_IDS) - done)
+    assert set(statuses.values()) == {"done"}
+    assert all(urls[product_id] == f"https://www.amazon.com/dp/{product_id}" for product_id in PRODUCT_IDS)
+
+    # Without resume the job starts over
+    stub_search_server.requests.clear()
+    insert_product_url_from_web(db_path, "top_products_count", "product_url_table",
+                                search_fn=stub_search_server.search_fn(), **enrich)
+    assert searched_ids(stub_search_server) == PRODUCT_IDS
+
+
+def test_stage_rerun_resumes_instead_of_rebuilding(tmp_path, stub_search_server):
+    db_path = str(tmp_path / "db.duckdb")
+    cache = StageCache(str(tmp_path / "stage_manifest.json"))
+    write_input_table(db_path, PRODUCT_IDS[:12])
+
+    def run_enrich_stage(search_fn, top_n_version):
+        # top_n_version stands in for the upstream top-N stage's fingerprint changing
+        return cache.run_stage(
+            "enrich", insert_product_url_from_web, db_path, "top_products_count", "product_url_table",
+            flush_size=5, cache_table=None, resume=True, search_fn=search_fn, params={"top_n": top_n_version},
+            output_db_path=db_path, output_tables=["product_url_table"], keep_outputs=["product_url_table"])
+
+    with pytest.raises(SimulatedCrash):
+        run_enrich_stage(crashing_search(stub_search_server.search_fn(), 7), 1)
+    stub_search_server.requests.clear()
+    run_enrich_stage(stub_search_server.search_fn(), 1)
+    assert len(searched_ids(stub_search_server)) == 12 - 5
+
+    # A new top-N table: products that dropped out are removed, only the new ones are searched
+    write_input_table(db_path, PRODUCT_IDS[4:])
+    stub_search_server.requests.clear()
+    run_enrich_stage(stub_search_server.search_fn(), 2)
+    urls, statuses = read_output(db_path)
+    assert searched_ids(stub_search_server) == PRODUCT_IDS[12:]
+    assert sorted(urls) == sorted(statuses) == PRODUCT_IDS[4:]
+    assert set(statuses.values()) == {"done"}
+
+
+def test_resume_searches_done_ids_again_once_their_cache_entry_expired(tmp_path, stub_search_server):
+    db_path = str(tmp_path / "db.duckdb")
+    write_input_table(db_path, PRODUCT_IDS)
+    enrich = dict(search_fn=stub_search_server.search_fn(), flush_size=5, resume=True)
+    insert_product_url_from_web(db_path, "top_products_count", "product_url_table", **enrich)
+    assert searched_ids(stub_search_server) == PRODUCT_IDS
+
+    stub_search_server.requests.clear()
+    insert_product_url_from_web(db_path, "top_products_count", "product_url_table", **enrich)
+    assert searched_ids(stub_search_server) == []
+
+    # Two entries expired, one was evicted
+    con = duckdb.connect(db_path)
+    con.execute("""
+        UPDATE product_resolution_cache SET expires_at = current_localtimestamp() - INTERVAL 1 DAY
+        WHERE Product_ID IN ('B000000001', 'B000000002')
+    """)
+    con.execute("DELETE FROM product_resolution_cache WHERE Product_ID = 'B000000003'")
+    con.close()
+    stub_search_server.requests.clear()
+    insert_product_url_from_web(db_path, "top_products_count", "product_url_table", **enrich)
+    assert searched_ids(stub_search_server) == ["B000000001", "B000000002", "B000000003"]
+    urls, statuses = read_output(db_path)
+    assert set(statuses.values()) == {"done"}
+    assert urls["B000000002"] == "https://www.amazon.com/dp/B000000002"
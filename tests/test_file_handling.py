@@ -0,0 +1,38 @@
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.file_handling import export_hf_dataset_parallel
+
+
+class ArrowCacheSplit:
+    """The parts of a datasets.Dataset export_hf_dataset_parallel reads: its Arrow cache files and row count."""
+
+    def __init__(self, arrow_file, num_rows):
+        self.cache_files = [{"filename": arrow_file}]
+        self.num_rows = num_rows
+
+
+def write_arrow_cache(path, num_rows):
+    table = pa.table({"i": list(range(num_rows))})
+    with pa.OSFile(str(path), "wb") as f, pa.ipc.new_stream(f, table.schema) as writer:
+        writer.write_table(table)
+    return str(path)
+
+
+def test_export_removes_only_its_own_stale_files(tmp_path):
+    split = ArrowCacheSplit(write_arrow_cache(tmp_path / "data.arrow", 100), 100)
+    output_dir = tmp_path / "output"
+    (output_dir / "metrics").mkdir(parents=True)
+    for name in ("part-00000-of-00008.parquet", "part-00001-of-00003.parquet.tmp"):
+        (output_dir / name).write_text("stale")
+    for name in ("amazon_sales_db.duckDB", "top_products_count.xlsx", "stage_manifest.json", "metrics/run.json"):
+        (output_dir / name).write_text("keep")
+
+    export_hf_dataset_parallel({"train": split}, str(output_dir), num_shards=3, max_workers=1)
+
+    assert sorted(os.listdir(output_dir)) == [
+        "_SUCCESS", "amazon_sales_db.duckDB", "metrics", "part-00000-of-00003.parquet",
+        "part-00001-of-00003.parquet", "part-00002-of-00003.parquet", "stage_manifest.json", "top_products_count.xlsx"]
+    assert (output_dir / "metrics" / "run.json").read_text() == "keep"
+    shards = sorted(output_dir.glob("part-*.parquet"))
+    assert pq.read_table(shards).column("i").to_pylist() == list(range(100))
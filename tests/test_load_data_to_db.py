@@ -0,0 +1,151 @@
+import os
+import duckdb
+import pytest
+from src.load_data_to_db import load_parquet_incremental, load_parquet_to_duckdb
+from src.transform_data import write_cleaned_parquet
+from utils.create_duckdb_table import create_product_stats_table, create_top_products_table
+from utils.rollup_tables import (check_rollup_consistency, query_top_products_from_rollup,
+                                 ROLLUP_DIMENSIONS, KEYED_ROLLUP_DIMENSIONS)
+
+GROUPED_TABLES = [{"table_name": "top_products_count", "filter_column": "rating", "filter_operator": "=", "filter_value": 5}]
+ROLLUP_TABLES = [{"rollup_table": "reviews_rollup_asin_rating_month"}]
+
+
+def load_two_drops(tmp_path, write_reviews, surrogate_keys):
+    """Load a first review drop, then a second one that repeats part of the first and adds new products."""
+    incoming = tmp_path / f"incoming_{surrogate_keys}"
+    incoming.mkdir()
+    db_path = str(tmp_path / f"db_{surrogate_keys}.duckdb")
+    write_reviews(incoming / "drop_1.parquet", 0, 300)
+    load_parquet_incremental(db_path, "amazon_reviews", str(incoming), grouped_tables=GROUPED_TABLES,
+                             rollup_tables=ROLLUP_TABLES, surrogate_keys=surrogate_keys)
+    # 100 reviews already loaded, 200 new ones, some of them for new products
+    write_reviews(incoming / "drop_2.parquet", 200, 300)
+    added = load_parquet_incremental(db_path, "amazon_reviews", str(incoming), grouped_tables=GROUPED_TABLES,
+                                     rollup_tables=ROLLUP_TABLES, surrogate_keys=surrogate_keys)
+    return db_path, added
+
+
+def test_keyed_incremental_load_matches_string_load(tmp_path, write_reviews):
+    string_db, string_added = load_two_drops(tmp_path, write_reviews, surrogate_keys=False)
+    keyed_db, keyed_added = load_two_drops(tmp_path, write_reviews, surrogate_keys=True)
+    assert keyed_added == string_added == 200
+
+    def top_products(db_path):
+        con = duckdb.connect(db_path, read_only=True)
+        rows = con.execute("SELECT Product_ID, count FROM top_products_count ORDER BY count DESC, Product_ID").fetchall()
+        con.close()
+        return rows
+
+    keyed_top = top_products(keyed_db)
+    assert keyed_top == top_products(string_db)
+    assert all(isinstance(product_id, str) and product_id.startswith("B") for product_id, _count in keyed_top)
+
+    assert check_rollup_consistency(string_db, dimensions=ROLLUP_DIMENSIONS)["consistent"]
+    assert check_rollup_consistency(keyed_db, dimensions=KEYED_ROLLUP_DIMENSIONS)["consistent"]
+    for metric in ("review_count", "helpful_votes"):
+        assert (query_top_products_from_rollup(keyed_db, metric=metric, rating=5, limit=20)
+                == query_top_products_from_rollup(string_db, metric=metric, rating=5, limit=20))
+
+
+def test_keyed_incremental_load_keeps_existing_keys(tmp_path, write_reviews):
+    incoming = tmp_path / "incoming"
+    incoming.mkdir()
+    db_path = str(tmp_path / "db.duckdb")
+    write_reviews(incoming / "drop_1.parquet", 0, 300)
+    load_parquet_incremental(db_path, "amazon_reviews", str(incoming), surrogate_keys=True)
+    con = duckdb.connect(db_path, read_only=True)
+    keys_before = dict(con.execute("SELECT product_id, product_key FROM dim_product").fetchall())
+    con.close()
+
+    write_reviews(incoming / "drop_2.parquet", 200, 300)
+    load_parquet_incremental(db_path, "amazon_reviews", str(incoming), surrogate_keys=True)
+    con = duckdb.connect(db_path, read_only=True)
+    keys_after = dict(con.execute("SELECT product_id, product_key FROM dim_product").fetchall())
+    decoded_rows = con.execute("SELECT COUNT(*), COUNT(asin) FROM amazon_reviews_decoded").fetchone()
+    con.close()
+
+    assert {product_id: keys_after[product_id] for product_id in keys_before} == keys_before
+    assert len(keys_after) == len(keys_before) + 25 + 13   # new products and their new parent products
+    assert decoded_rows == (500, 500)
+
+
+@pytest.mark.parametrize("surrogate_keys", [False, True])
+def test_incremental_load_skips_loaded_files(tmp_path, write_reviews, surrogate_keys):
+    db_path, _added = load_two_drops(tmp_path, write_reviews, surrogate_keys)
+    incoming = tmp_path / f"incoming_{surrogate_keys}"
+    assert load_parquet_incremental(db_path, "amazon_reviews", str(incoming), grouped_tables=GROUPED_TABLES,
+                                    rollup_tables=ROLLUP_TABLES, surrogate_keys=surrogate_keys) == 0
+
+
+@pytest.mark.parametrize("surrogate_keys", [False, True])
+def test_incremental_load_refreshes_product_stats_and_ranks_ties_like_a_rebuild(tmp_path, write_reviews, surrogate_keys):
+    incoming = tmp_path / "incoming"
+    incoming.mkdir()
+    db_path = str(tmp_path / "db.duckdb")
+    stats_options = {"group_column": "asin_key", "dimension_table": "dim_product"} if surrogate_keys else {}
+    # Few 5-star reviews per product, so the top 10 is decided by the tie-break
+    grouped_tables = [{**GROUPED_TABLES[0], "limit": 10}]
+    write_reviews(incoming / "drop_1.parquet", 0, 300)
+    load_parquet_incremental(db_path, "amazon_reviews", str(incoming), grouped_tables=grouped_tables,
+                             surrogate_keys=surrogate_keys)
+    create_product_stats_table(db_path, "product_stats", **stats_options)
+
+    write_reviews(incoming / "drop_2.parquet", 200, 300)
+    load_parquet_incremental(db_path, "amazon_reviews", str(incoming), grouped_tables=grouped_tables,
+                             surrogate_keys=surrogate_keys)
+    create_product_stats_table(db_path, "product_stats_rebuilt", **stats_options)
+    create_top_products_table(db_path, "top_products_rebuilt", "rating_5_count", stats_table="product_stats_rebuilt",
+                              metric_alias="count", limit=10)
+
+    con = duckdb.connect(db_path, read_only=True)
+    stats = con.execute("SELECT * FROM product_stats ORDER BY Product_ID").fetchall()
+    assert len(stats) == 63
+    assert stats == con.execute("SELECT * FROM product_stats_rebuilt ORDER BY Product_ID").fetchall()
+    assert (con.execute("SELECT * FROM top_products_count").fetchall()
+            == con.execute("SELECT * FROM top_products_rebuilt").fetchall())
+    con.close()
+
+
+def test_failed_file_is_rolled_back_and_not_recorded(tmp_path, write_reviews):
+    incoming = tmp_path / "incoming"
+    incoming.mkdir()
+    db_path = str(tmp_path / "db.duckdb")
+    write_reviews(incoming / "drop_1.parquet", 0, 300)
+    load_parquet_incremental(db_path, "amazon_reviews", str(incoming), grouped_tables=GROUPED_TABLES)
+
+    # The rows of drop_2 are inserted before the grouped table refresh fails
+    write_reviews(incoming / "drop_2.parquet", 200, 300)
+    broken_tables = [{**GROUPED_TABLES[0], "filter_column": "no_such_column"}]
+    with pytest.raises(duckdb.Error) as excinfo:
+        load_parquet_incremental(db_path, "amazon_reviews", str(incoming), grouped_tables=broken_tables)
+
+    # The traceback keeps the loader's frame alive; its connection must still have been closed,
+    # otherwise the file can't be opened again with another configuration
+    assert excinfo.traceback
+    con = duckdb.connect(db_path, read_only=True)
+    assert con.execute("SELECT COUNT(*) FROM amazon_reviews").fetchone()[0] == 300
+    assert [os.path.basename(path) for path, in con.execute(
+        "SELECT file_path FROM amazon_reviews_load_manifest").fetchall()] == ["drop_1.parquet"]
+    con.close()
+
+    assert load_parquet_incremental(db_path, "amazon_reviews", str(incoming), grouped_tables=GROUPED_TABLES) == 200
+
+
+def test_ranking_profile_keeps_the_review_datetime(tmp_path, write_reviews):
+    raw_path = write_reviews(tmp_path / "raw.parquet", 0, 100)
+    cleaned_path = str(tmp_path / "cleaned.parquet")
+    con = duckdb.connect()
+    write_cleaned_parquet(con.execute("SELECT * FROM read_parquet(?)", [raw_path]).fetch_record_batch(50), cleaned_path)
+    con.close()
+    db_path = str(tmp_path / "db.duckdb")
+    load_parquet_to_duckdb(db_path, "amazon_reviews", cleaned_path, column_profile="ranking")
+
+    con = duckdb.connect(db_path, read_only=True)
+    columns = [col for col, *_ in con.execute("DESCRIBE amazon_reviews").fetchall()]
+    assert columns == ["rating", "asin", "parent_asin", "user_id", "timestamp", "datetime_of_review",
+                       "helpful_vote", "verified_purchase"]
+    assert con.execute("""
+        SELECT COUNT(*) FROM amazon_reviews WHERE datetime_of_review = make_timestamp("timestamp" * 1000)
+    """).fetchone()[0] == 100
+    con.close()
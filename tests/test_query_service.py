@@ -0,0 +1,133 @@
+import json
+import threading
+import duckdb
+import pytest
+from urllib.request import urlopen
+from urllib.error import HTTPError
+from src.load_data_to_db import load_parquet_to_duckdb
+from src.query_service import publish_serving_snapshot, QueryService, ReadOnlyConnectionPool, start_query_server
+from utils.create_duckdb_table import create_product_stats_table
+from utils.rollup_tables import create_rollup_table, KEYED_ROLLUP_DIMENSIONS
+
+
+@pytest.fixture
+def snapshot(tmp_path, write_reviews):
+    """Keyed pipeline database with stats, rollup and a few URLs, published as a serving snapshot."""
+    db_path = str(tmp_path / "db.duckdb")
+    load_parquet_to_duckdb(db_path, "amazon_reviews", write_reviews(tmp_path / "reviews.parquet", 0, 2000),
+                           surrogate_keys=True)
+    create_product_stats_table(db_path, "product_stats", group_column="asin_key", dimension_table="dim_product")
+    create_rollup_table(db_path, dimensions=KEYED_ROLLUP_DIMENSIONS)
+    con = duckdb.connect(db_path)
+    con.execute("""
+        CREATE TABLE product_url_table AS
+        SELECT Product_ID, 'Name ' || Product_ID AS Product_Name, 'https://www.amazon.com/dp/' || Product_ID AS URL
+        FROM product_stats ORDER BY Product_ID LIMIT 10
+    """)
+    con.close()
+    snapshot_path = str(tmp_path / "serving_snapshot.duckdb")
+    publish_serving_snapshot(db_path, snapshot_path)
+    return db_path, snapshot_path
+
+
+def test_top_products_and_lookup(snapshot):
+    db_path, snapshot_path = snapshot
+    service = QueryService(snapshot_path, pool_size=2)
+    con = duckdb.connect(db_path, read_only=True)
+    expected = con.execute("""
+        SELECT d.product_id, SUM(helpful_votes) AS value
+        FROM reviews_rollup_asin_rating_month r JOIN dim_product d ON d.product_key = r.asin_key
+        WHERE rating = 5 GROUP BY 1 ORDER BY value DESC, 1 LIMIT 5
+    """).fetchall()
+    con.close()
+    top = service.top_products("helpful_votes", rating=5, limit=5)
+    assert [(row["Product_ID"], row["value"]) for row in top] == expected
+
+    product = service.product("B000000001")
+    assert product["review_count"] == 8
+    assert product["URL"] == "https://www.amazon.com/dp/B000000001"
+    assert service.product("missing") is None
+
+
+@pytest.mark.parametrize("metric", ["Product_ID", "asin_key", "review_month", "rating", "avg_rating"])
+def test_rating_filter_rejects_non_measures(snapshot, metric):
+    service = QueryService(snapshot[1])
+    with pytest.raises(ValueError):
+        service.top_products(metric, rating=5)
+
+
+def test_http_errors_are_json(snapshot):
+    server = start_query_server(QueryService(snapshot[1]), port=0)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        for path, status in [("/top?metric=review_month&rating=5", 400), ("/top?metric=Product_ID&rating=5", 400),
+                             ("/top?limit=0", 400), ("/product/missing", 404)]:
+            with pytest.raises(HTTPError) as error:
+                urlopen(base_url + path)
+            assert error.value.code == status
+            assert "error" in json.loads(error.value.read())
+        with urlopen(base_url + "/top?metric=review_count&rating=5&limit=3") as response:
+            assert len(json.loads(response.read())) == 3
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_retired_pool_closes_after_last_borrower(snapshot):
+    pool = ReadOnlyConnectionPool(snapshot[1], size=2)
+    with pool.cursor() as cursor:
+        pool.retire()
+        assert not pool.closed
+        assert cursor.execute("SELECT COUNT(*) FROM product_stats").fetchone()[0] == 250
+    assert pool.closed
+    with pytest.raises(RuntimeError):
+        pool.reserve()
+
+
+def test_republished_data_is_served(snapshot):
+    db_path, snapshot_path = snapshot
+    service = QueryService(snapshot_path, pool_size=2)
+    assert service.product("B000000001")["URL"] == "https://www.amazon.com/dp/B000000001"
+    top = service.top_products("review_count", rating=5, limit=3)
+
+    con = duckdb.connect(db_path)
+    con.execute("UPDATE product_url_table SET URL = 'https://www.amazon.de/dp/' || Product_ID")
+    con.execute("UPDATE product_stats SET rating_5_count = rating_5_count + 100 WHERE Product_ID = 'B000000200'")
+    con.close()
+    publish_serving_snapshot(db_path, snapshot_path)
+
+    assert service.product("B000000001")["URL"] == "https://www.amazon.de/dp/B000000001"
+    new_top = service.top_products("review_count", rating=5, limit=3)
+    assert new_top[0]["Product_ID"] == "B000000200" != top[0]["Product_ID"]
+    assert service.reloads == 2
+
+
+def test_queries_during_concurrent_publishes(snapshot):
+    db_path, snapshot_path = snapshot
+    service = QueryService(snapshot_path, pool_size=2, cache_size=0)
+    expected_top = service.top_products("review_count", rating=5, limit=20)
+    expected_product = service.product("B000000003")
+    errors = []
+    stop = threading.Event()
+
+    def query():
+        while not stop.is_set():
+            try:
+                assert service.top_products("review_count", rating=5, limit=20) == expected_top
+                assert service.product("B000000003") == expected_product
+            except Exception as e:
+                errors.append(e)
+                return
+
+    clients = [threading.Thread(target=query) for _ in range(6)]
+    for client in clients:
+        client.start()
+    for _ in range(5):
+        publish_serving_snapshot(db_path, snapshot_path)
+    stop.set()
+    for client in clients:
+        client.join(timeout=30)
+
+    assert not any(client.is_alive() for client in clients)
+    assert errors == []
+    assert service.reloads > 1
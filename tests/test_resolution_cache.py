@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+import duckdb
+import pytest
+from utils.resolution_cache import create_cache_table, get_cached_results, store_results, evict_cache
+
+T0 = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def con():
+    con = duckdb.connect()
+    create_cache_table(con)
+    yield con
+    con.close()
+
+
+def test_entries_expire_after_their_ttl(con):
+    store_results(con, {"B1": ("Product 1", "https://www.amazon.com/dp/B1"), "B2": ("No result", "")},
+                  ttl=timedelta(days=30), negative_ttl=timedelta(days=7), now=T0)
+
+    assert get_cached_results(con, ["B1", "B2", "B3"], now=T0 + timedelta(days=6)) == {
+        "B1": ("Product 1", "https://www.amazon.com/dp/B1"), "B2": ("No result", "")}
+    # The negative entry expires first, the positive one only after its own TTL
+    assert get_cached_results(con, ["B1", "B2"], now=T0 + timedelta(days=7)) == {
+        "B1": ("Product 1", "https://www.amazon.com/dp/B1")}
+    assert get_cached_results(con, ["B1", "B2"], now=T0 + timedelta(days=30)) == {}
+    assert con.execute("SELECT Product_ID, is_negative FROM product_resolution_cache ORDER BY 1").fetchall() == [
+        ("B1", False), ("B2", True)]
+
+
+def test_storing_again_renews_the_entry(con):
+    store_results(con, {"B1": ("No result", "")}, negative_ttl=timedelta(days=7), now=T0)
+    store_results(con, {"B1": ("Product 1", "https://www.amazon.com/dp/B1")}, ttl=timedelta(days=30),
+                  now=T0 + timedelta(days=10))
+    assert get_cached_results(con, ["B1"], now=T0 + timedelta(days=39)) == {
+        "B1": ("Product 1", "https://www.amazon.com/dp/B1")}
+
+
+def test_evict_removes_expired_then_least_recently_used(con):
+    store_results(con, {f"B{i}": (f"Product {i}", f"https://www.amazon.com/dp/B{i}") for i in range(5)},
+                  ttl=timedelta(days=30), now=T0)
+    store_results(con, {"B9": ("No result", "")}, negative_ttl=timedelta(days=1), now=T0)
+    # Reading B0 and B1 later makes them the most recently used entries
+    get_cached_results(con, ["B1"], now=T0 + timedelta(days=2))
+    get_cached_results(con, ["B0"], now=T0 + timedelta(days=3))
+    # Expired entries are not touched by a lookup
+    get_cached_results(con, ["B9"], now=T0 + timedelta(days=3))
+
+    assert evict_cache(con, max_entries=3, now=T0 + timedelta(days=4)) == 3
+    assert con.execute("SELECT Product_ID FROM product_resolution_cache ORDER BY 1").fetchall() == [
+        ("B0",), ("B1",), ("B2",)]   # B9 expired, then the ties among B2..B4 are cut by Product_ID
+
+    assert evict_cache(con, max_entries=None, now=T0 + timedelta(days=30)) == 3
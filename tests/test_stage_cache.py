@@ -0,0 +1,29 @@
+import os
+from utils.stage_cache import StageCache
+
+
+def test_stages_sharing_an_output_do_not_rerun_each_other(tmp_path):
+    snapshot_path = str(tmp_path / "snapshot.txt")
+    runs = []
+
+    def publish(path, label):
+        runs.append(label)
+        with open(path, "w") as f:
+            f.write(label * len(runs))
+
+    def run_pipeline():
+        cache = StageCache(str(tmp_path / "stage_manifest.json"))
+        cache.run_stage("publish", publish, snapshot_path, "stats",
+                        outputs=[snapshot_path], keep_outputs=[snapshot_path])
+        cache.run_stage("publish_urls", publish, snapshot_path, "urls", upstream=["publish"],
+                        outputs=[snapshot_path], keep_outputs=[snapshot_path])
+
+    run_pipeline()
+    assert runs == ["stats", "urls"]
+    run_pipeline()
+    assert runs == ["stats", "urls"]
+
+    # A missing snapshot is published again
+    os.remove(snapshot_path)
+    run_pipeline()
+    assert runs == ["stats", "urls", "stats", "urls"]
@@ -0,0 +1,92 @@
+import threading
+import time
+import pytest
+from utils.stage_scheduler import PipelineStage, StageScheduler
+
+
+class StageLog:
+    """Records when each stage started and ended; a stage listed in `failing` raises instead."""
+
+    def __init__(self, failing=(), duration=0.05):
+        self.failing = set(failing)
+        self.duration = duration
+        self.events = []
+        self.lock = threading.Lock()
+
+    def stage(self, name, depends_on=(), output=False):
+        def run(metrics):
+            with self.lock:
+                self.events.append(("start", name))
+            time.sleep(self.duration)
+            if name in self.failing:
+                raise RuntimeError(f"{name} failed")
+            with self.lock:
+                self.events.append(("end", name))
+        return PipelineStage(name, run, depends_on=depends_on, output=output)
+
+    def started(self):
+        return [name for event, name in self.events if event == "start"]
+
+    def position(self, event, name):
+        return self.events.index((event, name))
+
+
+def build_pipeline(log):
+    # load -> (product_stats, rollup) -> export
+    return StageScheduler([
+        log.stage("export", depends_on=["product_stats"], output=True),
+        log.stage("rollup", depends_on=["load"]),
+        log.stage("product_stats", depends_on=["load"]),
+        log.stage("load"),
+    ], max_workers=2)
+
+
+def test_stages_run_after_their_dependencies():
+    log = StageLog()
+    scheduler = build_pipeline(log)
+    assert scheduler.order == ["load", "product_stats", "export", "rollup"]
+
+    report = scheduler.run()
+    assert sorted(log.started()) == ["export", "load", "product_stats", "rollup"]
+    for name, dependency in [("product_stats", "load"), ("rollup", "load"), ("export", "product_stats")]:
+        assert log.position("end", dependency) < log.position("start", name)
+    # The two branches after load overlap
+    assert log.position("start", "rollup") < log.position("end", "product_stats")
+    assert report["first_output"] == "export"
+    assert set(report["stages"]) == {"load", "product_stats", "rollup", "export"}
+
+
+def test_only_and_from_select_stages():
+    scheduler = build_pipeline(StageLog())
+    assert scheduler.select_stages(only=["export", "load"]) == ["load", "export"]
+    assert scheduler.select_stages(from_stage="product_stats") == ["product_stats", "export"]
+    assert scheduler.select_stages(from_stage="load") == scheduler.order
+    assert scheduler.select_stages(only=["rollup", "export"], from_stage="product_stats") == ["export"]
+    with pytest.raises(ValueError):
+        scheduler.select_stages(only=["missing"])
+    with pytest.raises(ValueError):
+        scheduler.select_stages(from_stage="missing")
+
+
+def test_unselected_dependencies_count_as_done():
+    log = StageLog()
+    build_pipeline(log).run(from_stage="product_stats")
+    assert log.started() == ["product_stats", "export"]
+
+
+def test_failure_stops_downstream_stages(capsys):
+    log = StageLog(failing=["product_stats"])
+    with pytest.raises(RuntimeError, match="product_stats failed"):
+        build_pipeline(log).run()
+    # The stage running next to the failed one finishes, its downstream stages are not started
+    assert ("end", "rollup") in log.events
+    assert "export" not in log.started()
+    assert "Stages not run because of the failure: ['export']" in capsys.readouterr().out
+
+
+def test_invalid_dependencies_are_rejected():
+    log = StageLog()
+    with pytest.raises(ValueError, match="unknown stages"):
+        StageScheduler([log.stage("export", depends_on=["load"])])
+    with pytest.raises(ValueError, match="cycle"):
+        StageScheduler([log.stage("a", depends_on=["b"]), log.stage("b", depends_on=["a"])])
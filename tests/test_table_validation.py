@@ -0,0 +1,88 @@
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from utils.table_validation import (read_parquet_footer_stats, read_duckdb_table_stats, select_checksum_row_groups,
+                                    validate_table_metadata)
+
+
+@pytest.fixture
+def loaded_table(tmp_path):
+    """Two Parquet files of 250 rows in row groups of 100, loaded into 'reviews'; returns (connection, dataset dir)."""
+    dataset = tmp_path / "reviews"
+    dataset.mkdir()
+    for file_number in range(2):
+        ids = range(file_number * 250, (file_number + 1) * 250)
+        pq.write_table(pa.table({
+            "review_id": pa.array(ids, type=pa.int64()),
+            "rating": pa.array([i % 5 + 1 for i in ids], type=pa.int32()),
+            "helpful_vote": pa.array([None if i % 10 == 0 else i % 7 for i in ids], type=pa.int64()),
+            "score": pa.array([i / 4 + 0.5 for i in ids], type=pa.float64()),
+            "verified_purchase": pa.array([i % 3 != 0 for i in ids]),
+            "title": pa.array([f"title {i}" for i in ids]),
+        }), dataset / f"part-{file_number}.parquet", row_group_size=100)
+    con = duckdb.connect(str(tmp_path / "db.duckdb"))
+    con.execute(f"CREATE TABLE reviews AS SELECT * FROM '{dataset}/**/*.parquet'")
+    yield con, str(dataset)
+    con.close()
+
+
+def test_footer_stats_match_the_table_stats(loaded_table):
+    con, dataset = loaded_table
+    parquet_stats = read_parquet_footer_stats(dataset)
+    table_stats = read_duckdb_table_stats(con, "reviews")
+
+    assert parquet_stats["num_rows"] == table_stats["num_rows"] == 500
+    assert [num_rows for _file, _rg, num_rows in parquet_stats["row_groups"]] == [100, 100, 50, 100, 100, 50]
+    assert parquet_stats["columns"]["helpful_vote"] == {"null_count": 50, "min": 0, "max": 6}
+    assert parquet_stats["columns"]["title"]["null_count"] == 0
+    for col, minimum, maximum in [("review_id", 0, 499), ("rating", 1, 5), ("helpful_vote", 0, 6),
+                                  ("score", 0.5, 125.25), ("verified_purchase", False, True)]:
+        assert (parquet_stats["columns"][col]["min"], parquet_stats["columns"][col]["max"]) == (minimum, maximum)
+        assert (table_stats["columns"][col]["min"], table_stats["columns"][col]["max"]) == (minimum, maximum)
+    # String statistics are truncated in DuckDB and only checked for nulls
+    assert table_stats["columns"]["title"]["min"] is None
+    assert (table_stats["columns"]["helpful_vote"]["has_null"], table_stats["columns"]["title"]["has_null"]) == (True, False)
+
+    report = validate_table_metadata(con, "reviews", dataset, checksum_row_groups="all")
+    assert report["valid"] and report["mismatches"] == []
+    assert report["checked_row_groups"] == 6
+
+
+def test_checksum_finds_changes_the_statistics_cannot_see(loaded_table):
+    con, dataset = loaded_table
+    # Swapping two ratings in the second file's first row group keeps every min/max and null count
+    con.execute("UPDATE reviews SET rating = CASE review_id WHEN 260 THEN 2 ELSE 1 END WHERE review_id IN (260, 261)")
+
+    assert validate_table_metadata(con, "reviews", dataset)["valid"]
+    report = validate_table_metadata(con, "reviews", dataset, checksum_row_groups="all")
+    assert not report["valid"]
+    assert report["mismatches"] == [f"row group 0 of {dataset}/part-1.parquet (table rows 250-349): checksum differs"]
+    # A sample that misses the changed row group does not see it
+    assert validate_table_metadata(con, "reviews", dataset, checksum_row_groups=2)["valid"]
+
+
+def test_statistics_mismatches(loaded_table):
+    con, dataset = loaded_table
+    con.execute("UPDATE reviews SET score = 1000.0 WHERE review_id = 7")
+    con.execute("UPDATE reviews SET title = NULL WHERE review_id = 8")
+    report = validate_table_metadata(con, "reviews", dataset, checksum_row_groups="all")
+    assert not report["valid"]
+    assert report["mismatches"][:2] == ["score min/max: Parquet (0.5, 125.25), table (0.5, 1000.0)",
+                                        "title nulls: Parquet 0 of 500 null, table has_null=True has_no_null=True"]
+    assert len(report["mismatches"]) == 3   # plus the checksum of the first row group
+
+    con.execute("DELETE FROM reviews WHERE review_id >= 450")
+    report = validate_table_metadata(con, "reviews", dataset, checksum_row_groups="all")
+    assert "row count: Parquet 500, table 450" in report["mismatches"]
+    # Rows can't be matched by rowid once the counts differ, so no checksums are computed
+    assert report["checked_row_groups"] == 0
+
+
+def test_checksum_row_groups_are_spread_over_the_dataset():
+    row_groups = list(range(10))
+    assert select_checksum_row_groups(row_groups, "all") == list(range(10))
+    assert select_checksum_row_groups(row_groups, 20) == list(range(10))
+    assert select_checksum_row_groups(row_groups, 1) == [9]
+    assert select_checksum_row_groups(row_groups, 2) == [0, 9]
+    assert select_checksum_row_groups(row_groups, 4) == [0, 3, 6, 9]
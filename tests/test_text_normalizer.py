@@ -0,0 +1,55 @@
+import random
+import polars as pl
+import pytest
+from src.text_normalizer import build_text_normalizer_expr, build_legacy_text_cleanup_exprs
+
+ASCII_CONTROL_AND_SPACE = [chr(code) for code in range(0x21)] + ["\x7f"]
+
+
+def normalize(values):
+    return pl.DataFrame({"text": values}, schema={"text": pl.String}).select(build_text_normalizer_expr("text"))["text"].to_list()
+
+
+def legacy_chain(values):
+    return (pl.DataFrame({"text": values}, schema={"text": pl.String})
+            .select(build_legacy_text_cleanup_exprs(("text",)))["text"].to_list())
+
+
+def legacy_chain_everywhere(text):
+    """What the legacy chain was meant to do, applied to every occurrence instead of only the first one."""
+    text = text.lower()
+    for char in ASCII_CONTROL_AND_SPACE:
+        text = text.replace(char, " ")
+    while "  " in text:
+        text = text.replace("  ", " ")
+    return text.strip()
+
+
+@pytest.mark.parametrize("text", [
+    "Great Product", "Great\tProduct", "Works\nwell", "Works\r\nwell", "A\tB\nC\rD", "Too   many spaces",
+    "Tab\t and space", "ÄÖÜ Éclair ß", "Ünïcödé\n Τέλεια", "non\xa0breaking\u2003spaces", "", None,
+])
+def test_single_pass_matches_the_legacy_chain(text):
+    # Inputs the legacy chain fully cleans: each separator once, one run of at most three spaces, no edge whitespace
+    assert normalize([text]) == legacy_chain([text])
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("x\t\t\ty", "x y"),                     # the legacy chain only replaced the first tab
+    ("a \n\n b\n\nc", "a b c"),
+    ("ctl\x00\x0b\x0c\x1f\x7fend", "ctl end"),  # other ASCII control characters count as whitespace
+    ("  Padded \t", "padded"),
+    ("\xa0Unicode\u3000", "unicode"),       # Unicode whitespace is kept inside the text, stripped at the edges
+    ("a\xa0\xa0b", "a\xa0\xa0b"),
+    (" \t\r\n", ""),
+])
+def test_single_pass_cleans_what_the_legacy_chain_missed(text, expected):
+    assert normalize([text]) == [expected] == [legacy_chain_everywhere(text)]
+
+
+def test_single_pass_matches_the_legacy_chain_everywhere_on_random_text():
+    rng = random.Random(7)
+    alphabet = ["a", "B", "Ä", "é", "5", " ", " ", "\t", "\n", "\r", "\x00", "\x0b", "\x1f", "\x7f",
+                "\xa0", "\u2003", "\u3000"]
+    values = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30))) for _ in range(2_000)]
+    assert normalize(values) == [legacy_chain_everywhere(text) for text in values]
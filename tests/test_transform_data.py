@@ -0,0 +1,30 @@
+import duckdb
+from src.benchmark_pipeline import generate_synthetic_reviews
+from src.transform_data import prepare_hash_dedup
+
+
+def test_hash_dedup_matches_exact_distinct(tmp_path):
+    raw_path = generate_synthetic_reviews(str(tmp_path / "raw.parquet"), 20_000, duplicate_rate=0.05, null_rate=0.05)
+    where_clause = "rating = 5"
+    con = duckdb.connect()
+    query, stats = prepare_hash_dedup(con, raw_path, where_clause)
+
+    rows_in, distinct_rows = con.execute(f"""
+        SELECT COUNT(*), COUNT(DISTINCT r) FROM (SELECT r FROM parquet_scan(?) r WHERE {where_clause})
+    """, [raw_path]).fetchone()
+    assert stats["rows_in"] == rows_in
+    assert stats["duplicates_removed"] == rows_in - distinct_rows > 0
+    assert con.execute(f"SELECT COUNT(*) FROM ({query})").fetchone()[0] == distinct_rows
+    assert con.execute(f"""
+        SELECT COUNT(*) FROM (({query}) EXCEPT ALL (SELECT DISTINCT * FROM parquet_scan(?) WHERE {where_clause}))
+    """, [raw_path]).fetchone()[0] == 0
+    con.close()
+
+
+def test_hash_dedup_of_no_rows(tmp_path):
+    raw_path = generate_synthetic_reviews(str(tmp_path / "raw.parquet"), 1_000)
+    con = duckdb.connect()
+    query, stats = prepare_hash_dedup(con, raw_path, "FALSE")
+    assert stats["rows_in"] == stats["duplicates_removed"] == 0
+    assert con.execute(f"SELECT COUNT(*) FROM ({query})").fetchone()[0] == 0
+    con.close()
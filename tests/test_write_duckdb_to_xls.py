@@ -0,0 +1,85 @@
+import os
+import duckdb
+import pytest
+from openpyxl import load_workbook
+from utils.write_duckdb_to_xls import export_table_to_excel, create_export_sample_table
+
+HEADER = ("Product_ID", "count", "Product_Name", "URL")
+
+
+def read_sheets(xlsx_path):
+    workbook = load_workbook(xlsx_path, read_only=True)
+    sheets = {sheet.title: list(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets}
+    workbook.close()
+    return sheets
+
+
+def table_rows(db_path, table_name):
+    con = duckdb.connect(db_path, read_only=True)
+    rows = con.execute(f"SELECT * FROM {table_name} ORDER BY Product_ID").fetchall()
+    con.close()
+    return rows
+
+
+@pytest.mark.parametrize("num_rows, sheet_sizes", [(25, [10, 10, 5]), (20, [10, 10]), (0, [0])])
+def test_xlsx_export_splits_sheets_at_the_row_limit(tmp_path, num_rows, sheet_sizes):
+    db_path = str(tmp_path / "db.duckdb")
+    create_export_sample_table(db_path, "products", num_rows)
+    # Batches of 7 rows cross the sheet boundaries
+    files = export_table_to_excel(db_path, "products", f"{tmp_path}/", batch_size=7, max_rows_per_sheet=10)
+
+    assert files == [f"{tmp_path}/products.xlsx"]
+    sheets = read_sheets(files[0])
+    assert list(sheets) == ["products", "products_2", "products_3"][:len(sheet_sizes)]
+    assert all(rows[0] == HEADER for rows in sheets.values())
+    assert [len(rows) - 1 for rows in sheets.values()] == sheet_sizes
+    assert [row for rows in sheets.values() for row in rows[1:]] == table_rows(db_path, "products")
+
+
+def test_xlsx_export_splits_files_at_the_row_limit(tmp_path):
+    db_path = str(tmp_path / "db.duckdb")
+    create_export_sample_table(db_path, "products", 25)
+    files = export_table_to_excel(db_path, "products", f"{tmp_path}/", batch_size=7, max_rows_per_sheet=10,
+                                  split="files")
+
+    assert files == [f"{tmp_path}/products.xlsx", f"{tmp_path}/products_part2.xlsx", f"{tmp_path}/products_part3.xlsx"]
+    exported = []
+    for path, size in zip(files, [10, 10, 5]):
+        (rows,) = read_sheets(path).values()
+        assert rows[0] == HEADER and len(rows) - 1 == size
+        exported += rows[1:]
+    assert exported == table_rows(db_path, "products")
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_xlsx_export_cleans_values_excel_cannot_store(tmp_path):
+    db_path = str(tmp_path / "db.duckdb")
+    con = duckdb.connect(db_path)
+    con.execute("""
+        CREATE TABLE reviews AS
+        SELECT 'bad' || chr(1) || 'chars' || chr(10) || 'ok' AS text, [1, 2] AS ids, repeat('x', 40000) AS long_text
+    """)
+    con.close()
+    files = export_table_to_excel(db_path, "reviews", f"{tmp_path}/")
+    assert read_sheets(files[0])["reviews"] == [("text", "ids", "long_text"),
+                                                ("badchars\nok", "[1, 2]", "x" * 32_767)]
+
+
+@pytest.mark.parametrize("output_format, read_function", [("csv", "read_csv"), ("parquet", "read_parquet")])
+def test_copy_export(tmp_path, output_format, read_function):
+    db_path = str(tmp_path / "db.duckdb")
+    create_export_sample_table(db_path, "products", 2_500)
+    files = export_table_to_excel(db_path, "products", f"{tmp_path}/", output_format=output_format)
+
+    assert files == [f"{tmp_path}/products.{output_format}"]
+    assert not os.path.exists(files[0] + ".tmp")
+    con = duckdb.connect()
+    assert [col for col, *_ in con.execute(f"DESCRIBE SELECT * FROM {read_function}(?)", files).fetchall()] == list(HEADER)
+    exported = con.execute(f"SELECT * FROM {read_function}(?) ORDER BY Product_ID", files).fetchall()
+    con.close()
+    assert exported == table_rows(db_path, "products")
+
+
+def test_unknown_output_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        export_table_to_excel(str(tmp_path / "db.duckdb"), "products", f"{tmp_path}/", output_format="json")
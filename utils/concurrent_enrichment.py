@@ -0,0 +1,206 @@
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to rate limit requests to a single host.
+
+    Args:
+        rate (float): Tokens added per second (sustained requests per second)
+        capacity (float): Maximum number of tokens (allowed burst size)
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """
+    Keeps one TokenBucket per host so every host gets its own request budget.
+
+    Args:
+        rate (float): Requests per second allowed per host
+        burst (float): Burst size allowed per host
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, host: str):
+        """Block until a request to the given host is allowed."""
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self.buckets[host] = bucket
+        bucket.acquire()
+
+
+class RateLimitedSession(requests.Session):
+    """
+    requests Session that waits for the rate limiter of each request's host before sending it.
+
+    Redirects and every request a search makes (search page, product page) go through send,
+    so each host the searches touch gets its own budget.
+
+    Args:
+        limiter (HostRateLimiter): Per-host limiter (None: no rate limiting)
+    """
+
+    def __init__(self, limiter=None):
+        super().__init__()
+        self.limiter = limiter
+
+    def send(self, request, **kwargs):
+        if self.limiter is not None:
+            self.limiter.acquire(urlparse(request.url).hostname)
+        return super().send(request, **kwargs)
+
+
+def build_pooled_session(pool_size: int = 10, limiter=None):
+    """
+    Create a requests Session that keeps up to pool_size connections open per host.
+
+    Args:
+        pool_size (int): Number of pooled connections per host (match the worker count)
+        limiter (HostRateLimiter): Rate limit every request by its host (optional)
+
+    Returns:
+        requests.Session: Session with pooled HTTP and HTTPS adapters mounted
+    """
+    session = RateLimitedSession(limiter)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def accepts_session(search_fn):
+    """Returns True if search_fn takes a 'session' keyword argument."""
+    try:
+        return "session" in inspect.signature(search_fn).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def first_search_result(search_results):
+    """Returns (title, url) from the first search result or the 'No result' placeholder."""
+    if search_results:
+        return search_results[0]["title"], search_results[0]["url"]
+    return "No result", ""
+
+
+def enrich_product_ids_concurrently(
+    product_ids,
+    search_fn=None,
+    max_workers: int = 8,
+    requests_per_second: float = None,
+    burst: float = 1.0,
+    host: str = "search",
+    session=None,
+    on_result=None,
+    on_error=None
+):
+    """
+    Resolve product IDs to (title, url) using a thread pool.
+
+    Up to max_workers searches are in flight. With requests_per_second, every HTTP request made
+    through the pooled session waits for a token of its own host, so each host's request rate is
+    bounded. A search_fn that does not take a session (or a session passed in by the caller)
+    cannot be limited per request; then every search call shares the budget of 'host'.
+
+    Args:
+        product_ids (list): Product IDs (asin) to resolve
+        search_fn: Callable taking a product ID and returning a list of {"title", "url"} dicts.
+            Defaults to web_scrape_search. If it accepts a 'session' keyword the pooled session is passed.
+        max_workers (int): Maximum number of concurrent requests
+        requests_per_second (float): Sustained request rate allowed per host (None: only max_workers limits it)
+        burst (float): Number of requests allowed back-to-back per host before rate limiting kicks in
+        host (str): Rate limiting key for searches that cannot be limited per request
+        session: requests.Session to reuse (default: pooled, rate limited session sized to max_workers)
+        on_result: Optional callback called as on_result(product_id, title, url) when a result is ready
+        on_error: Optional callback called as on_error(product_id, exception) when a search raises.
+            Without it failed lookups are reported as ("No result", "").
+
+    Returns:
+        dict: Product ID -> (title, url) for every lookup that did not raise (or all of them without on_error)
+    """
+    if search_fn is None:
+        from .web_scraping import web_scrape_search
+        search_fn = web_scrape_search
+
+    limiter = HostRateLimiter(requests_per_second, burst) if requests_per_second else None
+    owns_session = session is None
+    if owns_session:
+        session = build_pooled_session(max_workers, limiter)
+    pass_session = accepts_session(search_fn)
+    # Without our session the requests cannot be seen, so whole searches are limited instead
+    call_limiter = limiter if limiter is not None and not (pass_session and owns_session) else None
+
+    def resolve(product_id):
+        if call_limiter is not None:
+            call_limiter.acquire(host)
+        if pass_session:
+            return first_search_result(search_fn(product_id, session=session))
+        return first_search_result(search_fn(product_id))
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(resolve, product_id): product_id for product_id in product_ids}
+            for future in as_completed(futures):
+                product_id = futures[future]
+                try:
+                    title, url = future.result()
+                except Exception as e:
+                    print(f"Search failed for {product_id}: {e}")
+                    if on_error is not None:
+                        on_error(product_id, e)
+                        continue
+                    title, url = "No result", ""
+                results[product_id] = (title, url)
+                if on_result is not None:
+                    on_result(product_id, title, url)
+    finally:
+        if owns_session:
+            session.close()
+
+    print(f"Resolved {len(results)} product IDs with {max_workers} workers.")
+    return results
+
+""" EXAMPLE USAGE
+from utils.concurrent_enrichment import enrich_product_ids_concurrently
+
+results = enrich_product_ids_concurrently(["B0CJZMP7L1"], max_workers=16)
+# At most 4 requests per second to each host the searches call
+results = enrich_product_ids_concurrently(["B0CJZMP7L1"], max_workers=16, requests_per_second=4)
+title, url = results["B0CJZMP7L1"] """
@@ -1,10 +1,7 @@
-import duckdb
+from .duckdb_session import connect_to_duckdb
+from .surrogate_keys import DIMENSION_TABLES
 
 
-def connect_to_duckdb(db_path: str):
-    """Method that connects to duckdb"""
-    return duckdb.connect(db_path)
-
 def check_table_exists(con, table_name):
     """
     Checks if a DuckDB table exists.
@@ -141,5 +138,281 @@ def create_grouped_table(
     print(f"Table '{table_name}' created successfully (limit={limit}).")
     return table_name
 
+def update_grouped_table_incrementally(
+    con,
+    table_name,
+    delta_table,
+    source_table="amazon_reviews",
+    group_column="asin",
+    new_column="Product_ID",
+    limit=10000,
+    filter_column=None,
+    filter_operator=None,
+    filter_value=None,
+    dimension_table=None
+):
+    """
+    Keep a grouped count table up to date from newly loaded rows only.
+
+    Full per-group counts are kept in '<table_name>_all'. The counts of the delta rows are
+    merged into it and the top-N table is rebuilt from that (small) table, so the source
+    table is not regrouped. The first call seeds '<table_name>_all' from the whole source
+    table, which must already contain the delta rows. Ties are broken by product id, as in
+    create_top_products_table, so an incremental update ranks like a full rebuild.
+
+    For a reviews table loaded with surrogate keys, group by the key column (e.g. 'asin_key') and pass
+    its dimension table: the counts are kept per integer key and the top-N table is decoded, so
+    new_column holds the product ID as in create_grouped_table.
+
+    Parameters:
+        con: DuckDB connection object
+        table_name: Output table name (same as in create_grouped_table)
+        delta_table: Table holding only the newly loaded rows
+        source_table: Input reviews table (used once to seed the counts)
+        group_column: column to be GROUP BY
+        new_column: Name of the group column in the output table
+        limit: Number of records to keep in the output table
+        filter_column: Column to filter by (optional)
+        filter_operator: SQL operator, e.g. '<', '>', '=', '<=' (optional)
+        filter_value: Value for filter (optional)
+        dimension_table: Dimension table decoding group_column, e.g. 'dim_product' (optional)
+    """
+    counts_table = f"{table_name}_all"
+    counts_column, counts_type = new_column, "VARCHAR"
+    if dimension_table:
+        id_column, key_column = DIMENSION_TABLES[dimension_table]
+        counts_column, counts_type = key_column, "INTEGER"
+    filter_clause, _filter_flag = build_filter_clause(filter_column, filter_operator, filter_value)
+    limit_clause = build_limit_clause(limit)
+    # NULL groups cannot be keyed in the counts table
+    not_null = f"{group_column} IS NOT NULL"
+    filter_clause = f"{filter_clause} AND {not_null}" if filter_clause else f"WHERE {not_null}"
+
+    if not check_table_exists(con, counts_table):
+        # Seed the full counts once from the source table
+        con.execute(f"""
+            CREATE TABLE {counts_table} (
+                {counts_column} {counts_type} PRIMARY KEY,
+                count BIGINT
+            )
+        """)
+        con.execute(f"""
+            INSERT INTO {counts_table}
+            SELECT {group_column} AS {counts_column}, COUNT(*) AS count
+            FROM {source_table}
+            {filter_clause}
+            GROUP BY {group_column}
+        """)
+    else:
+        # Merge the delta counts into the full counts
+        con.execute(f"""
+            INSERT INTO {counts_table}
+            SELECT {group_column} AS {counts_column}, COUNT(*) AS count
+            FROM {delta_table}
+            {filter_clause}
+            GROUP BY {group_column}
+            ON CONFLICT ({counts_column}) DO UPDATE SET count = count + EXCLUDED.count
+        """)
+    counts_source = counts_table
+    if dimension_table:
+        counts_source = f"""(
+            SELECT d.{id_column} AS {new_column}, c.count
+            FROM {counts_table} c
+            JOIN {dimension_table} d ON d.{key_column} = c.{counts_column}
+        )"""
+    con.execute(f"""
+        CREATE OR REPLACE TABLE {table_name} AS
+        SELECT {new_column}, count
+        FROM {counts_source}
+        ORDER BY count DESC, {new_column}
+        {limit_clause};
+    """)
+    print(f"Table '{table_name}' refreshed incrementally from '{delta_table}' (limit={limit}).")
+    return table_name
+
+# Aggregations computed per product in one grouped pass by create_product_stats_table
+PRODUCT_STATS_METRICS = {
+    "review_count": "COUNT(*)",
+    **{f"rating_{star}_count": f"COUNT(*) FILTER (WHERE rating = {star})" for star in range(1, 6)},
+    "avg_rating": "AVG(rating)",
+    "helpful_votes": "SUM(helpful_vote)",
+    "distinct_users": "COUNT(DISTINCT user_id)",
+    "first_review_at": 'epoch_ms(CAST(MIN("timestamp") AS BIGINT))',
+    "last_review_at": 'epoch_ms(CAST(MAX("timestamp") AS BIGINT))',
+}
+# Same metrics on a table loaded with surrogate keys (user_id is stored as user_key)
+KEYED_PRODUCT_STATS_METRICS = {**PRODUCT_STATS_METRICS, "distinct_users": "COUNT(DISTINCT user_key)"}
+
+def create_product_stats_table(
+    db_path,
+    stats_table="product_stats",
+    source_table="amazon_reviews",
+    group_column="asin",
+    new_column="Product_ID",
+    metrics=None,
+    dimension_table=None
+):
+    """
+    Compute every product metric in a single grouped scan of the reviews table.
+
+    The stats table has one row per product and one column per metric, so any top-N ranking
+    can be served from it by create_top_products_table without rescanning the reviews table.
+    Rows with a NULL group column are left out.
+
+    For a reviews table loaded with surrogate keys, group by the key column (e.g. 'asin_key') and pass
+    its dimension table: the grouping runs on integers and only the result is joined to the dimension,
+    so new_column still holds the product ID (next to the key column, e.g. 'product_key').
+
+    Parameters:
+        db_path (str): Path to the DuckDB database file
+        stats_table: Output table name
+        source_table: Input reviews table
+        group_column: column to be GROUP BY
+        new_column: Name of the group column in the output table
+        metrics (dict): Metric name -> SQL aggregate expression (default PRODUCT_STATS_METRICS,
+            KEYED_PRODUCT_STATS_METRICS with a dimension table)
+        dimension_table (str): Dimension table decoding group_column, e.g. 'dim_product' (optional)
+
+    Returns:
+        str: Name of the stats table
+    """
+    if metrics is None:
+        metrics = KEYED_PRODUCT_STATS_METRICS if dimension_table else PRODUCT_STATS_METRICS
+    grouped_select = build_product_stats_select(source_table, group_column, new_column, metrics, dimension_table)
+
+    con = connect_to_duckdb(db_path)
+    con.execute(f"CREATE OR REPLACE TABLE {stats_table} AS {grouped_select}")
+    num_products = con.execute(f"SELECT COUNT(*) FROM {stats_table}").fetchone()[0]
+    con.close()
+    print(f"Table '{stats_table}' created with {len(metrics)} metrics for {num_products} products.")
+    return stats_table
+
+def build_product_stats_select(source_table, group_column, new_column, metrics, dimension_table=None, group_filter=""):
+    """
+    Returns the grouped SELECT of create_product_stats_table (group_filter: extra AND condition on the rows).
+    """
+    metric_exprs = ",\n                ".join(f"{expr} AS {name}" for name, expr in metrics.items())
+    grouped_select = f"""
+        SELECT
+            {group_column} AS {new_column},
+            {metric_exprs}
+        FROM {source_table}
+        WHERE {group_column} IS NOT NULL {f"AND {group_filter}" if group_filter else ""}
+        GROUP BY {group_column}
+    """
+    if dimension_table:
+        id_column, key_column = DIMENSION_TABLES[dimension_table]
+        grouped_select = f"""
+            SELECT d.{id_column} AS {new_column}, s.{new_column} AS {key_column}, s.* EXCLUDE ({new_column})
+            FROM ({grouped_select}) s
+            JOIN {dimension_table} d ON d.{key_column} = s.{new_column}
+        """
+    return grouped_select
+
+def update_product_stats_incrementally(
+    con,
+    delta_table,
+    stats_table="product_stats",
+    source_table="amazon_reviews",
+    group_column="asin",
+    new_column="Product_ID",
+    metrics=None,
+    dimension_table=None
+):
+    """
+    Keep the product stats table up to date after new rows were appended to the reviews table.
+
+    Averages and distinct user counts cannot be merged from the delta alone, so the stats of every
+    product that has delta rows are recomputed from the source table; other products are untouched.
+    The first call creates the stats table from the whole source table.
+
+    Parameters:
+        con: DuckDB connection object
+        delta_table: Table holding only the newly loaded rows (already in the source table)
+        stats_table, source_table, group_column, new_column, metrics, dimension_table: as in create_product_stats_table
+
+    Returns:
+        int: Number of products whose stats were recomputed (None when the table was created)
+    """
+    if metrics is None:
+        metrics = KEYED_PRODUCT_STATS_METRICS if dimension_table else PRODUCT_STATS_METRICS
+    if not check_table_exists(con, stats_table):
+        con.execute(f"""
+            CREATE TABLE {stats_table} AS
+            {build_product_stats_select(source_table, group_column, new_column, metrics, dimension_table)}
+        """)
+        print(f"Table '{stats_table}' created with {len(metrics)} metrics.")
+        return None
+
+    # The stats table holds the grouped value in the key column when it is decoded through a dimension
+    stats_key = DIMENSION_TABLES[dimension_table][1] if dimension_table else new_column
+    touched = f"{group_column} IN (SELECT {group_column} FROM {delta_table})"
+    con.execute(f"DELETE FROM {stats_table} WHERE {stats_key} IN (SELECT {group_column} FROM {delta_table})")
+    num_products = con.execute(f"""
+        INSERT INTO {stats_table}
+        {build_product_stats_select(source_table, group_column, new_column, metrics, dimension_table, touched)}
+    """).fetchone()[0]
+    print(f"Table '{stats_table}' refreshed for {num_products} products from '{delta_table}'.")
+    return num_products
+
+def create_top_products_table(
+    db_path,
+    table_name,
+    metric,
+    stats_table="product_stats",
+    new_column="Product_ID",
+    metric_alias=None,
+    limit=10000,
+    ascending=False,
+    min_reviews=None
+):
+    """
+    Create a top-N table ranked by one metric of the product stats table.
+
+    Only the (small) stats table is read, so new rankings do not rescan the reviews table.
+    Ties are broken by product id so the ranking is stable.
+
+    Parameters:
+        db_path (str): Path to the DuckDB database file
+        table_name: Output table name
+        metric: Stats column to rank by, e.g. 'rating_5_count', 'helpful_votes', 'avg_rating'
+        stats_table: Table created by create_product_stats_table
+        new_column: Name of the product id column in the stats table
+        metric_alias: Name of the metric column in the output table (default: the metric name)
+        limit: Number of records to return
+        ascending (bool): Rank lowest values first
+        min_reviews (int): Only rank products with at least this many reviews (optional)
+
+    Returns:
+        str: Name of the top-N table
+    """
+    con = connect_to_duckdb(db_path)
+    stats_columns = [row[0] for row in con.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = ?",
+        [stats_table.lower()]
+    ).fetchall()]
+    if metric not in stats_columns or metric == new_column:
+        con.close()
+        raise ValueError(f"Unknown metric '{metric}'. Available metrics: {[c for c in stats_columns if c != new_column]}")
+
+    min_reviews_clause = f"WHERE review_count >= {int(min_reviews)}" if min_reviews else ""
+    order = "ASC" if ascending else "DESC"
+    con.execute(f"""
+        CREATE OR REPLACE TABLE {table_name} AS
+        SELECT {new_column}, {metric} AS {metric_alias or metric}
+        FROM {stats_table}
+        {min_reviews_clause}
+        ORDER BY {metric} {order} NULLS LAST, {new_column}
+        {build_limit_clause(limit)};
+    """)
+    con.close()
+    print(f"Table '{table_name}' created from '{stats_table}' ranked by {metric} (limit={limit}).")
+    return table_name
+
 # EXAMPLE USAGE
 # create_grouped_table(con, "top_products", group_column="asin", limit=10000)
+# update_grouped_table_incrementally(con, "top_products_count", "new_reviews", filter_column="rating", filter_operator="=", filter_value=5)
+# create_product_stats_table(db_path, "product_stats")
+# update_product_stats_incrementally(con, "new_reviews", "product_stats")
+# create_top_products_table(db_path, "top_products_count", "rating_5_count", metric_alias="count")
+# create_top_products_table(db_path, "most_helpful_products", "helpful_votes", limit=100)
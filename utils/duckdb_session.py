@@ -0,0 +1,145 @@
+import os
+import threading
+from contextlib import contextmanager
+import duckdb
+from .profiling import profile_connection
+
+# Settings used for connections opened outside a session (None keeps DuckDB's default)
+DEFAULT_DUCKDB_SETTINGS = {"threads": None, "memory_limit": None, "temp_directory": None}
+
+# Open sessions by absolute database path; the innermost session also provides the settings
+ACTIVE_SESSIONS = {}
+SESSION_STACK = []
+
+
+def build_duckdb_config(threads=None, memory_limit=None, temp_directory=None):
+    """Returns the duckdb.connect config dict for the given settings, leaving out unset ones."""
+    config = {}
+    if threads is not None:
+        config["threads"] = int(threads)
+    if memory_limit is not None:
+        config["memory_limit"] = str(memory_limit)
+    if temp_directory is not None:
+        os.makedirs(temp_directory, exist_ok=True)
+        config["temp_directory"] = temp_directory
+    return config
+
+
+def current_duckdb_settings():
+    """Settings of the innermost open session, or DEFAULT_DUCKDB_SETTINGS outside a session."""
+    return SESSION_STACK[-1].settings if SESSION_STACK else DEFAULT_DUCKDB_SETTINGS
+
+
+class DuckDBSession:
+    """
+    One DuckDB connection to a database file shared by every pipeline step of a run.
+
+    The file is opened once with the configured threads, memory_limit and temp_directory, and
+    connect_to_duckdb hands out cursors on it while the session is open. Cursors share the
+    database and its settings but have their own transaction, so each thread should use its own
+    (thread_cursor). Use it as a context manager so the connection is closed at the end of the run.
+
+    Args:
+        db_path (str): Path to the DuckDB database file
+        threads (int): Worker threads DuckDB may use (optional)
+        memory_limit (str): Memory DuckDB may use before spilling, e.g. '4GB' (optional)
+        temp_directory (str): Folder for spilled data (optional)
+        read_only (bool): Open the file read-only
+    """
+
+    def __init__(self, db_path: str, threads=None, memory_limit=None, temp_directory=None, read_only: bool = False):
+        self.db_path = db_path
+        self.read_only = read_only
+        self.settings = {"threads": threads, "memory_limit": memory_limit, "temp_directory": temp_directory}
+        self.connection = None
+        self.thread_cursors = threading.local()
+        self.cursors = []
+        self.lock = threading.Lock()
+
+    def open(self):
+        """Open the database file and register the session for connect_to_duckdb."""
+        if self.connection is not None:
+            return self
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.connection = duckdb.connect(self.db_path, read_only=self.read_only,
+                                         config=build_duckdb_config(**self.settings))
+        ACTIVE_SESSIONS[os.path.abspath(self.db_path)] = self
+        SESSION_STACK.append(self)
+        print(f"DuckDB session opened on {self.db_path} with settings {self.settings}")
+        return self
+
+    def cursor(self):
+        """A new cursor on the shared connection; the caller closes it (the session closes leftovers)."""
+        if self.connection is None:
+            raise RuntimeError(f"DuckDB session on {self.db_path} is not open.")
+        with self.lock:
+            cursor = self.connection.cursor()
+            self.cursors.append(cursor)
+        return cursor
+
+    def thread_cursor(self):
+        """The calling thread's cursor, created on first use and kept until the session closes."""
+        cursor = getattr(self.thread_cursors, "cursor", None)
+        if cursor is None:
+            cursor = self.cursor()
+            self.thread_cursors.cursor = cursor
+        return cursor
+
+    def close(self):
+        """Close every cursor and the connection, and unregister the session."""
+        if self.connection is None:
+            return
+        for cursor in self.cursors:
+            cursor.close()
+        self.cursors = []
+        self.thread_cursors = threading.local()
+        self.connection.close()
+        self.connection = None
+        ACTIVE_SESSIONS.pop(os.path.abspath(self.db_path), None)
+        SESSION_STACK.remove(self)
+        print(f"DuckDB session on {self.db_path} closed")
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def connect_to_duckdb(db_path: str = ":memory:", read_only: bool = False, **settings):
+    """
+    Method that connects to duckdb.
+
+    Inside an open DuckDBSession on db_path this returns a new cursor on the session's connection,
+    so the file is not reopened and the session's settings apply; closing it leaves the session open.
+    Otherwise a new connection is opened with the current settings (in-memory databases are never shared),
+    overridden by any threads/memory_limit/temp_directory passed as settings.
+    """
+    session = ACTIVE_SESSIONS.get(os.path.abspath(db_path)) if db_path != ":memory:" else None
+    if session is not None:
+        return profile_connection(session.cursor())
+    config = build_duckdb_config(**{**current_duckdb_settings(), **settings})
+    return profile_connection(duckdb.connect(db_path, read_only=read_only, config=config))
+
+
+@contextmanager
+def duckdb_connection(db_path: str = ":memory:", read_only: bool = False):
+    """Context manager around connect_to_duckdb that always closes the connection (or cursor)."""
+    con = connect_to_duckdb(db_path, read_only=read_only)
+    try:
+        yield con
+    finally:
+        con.close()
+
+""" EXAMPLE USAGE
+from utils.duckdb_session import DuckDBSession, connect_to_duckdb, duckdb_connection
+
+with DuckDBSession("./data/output/amazon_sales_db.duckDB", threads=4, memory_limit="4GB",
+                   temp_directory="./data/tmp/duckdb") as session:
+    load_parquet_to_duckdb("./data/output/amazon_sales_db.duckDB", "amazon_reviews", parquet_path)
+    with duckdb_connection("./data/output/amazon_sales_db.duckDB") as con:
+        print(con.execute("SELECT COUNT(*) FROM amazon_reviews").fetchone())
+    # In worker threads
+    session.thread_cursor().execute("SELECT COUNT(*) FROM amazon_reviews").fetchone() """
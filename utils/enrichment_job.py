@@ -0,0 +1,165 @@
+import time
+from datetime import datetime
+
+import pyarrow as pa
+
+
+def create_job_table(con, job_table: str, source_table: str, reset: bool = False):
+    """
+    Creates the per-ProductID job status table and registers new IDs as pending.
+
+    IDs that are already tracked keep their status, so a restarted job only sees unfinished work.
+
+    Args:
+        con: DuckDB connection object
+        job_table (str): Name of the job status table
+        source_table (str): Table with the Product_ID column to process
+        reset (bool): Drop the existing job status and start over
+    """
+    create_mode = "CREATE OR REPLACE TABLE" if reset else "CREATE TABLE IF NOT EXISTS"
+    con.execute(f"""
+        {create_mode} {job_table} (
+            Product_ID VARCHAR PRIMARY KEY,
+            status VARCHAR,
+            retry_count INTEGER,
+            last_error VARCHAR,
+            updated_at TIMESTAMP
+        )
+    """)
+    con.execute(f"""
+        INSERT INTO {job_table}
+        SELECT DISTINCT s.Product_ID, 'pending', 0, NULL, current_localtimestamp()
+        FROM {source_table} s
+        ANTI JOIN {job_table} j USING (Product_ID)
+    """)
+
+
+def get_unfinished_ids(con, job_table: str, max_retries: int = 3):
+    """
+    Returns the IDs that still need to be processed: pending ones and failed ones below max_retries.
+
+    Args:
+        con: DuckDB connection object
+        job_table (str): Name of the job status table
+        max_retries (int): Number of failed attempts after which an ID is given up on
+
+    Returns:
+        list: Product IDs to process
+    """
+    rows = con.execute(f"""
+        SELECT Product_ID
+        FROM {job_table}
+        WHERE status = 'pending'
+        OR (status = 'failed' AND retry_count < ?)
+        ORDER BY Product_ID
+    """, [max_retries]).fetchall()
+    return [row[0] for row in rows]
+
+
+def requeue_expired_done(con, job_table: str, cache_table: str = "product_resolution_cache", now=None):
+    """
+    Sets done IDs back to pending when their resolution cache entry has expired or was evicted.
+
+    A done ID is only as fresh as its cache entry, so the cache TTLs also apply to resumed jobs.
+
+    Args:
+        con: DuckDB connection object
+        job_table (str): Name of the job status table
+        cache_table (str): Resolution cache table (see resolution_cache.create_cache_table)
+        now (datetime): Current time (default datetime.now())
+
+    Returns:
+        int: Number of IDs set back to pending
+    """
+    now = now or datetime.now()
+    return con.execute(f"""
+        UPDATE {job_table}
+        SET status = 'pending', retry_count = 0, updated_at = current_localtimestamp()
+        WHERE status = 'done'
+        AND Product_ID NOT IN (SELECT Product_ID FROM {cache_table} WHERE expires_at > ?)
+    """, [now]).fetchone()[0]
+
+
+def mark_done(con, job_table: str, product_ids):
+    """Marks a batch of product IDs as done."""
+    if not product_ids:
+        return
+    batch = pa.table({"Product_ID": pa.array(list(product_ids), type=pa.string())})
+    con.register("done_batch", batch)
+    con.execute(f"""
+        UPDATE {job_table} j
+        SET status = 'done', last_error = NULL, updated_at = current_localtimestamp()
+        FROM done_batch d
+        WHERE j.Product_ID = d.Product_ID
+    """)
+    con.unregister("done_batch")
+
+
+def mark_failed(con, job_table: str, failures):
+    """
+    Marks a batch of product IDs as failed and increments their retry count.
+
+    Args:
+        con: DuckDB connection object
+        job_table (str): Name of the job status table
+        failures (dict): Product ID -> error message
+    """
+    if not failures:
+        return
+    product_ids = list(failures)
+    batch = pa.table({
+        "Product_ID": pa.array(product_ids, type=pa.string()),
+        "last_error": pa.array([str(failures[product_id]) for product_id in product_ids], type=pa.string()),
+    })
+    con.register("failed_batch", batch)
+    con.execute(f"""
+        UPDATE {job_table} j
+        SET status = 'failed', retry_count = j.retry_count + 1,
+            last_error = f.last_error, updated_at = current_localtimestamp()
+        FROM failed_batch f
+        WHERE j.Product_ID = f.Product_ID
+    """)
+    con.unregister("failed_batch")
+
+
+def get_job_progress(con, job_table: str):
+    """
+    Counts the job's product IDs per status.
+
+    Returns:
+        dict: {"total", "done", "pending", "failed"} counts
+    """
+    total, done, pending, failed = con.execute(f"""
+        SELECT
+            COUNT(*),
+            COUNT(*) FILTER (WHERE status = 'done'),
+            COUNT(*) FILTER (WHERE status = 'pending'),
+            COUNT(*) FILTER (WHERE status = 'failed')
+        FROM {job_table}
+    """).fetchone()
+    return {"total": total, "done": done, "pending": pending, "failed": failed}
+
+
+def print_job_progress(progress, processed: int, remaining: int, started_at: float):
+    """
+    Prints job progress and an ETA based on the throughput of the current run.
+
+    Args:
+        progress (dict): Output of get_job_progress
+        processed (int): IDs processed since this run started
+        remaining (int): IDs still to process in this run
+        started_at (float): time.time() when this run started
+    """
+    elapsed = time.time() - started_at
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    eta = remaining / rate if rate > 0 else float("nan")
+    percent = progress["done"] / progress["total"] * 100 if progress["total"] else 100.0
+    print(f"Progress: {progress['done']}/{progress['total']} done ({percent:.1f}%), "
+          f"{progress['failed']} failed, {rate:.2f} IDs/s, ETA {eta:.0f} seconds")
+
+""" EXAMPLE USAGE
+con = duckdb.connect("./data/output/amazon_sales_db.duckDB")
+create_job_table(con, "product_url_table_job", "top_products_count")
+product_ids = get_unfinished_ids(con, "product_url_table_job")
+mark_done(con, "product_url_table_job", product_ids[:100])
+print(get_job_progress(con, "product_url_table_job")) """
@@ -1,16 +1,48 @@
+import fnmatch
 import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
 import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .duckdb_session import connect_to_duckdb
 
+# Partition columns that can be derived from the review columns
+PARTITION_COLUMN_EXPRESSIONS = {
+    "review_year": 'year(epoch_ms(CAST("timestamp" AS BIGINT)))',
+    "review_month": 'month(epoch_ms(CAST("timestamp" AS BIGINT)))',
+    "rating": '"rating"',
+}
 
-def load_hf_dataset_as_parquet(dataset, parquet_dataset_path: str = "./data/output/dataset.parquet", batch_size: int = 500_000):
+# Columns kept by each column profile (None keeps every column). "ranking" is what the product stats,
+# rollups, top-N tables and incremental loads need: the product ids and filters, the natural key
+# (user_id, asin, timestamp), rating and helpful_vote. The datetime_of_review derived by the transform
+# is kept too, so a ranking table has the same review date as a full one; only the wide texts are left out.
+COLUMN_PROFILES = {
+    "full": None,
+    "ranking": ["rating", "asin", "parent_asin", "user_id", "timestamp", "datetime_of_review", "helpful_vote",
+                "verified_purchase"],
+}
+# Wide payload columns that can go into a side table keyed by the natural key
+WIDE_TEXT_COLUMNS = ("title", "text", "images")
+REVIEW_KEY_COLUMNS = ("user_id", "asin", "timestamp")
+
+
+def load_hf_dataset_as_parquet(dataset, parquet_dataset_path: str = "./data/output/dataset.parquet", batch_size: int = 500_000,
+                               partition_by=None, num_shards=None, **partition_options):
     """
     Load a HuggingFace dataset split as a Polars DataFrame.
     If the parquet file exists, read it. Otherwise, download the dataset and save it as parquet.
 
     Args:
         dataset: HuggingFace dataset.
-        parquet_dataset_path (str): Path to save/read the parquet file.
+        parquet_dataset_path (str): Path to save/read the parquet file (a directory when partitioned).
         batch_size (int): Batch size when writing parquet.
+        partition_by (tuple): Write a Hive-partitioned dataset by these columns instead of one file (optional)
+        num_shards (int): Write this many Parquet files in parallel into a directory instead of one file (optional)
+        **partition_options: row_group_size, compression and sort_by for write_partitioned_parquet
 
     Returns:
         parquet_dataset_path: path to saved parquet file.
@@ -19,11 +51,22 @@ def load_hf_dataset_as_parquet(dataset, parquet_dataset_path: str = "./data/outp
     # Ensure the output directory exists
     os.makedirs(os.path.dirname(parquet_dataset_path), exist_ok=True)
 
+    if partition_by:
+        # The split's memory-mapped Arrow table is handed to DuckDB without copying it
+        return write_partitioned_parquet(flatten_dataset_indices(dataset['train']).data.table, parquet_dataset_path,
+                                         partition_by=partition_by, **partition_options)
+
+    if num_shards:
+        return export_hf_dataset_parallel(dataset, parquet_dataset_path, num_shards=num_shards)
+
     # Download and save parquet if it doesn't exist
     if not os.path.isfile(parquet_dataset_path):
         print(f"Parquet file {parquet_dataset_path} does not exist.")
         print(f"Writing data to Parquet in batches of {batch_size}...")
-        dataset['train'].to_parquet(parquet_dataset_path, batch_size=batch_size)
+        # Write to a temporary file so a crash never leaves a partial file behind
+        tmp_path = parquet_dataset_path + ".tmp"
+        dataset['train'].to_parquet(tmp_path, batch_size=batch_size)
+        os.replace(tmp_path, parquet_dataset_path)
         print(f"Parquet file written successfully: {parquet_dataset_path}")
     else:
         print(f"Parquet file {parquet_dataset_path} already exists. Skipping download.")
@@ -39,13 +82,15 @@ parquet_path = "./data/output/amazon_reviews_table.parquet"
 parquet_path = load_hf_dataset_as_parquet(dataset_name, parquet_dataset_path=parquet_path) """
 
 
-def polars_to_parquet(df: pl.DataFrame, parquet_df_file_path: str = "./data/output/"):
+def polars_to_parquet(df: pl.DataFrame, parquet_df_file_path: str = "./data/output/", partition_by=None, **partition_options):
     """
     Save a Polars DataFrame to a Parquet file.
 
     Args:
         df (pl.DataFrame): The Polars DataFrame to save.
-        parquet_df_file_path (str): Path to the Parquet file to create.
+        parquet_df_file_path (str): Path to the Parquet file to create (a directory when partitioned).
+        partition_by (tuple): Write a Hive-partitioned dataset by these columns instead of one file (optional)
+        **partition_options: row_group_size, compression and sort_by for write_partitioned_parquet
 
     Returns:
         str: Path to the saved Parquet file.
@@ -54,6 +99,9 @@ def polars_to_parquet(df: pl.DataFrame, parquet_df_file_path: str = "./data/outp
     # Ensure the file output directory exists
     os.makedirs(os.path.dirname(parquet_df_file_path), exist_ok=True)
 
+    if partition_by:
+        return write_partitioned_parquet(df, parquet_df_file_path, partition_by=partition_by, **partition_options)
+
     # Write df to parquet if it doesn't exist
     if not os.path.isfile(parquet_df_file_path):
         print(f"Parquet file {parquet_df_file_path} does not exist.")
@@ -65,4 +113,310 @@ def polars_to_parquet(df: pl.DataFrame, parquet_df_file_path: str = "./data/outp
     return parquet_df_file_path
 
 # EXAMPLE USAGE
-# polars_to_parquet(df, "data/my_table.parquet")
\ No newline at end of file
+# polars_to_parquet(df, "data/my_table.parquet")
+
+
+def resolve_profile_columns(column_profile, available_columns):
+    """
+    Returns the columns of a column profile that exist in available_columns (all of them for "full").
+
+    column_profile can be a profile name from COLUMN_PROFILES or an explicit list of columns.
+    """
+    if isinstance(column_profile, str):
+        if column_profile not in COLUMN_PROFILES:
+            raise ValueError(f"Unknown column profile '{column_profile}'. Expected one of {list(COLUMN_PROFILES)}.")
+        column_profile = COLUMN_PROFILES[column_profile]
+    if column_profile is None:
+        return list(available_columns)
+    return [col for col in column_profile if col in available_columns]
+
+
+def resolve_parquet_path(parquet_path: str):
+    """
+    Returns a path DuckDB can scan: a partitioned dataset directory becomes a recursive glob,
+    a single file is returned unchanged. Hive partition columns are detected by DuckDB.
+    """
+    if os.path.isdir(parquet_path):
+        return os.path.join(parquet_path, "**", "*.parquet")
+    return parquet_path
+
+
+def count_parquet_rows(parquet_path: str):
+    """Returns the number of rows of a Parquet file or dataset from the file footers, without scanning data."""
+    con = connect_to_duckdb()
+    num_rows = con.execute(
+        f"SELECT COALESCE(SUM(num_rows), 0) FROM parquet_file_metadata('{resolve_parquet_path(parquet_path)}')"
+    ).fetchone()[0]
+    con.close()
+    return num_rows
+
+
+def write_partitioned_parquet(
+    source,
+    output_dir: str,
+    partition_by=("review_year", "review_month"),
+    row_group_size: int = 122_880,
+    compression: str = "zstd",
+    sort_by=None
+):
+    """
+    Write reviews as a Hive-partitioned Parquet dataset (e.g. review_year=2021/review_month=3/*.parquet).
+
+    DuckDB prunes whole partitions when queries filter on the partition columns, and skips
+    row groups using min/max statistics, which sorting makes more selective.
+    The dataset is written to a temporary directory and renamed when complete.
+
+    Args:
+        source: Parquet file/glob path, pyarrow Table or Polars DataFrame
+        output_dir (str): Directory of the partitioned dataset
+        partition_by (tuple): Partition columns, see PARTITION_COLUMN_EXPRESSIONS
+        row_group_size (int): Rows per Parquet row group
+        compression (str): Parquet compression codec, e.g. 'zstd' or 'snappy'
+        sort_by (tuple): Columns to sort by inside each file (optional)
+
+    Returns:
+        str: Path to the partitioned dataset directory
+    """
+    if os.path.isdir(output_dir):
+        print(f"Partitioned dataset {output_dir} already exists. Skipping write.")
+        return output_dir
+    os.makedirs(os.path.dirname(os.path.abspath(output_dir)), exist_ok=True)
+
+    con = connect_to_duckdb()
+    if isinstance(source, str):
+        source_sql = f"read_parquet('{resolve_parquet_path(source)}')"
+    else:
+        source_arrow = source.to_arrow() if isinstance(source, pl.DataFrame) else source
+        con.register("partition_source", source_arrow)
+        source_sql = "partition_source"
+
+    # Derived partition columns are added, existing columns are kept as they are
+    source_columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {source_sql}").fetchall()]
+    derived_columns = [
+        f'{PARTITION_COLUMN_EXPRESSIONS[col]} AS "{col}"'
+        for col in partition_by if col not in source_columns
+    ]
+    select_list = ", ".join(["*"] + derived_columns)
+    order_clause = f"ORDER BY {', '.join(sort_by)}" if sort_by else ""
+    partition_columns = ", ".join(f'"{col}"' for col in partition_by)
+
+    tmp_dir = output_dir.rstrip("/") + ".partial"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(f"Writing partitioned dataset by {list(partition_by)} ({compression}, row groups of {row_group_size})...")
+    try:
+        con.execute(f"""
+            COPY (SELECT {select_list} FROM {source_sql} {order_clause})
+            TO '{tmp_dir}'
+            (FORMAT parquet, PARTITION_BY ({partition_columns}), COMPRESSION {compression},
+             ROW_GROUP_SIZE {int(row_group_size)})
+        """)
+        os.replace(tmp_dir, output_dir)
+    finally:
+        con.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"✔ Partitioned dataset written: {output_dir}")
+    return output_dir
+
+def estimate_bytes_scanned(con, parquet_path: str, columns, min_timestamp, max_timestamp, path_filter: str = ""):
+    """
+    Estimate the compressed bytes DuckDB reads for a timestamp range query from the Parquet footers.
+
+    Only the requested columns of row groups whose timestamp min/max overlaps the range are counted,
+    in files whose path contains path_filter (the partition directories a query keeps).
+
+    Returns:
+        tuple: (bytes scanned, total bytes of the requested columns)
+    """
+    column_list = ", ".join(f"'{col}'" for col in columns)
+    return con.execute(f"""
+        WITH meta AS (
+            SELECT * FROM parquet_metadata('{resolve_parquet_path(parquet_path)}')
+        ),
+        row_groups AS (
+            SELECT file_name, row_group_id
+            FROM meta
+            WHERE path_in_schema = 'timestamp'
+            AND TRY_CAST(stats_max AS DOUBLE) >= ?
+            AND TRY_CAST(stats_min AS DOUBLE) < ?
+            AND contains(file_name, ?)
+        )
+        SELECT
+            COALESCE(SUM(total_compressed_size) FILTER (
+                WHERE (file_name, row_group_id) IN (SELECT (file_name, row_group_id) FROM row_groups)), 0),
+            COALESCE(SUM(total_compressed_size), 0)
+        FROM meta
+        WHERE path_in_schema IN ({column_list})
+    """, [min_timestamp, max_timestamp, path_filter]).fetchone()
+
+
+def benchmark_partition_pruning(single_file_path: str, partitioned_path: str, year: int, month: int):
+    """
+    Compare one month's aggregate on the single-file and the year/month partitioned layout.
+
+    Reports query time and the estimated compressed bytes scanned for each layout.
+
+    Args:
+        single_file_path (str): Monolithic Parquet file
+        partitioned_path (str): Dataset written with partition_by=("review_year", "review_month")
+        year (int): Review year to query
+        month (int): Review month to query
+
+    Returns:
+        dict: layout -> {"seconds", "bytes_scanned", "bytes_total", "rows"}
+    """
+    min_timestamp = datetime(year, month, 1, tzinfo=timezone.utc).timestamp() * 1000
+    next_month = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+    max_timestamp = next_month.timestamp() * 1000
+    timestamp_filter = f'"timestamp" >= {min_timestamp} AND "timestamp" < {max_timestamp}'
+
+    layouts = {
+        "single_file": (single_file_path, timestamp_filter, ""),
+        "partitioned": (partitioned_path, f"review_year = {year} AND review_month = {month} AND {timestamp_filter}",
+                        f"review_year={year}{os.sep}review_month={month}{os.sep}"),
+    }
+    con = connect_to_duckdb()
+    report = {}
+    for layout, (path, where_clause, path_filter) in layouts.items():
+        start_time = time.perf_counter()
+        rows, _avg_rating = con.execute(f"""
+            SELECT COUNT(*), AVG(rating)
+            FROM '{resolve_parquet_path(path)}'
+            WHERE {where_clause}
+        """).fetchone()
+        seconds = time.perf_counter() - start_time
+        bytes_scanned, bytes_total = estimate_bytes_scanned(
+            con, path, ["rating", "timestamp"], min_timestamp, max_timestamp, path_filter)
+        report[layout] = {"seconds": round(seconds, 3), "bytes_scanned": bytes_scanned,
+                          "bytes_total": bytes_total, "rows": rows}
+        print(f"{layout:<12} {seconds:.3f} s, {bytes_scanned / 1024**2:.1f} of {bytes_total / 1024**2:.1f} MiB scanned, {rows} rows")
+    con.close()
+    return report
+
+""" EXAMPLE USAGE
+write_partitioned_parquet("./data/output/amazon_reviews_table.parquet", "./data/output/amazon_reviews_table",
+    partition_by=("review_year", "review_month"), sort_by=("asin",))
+df = duckdb.sql(f"SELECT * FROM '{resolve_parquet_path('./data/output/amazon_reviews_table')}' WHERE review_year = 2022")
+benchmark_partition_pruning("./data/output/amazon_reviews_table.parquet", "./data/output/amazon_reviews_table", 2022, 6) """
+
+
+EXPORT_SUCCESS_MARKER = "_SUCCESS"
+
+
+def flatten_dataset_indices(split_dataset):
+    """
+    Returns the split with its rows in its Arrow table.
+
+    After select/shuffle/filter a Dataset only holds an indices mapping over the unfiltered table,
+    which readers of the Arrow table or cache files would ignore, so such a split is flattened.
+    """
+    if getattr(split_dataset, "_indices", None) is not None:
+        print("Dataset has an indices mapping. Flattening it...")
+        return split_dataset.flatten_indices()
+    return split_dataset
+
+
+def read_memory_mapped_arrow(arrow_files):
+    """Memory-map the Arrow stream files of a HuggingFace dataset as one pyarrow Table without copying."""
+    tables = [pa.ipc.open_stream(pa.memory_map(arrow_file)).read_all() for arrow_file in arrow_files]
+    return pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+
+
+def write_parquet_shard(arrow_files, start: int, stop: int, shard_path: str,
+                        compression: str = "snappy", row_group_size: int = 500_000):
+    """
+    Write rows [start, stop) of the memory-mapped dataset to one Parquet file.
+
+    The slice is zero-copy; the file is written under a temporary name and renamed when complete.
+
+    Returns:
+        tuple: (shard path, rows written)
+    """
+    table = read_memory_mapped_arrow(arrow_files).slice(start, stop - start)
+    tmp_path = shard_path + ".tmp"
+    try:
+        pq.write_table(table, tmp_path, compression=compression, row_group_size=row_group_size)
+        os.replace(tmp_path, shard_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return shard_path, table.num_rows
+
+
+def export_hf_dataset_parallel(dataset, output_dir: str, split: str = "train", num_shards: int = None,
+                               max_workers: int = None, compression: str = "snappy", row_group_size: int = 500_000):
+    """
+    Export a HuggingFace dataset split to N Parquet files written in parallel by a process pool.
+
+    The split is cut into contiguous row ranges; every worker memory-maps the dataset's Arrow cache
+    files and writes its range as a zero-copy slice. Each shard is written to a temporary file and
+    renamed, and a _SUCCESS marker is written last, so a crashed export is never treated as complete.
+    Shards that were finished before a crash are reused on the next run; other part-*-of-*.parquet
+    shards (from an export with another shard count) and leftover .parquet.tmp files are removed
+    first. Nothing else in output_dir is touched.
+    A split with an indices mapping (after select/shuffle/filter) is flattened first, since its
+    cache files still hold the rows of the unfiltered dataset.
+
+    Args:
+        dataset: HuggingFace DatasetDict (or Dataset) backed by Arrow cache files
+        output_dir (str): Directory for the Parquet shards
+        split (str): Split to export when a DatasetDict is given
+        num_shards (int): Number of output files (default: one per CPU)
+        max_workers (int): Number of worker processes (default: num_shards)
+        compression (str): Parquet compression codec
+        row_group_size (int): Rows per Parquet row group
+
+    Returns:
+        str: Path to the output directory
+    """
+    if os.path.isfile(os.path.join(output_dir, EXPORT_SUCCESS_MARKER)):
+        print(f"Parquet dataset {output_dir} already exists. Skipping export.")
+        return output_dir
+
+    split_dataset = flatten_dataset_indices(dataset[split] if hasattr(dataset, "keys") else dataset)
+    arrow_files = [cache_file["filename"] for cache_file in split_dataset.cache_files]
+    if not arrow_files:
+        raise ValueError("Dataset has no Arrow cache files to memory-map; save it to disk first.")
+
+    num_rows = split_dataset.num_rows
+    num_shards = max(1, min(num_shards or os.cpu_count() or 1, num_rows))
+    max_workers = max_workers or num_shards
+    shard_size = -(-num_rows // num_shards)  # ceiling division
+    os.makedirs(output_dir, exist_ok=True)
+
+    shards = []
+    shard_names = set()
+    for shard_index in range(num_shards):
+        start = shard_index * shard_size
+        stop = min(start + shard_size, num_rows)
+        shard_name = f"part-{shard_index:05d}-of-{num_shards:05d}.parquet"
+        shard_path = os.path.join(output_dir, shard_name)
+        if start < stop:
+            shard_names.add(shard_name)
+            if not os.path.isfile(shard_path):
+                shards.append((start, stop, shard_path))
+
+    # Only this export's shards may end up next to the _SUCCESS marker
+    for name in os.listdir(output_dir):
+        is_export_file = fnmatch.fnmatch(name, "part-*-of-*.parquet") or name.endswith(".parquet.tmp")
+        if is_export_file and name not in shard_names and os.path.isfile(os.path.join(output_dir, name)):
+            os.remove(os.path.join(output_dir, name))
+
+    print(f"Writing {len(shards)} of {num_shards} Parquet shards with {max_workers} processes...")
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(write_parquet_shard, arrow_files, start, stop, shard_path, compression, row_group_size)
+            for start, stop, shard_path in shards
+        ]
+        for future in as_completed(futures):
+            shard_path, rows = future.result()
+            print(f"✔ {shard_path} ({rows} rows)")
+
+    # Mark the export as complete
+    open(os.path.join(output_dir, EXPORT_SUCCESS_MARKER), "w").close()
+    print(f"Parquet dataset written successfully: {output_dir}")
+    return output_dir
+
+""" EXAMPLE USAGE
+dataset = extract_huggingface_dataset("kevykibbz/Amazon_Customer_Review_2023")
+parquet_path = export_hf_dataset_parallel(dataset, "./data/output/amazon_reviews_table", num_shards=16) """
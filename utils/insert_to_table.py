@@ -1,6 +1,13 @@
+import time
 import duckdb
-from .create_duckdb_table import connect_to_duckdb, check_table_exists, preview_duckdb_table
-from .web_scraping import web_scrape_search
+import pyarrow as pa
+from datetime import timedelta
+from .duckdb_session import connect_to_duckdb
+from .create_duckdb_table import check_table_exists, preview_duckdb_table
+from .concurrent_enrichment import enrich_product_ids_concurrently, first_search_result
+from .resolution_cache import create_cache_table, get_cached_results, store_results, evict_cache, print_cache_report
+from .enrichment_job import (create_job_table, get_unfinished_ids, requeue_expired_done, mark_done, mark_failed,
+                             get_job_progress, print_job_progress)
 
 
 def add_empty_columns(db_path, table_name, extra_columns):
@@ -14,50 +21,184 @@ def add_empty_columns(db_path, table_name, extra_columns):
             con.execute(f"ALTER TABLE {table_name} ADD COLUMN {col} VARCHAR;")
         print(f"Added empty columns {extra_columns} to table '{table_name}'.")
         preview_duckdb_table(con, table_name)
+    # Close connection
+    con.close()
 
 # EXAMPLE USAGE
 # add_empty_columns("./data/output/sales_db", "top_products", ["source", "region", "category"])
 
-def insert_product_url_from_web(db_path, input_table, output_table, delay=3.5):
+def write_back_results(con, output_table, results):
     """
-    Process ProductIDs directly from a DuckDB table and write results to an output table.
+    Writes a batch of (title, url) results to the output table with one set-based UPDATE.
+
+    Args:
+        con: DuckDB connection object
+        output_table (str): Table with Product_ID, Product_Name and URL columns
+        results (dict): Product ID -> (title, url)
     """
-    con = connect_to_duckdb(db_path)
-    # Create output table with additional columns
+    if not results:
+        return
+    product_ids = list(results)
+    batch = pa.table({
+        "Product_ID": pa.array(product_ids, type=pa.string()),
+        "Product_Name": pa.array([results[product_id][0] for product_id in product_ids], type=pa.string()),
+        "URL": pa.array([results[product_id][1] for product_id in product_ids], type=pa.string()),
+    })
+    con.register("result_batch", batch)
     con.execute(f"""
-        CREATE OR REPLACE TABLE {output_table} AS
-        SELECT Product_ID, '' AS Product_Name, '' AS URL
-        FROM {input_table}
+        UPDATE {output_table} o
+        SET Product_Name = r.Product_Name, URL = r.URL
+        FROM result_batch r
+        WHERE o.Product_ID = r.Product_ID
     """)
+    con.unregister("result_batch")
 
-    # Fetch all rows
-    rows = con.execute(f"SELECT Product_ID FROM {output_table}").fetchall()
-    product_ids = [row[0] for row in rows]
+def insert_product_url_from_web(db_path, input_table, output_table, delay=3.5,
+                                max_workers=1, requests_per_second=None, search_fn=None,
+                                cache_table="product_resolution_cache", cache_ttl_days=30,
+                                negative_ttl_days=7, cache_max_entries=100_000, flush_size=1000,
+                                resume=False, max_retries=3, on_flush=None):
+    """
+    Process ProductIDs directly from a DuckDB table and write results to an output table.
+
+    Args:
+        db_path (str): Path to the DuckDB database file
+        input_table (str): Table with a Product_ID column
+        output_table (str): Table to create with Product_ID, Product_Name and URL
+        delay (float): Search delay in seconds (kept for compatibility)
+        max_workers (int): Number of concurrent searches. 1 keeps the sequential loop.
+        requests_per_second (float): Request rate limit per host in concurrent mode (None: no limit)
+        search_fn: Search function (default web_scrape_search)
+        cache_table (str): Persistent resolution cache table. None disables the cache.
+        cache_ttl_days (float): Days before a cached URL/title is searched again
+        negative_ttl_days (float): Days before a cached "No result" is searched again
+        cache_max_entries (int): Maximum cache size, least recently used entries are evicted
+        flush_size (int): Number of search results buffered before they are written back in one UPDATE
+        resume (bool): Continue a previous (crashed) run from its job status table instead of starting over.
+            Done IDs whose cache entry expired are searched again (without a cache they stay done).
+        max_retries (int): Number of failed searches after which a Product_ID is no longer retried
+        on_flush: Called with the number of searched IDs after every committed flush, e.g. to export
+            the partial results while the search is still running (optional)
 
-    for row in product_ids:
-        product_id = row
-        search_results = web_scrape_search(product_id)
+    Progress is tracked per Product_ID in '<output_table>_job' and committed with every flush,
+    so a crashed run loses at most flush_size results.
+    """
+    if search_fn is None:
+        from .web_scraping import web_scrape_search
+        search_fn = web_scrape_search
+    con = connect_to_duckdb(db_path)
+    try:
+        job_table = f"{output_table}_job"
+        resuming = resume and check_table_exists(con, output_table) and check_table_exists(con, job_table)
 
-        if search_results:
-            title = search_results[0]["title"]
-            url = search_results[0]["url"]
+        if resuming:
+            # Keep previous results, drop IDs that left the input table and add the new ones
+            print(f"Resuming enrichment job '{job_table}'.")
+            for table in (output_table, job_table):
+                con.execute(f"""
+                    DELETE FROM {table}
+                    WHERE Product_ID NOT IN (SELECT Product_ID FROM {input_table} WHERE Product_ID IS NOT NULL)
+                """)
+            con.execute(f"""
+                INSERT INTO {output_table}
+                SELECT i.Product_ID, '' AS Product_Name, '' AS URL
+                FROM {input_table} i
+                ANTI JOIN {output_table} o USING (Product_ID)
+            """)
         else:
-            title = "No result"
-            url = ""
+            # Create output table with additional columns
+            con.execute(f"""
+                CREATE OR REPLACE TABLE {output_table} AS
+                SELECT Product_ID, '' AS Product_Name, '' AS URL
+                FROM {input_table}
+            """)
+        create_job_table(con, job_table, output_table, reset=not resuming)
+        if cache_table:
+            create_cache_table(con, cache_table)
+            if resuming:
+                # Done IDs whose cached result expired (or was evicted) are searched again
+                requeued = requeue_expired_done(con, job_table, cache_table)
+                print(f"{requeued} done IDs with an expired cache entry queued again.")
 
-        # Update row directly in DuckDB
-        con.execute(f"""
-            UPDATE {output_table}
-            SET Product_Name = ?, URL = ?
-            WHERE Product_ID = ?
-        """, [title, url, product_id])
+        # Fetch the IDs that are not done yet
+        product_ids = get_unfinished_ids(con, job_table, max_retries)
 
-    print(f"Processing complete. Results written to '{output_table}'.")
+        # Only search for IDs that are not cached or whose entry expired
+        cached = {}
+        if cache_table:
+            cached = get_cached_results(con, product_ids, cache_table)
+        ids_to_search = [product_id for product_id in product_ids if product_id not in cached]
 
-    # Close connection
-    con.close()
+        # Cached results are written back in one batch
+        con.begin()
+        write_back_results(con, output_table, cached)
+        mark_done(con, job_table, cached)
+        con.commit()
+
+        # Search results are buffered and committed every flush_size rows
+        buffer = {}
+        failures = {}
+        started_at = time.time()
+        processed = 0
+
+        def flush():
+            nonlocal processed
+            con.begin()
+            write_back_results(con, output_table, buffer)
+            if cache_table:
+                store_results(con, buffer, cache_table, ttl=timedelta(days=cache_ttl_days),
+                              negative_ttl=timedelta(days=negative_ttl_days))
+            mark_done(con, job_table, buffer)
+            mark_failed(con, job_table, failures)
+            con.commit()
+            processed += len(buffer) + len(failures)
+            buffer.clear()
+            failures.clear()
+            print_job_progress(get_job_progress(con, job_table), processed,
+                               len(ids_to_search) - processed, started_at)
+            if on_flush is not None:
+                on_flush(processed)
+
+        def collect(product_id, title, url):
+            buffer[product_id] = (title, url)
+            if len(buffer) + len(failures) >= flush_size:
+                flush()
+
+        def collect_error(product_id, error):
+            failures[product_id] = error
+            if len(buffer) + len(failures) >= flush_size:
+                flush()
+
+        if max_workers > 1:
+            # Resolve concurrently; results are collected as they complete
+            enrich_product_ids_concurrently(
+                ids_to_search, search_fn=search_fn, max_workers=max_workers,
+                requests_per_second=requests_per_second, on_result=collect, on_error=collect_error)
+        else:
+            for product_id in ids_to_search:
+                try:
+                    search_results = search_fn(product_id)
+                except Exception as e:
+                    print(f"Search failed for {product_id}: {e}")
+                    collect_error(product_id, e)
+                    continue
+                collect(product_id, *first_search_result(search_results))
+        flush()
+
+        if cache_table:
+            evicted = evict_cache(con, cache_table, cache_max_entries)
+            print_cache_report(len(cached), len(ids_to_search), evicted)
+
+        print(f"Processing complete. Results written to '{output_table}'.")
+    finally:
+        # Also on a crash, so the file is not left open by this process
+        con.close()
 
 """ EXAMPLE USAGE
 input_table = "input_asins"   # table with asin
 output_table = "product_url_table"
-insert_product_url_from_web("./data/output/sales_db", input_table, output_table) """
+insert_product_url_from_web("./data/output/sales_db", input_table, output_table)
+# Concurrent mode: 16 searches in flight, at most 4 requests per second
+insert_product_url_from_web("./data/output/sales_db", input_table, output_table, max_workers=16, requests_per_second=4)
+# Resume a run that crashed part way through
+insert_product_url_from_web("./data/output/sales_db", input_table, output_table, resume=True) """
@@ -0,0 +1,279 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import psutil
+
+# Profiler of the running pipeline, used by profile_connection to attach DuckDB query profiles
+ACTIVE_PROFILER = None
+
+
+class RSSSampler:
+    """
+    Samples the RSS of the current process from a background thread and keeps the peak.
+
+    Args:
+        interval (float): Sampling interval in seconds
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak_rss = self.process.memory_info().rss
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        while not self.stop_event.is_set():
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+            self.stop_event.wait(self.interval)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and return the peak RSS in bytes."""
+        self.stop_event.set()
+        self.thread.join()
+        self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+        return self.peak_rss
+
+
+def measure_peak_memory(fn, *args, interval: float = 0.05, **kwargs):
+    """
+    Run a function and measure its wall time and the peak RSS of the process while it runs.
+
+    RSS is sampled from a background thread every `interval` seconds.
+
+    Args:
+        fn: Function to run
+        *args, **kwargs: Arguments passed to fn
+        interval (float): Sampling interval in seconds
+
+    Returns:
+        tuple: (result of fn, seconds taken, peak RSS in bytes)
+    """
+    sampler = RSSSampler(interval).start()
+    start_time = time.time()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        seconds = time.time() - start_time
+        peak_rss = sampler.stop()
+    return result, seconds, peak_rss
+
+
+def read_io_counters(process):
+    """Returns (bytes read, bytes written) of the process, or (None, None) where the OS does not report them."""
+    try:
+        counters = process.io_counters()
+        return counters.read_bytes, counters.write_bytes
+    except (AttributeError, psutil.Error):
+        return None, None
+
+
+def total_cpu_seconds(process):
+    """User + system CPU time of the process and its finished child processes."""
+    cpu = process.cpu_times()
+    return cpu.user + cpu.system + cpu.children_user + cpu.children_system
+
+
+class StageMetrics:
+    """Metrics of one pipeline stage. rows_in/rows_out can be set by the caller inside the stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_rss_bytes = None
+        self.bytes_read = None
+        self.bytes_written = None
+        self.rows_in = None
+        self.rows_out = None
+        self.queries = []
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+class PipelineProfiler:
+    """
+    Records wall time, CPU time, peak RSS, I/O bytes and rows per pipeline stage and writes a
+    JSON report plus a Prometheus textfile per run.
+
+    Every query run on a connection from profile_connection is timed. With duckdb_profiling=True
+    DuckDB also writes its EXPLAIN ANALYZE profile as JSON next to the report (DuckDB writes it once
+    the query's result has been fully fetched, so partially fetched results may have no profile).
+
+    Stages may run concurrently in different threads; queries are attached to the stage of the
+    thread running them. CPU time, I/O and peak RSS are measured for the whole process, so for
+    overlapping stages they include the work of the other stages.
+
+    Args:
+        report_dir (str): Folder for the reports
+        duckdb_profiling (bool): Write a DuckDB JSON query profile for every query
+    """
+
+    def __init__(self, report_dir: str = "./data/output/metrics", duckdb_profiling: bool = False):
+        self.report_dir = report_dir
+        self.duckdb_profiling = duckdb_profiling
+        self.run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+        self.stages = []
+        # Run-level metrics such as the time to the first useful output
+        self.run_metrics = {}
+        self.process = psutil.Process()
+        self.thread_state = threading.local()
+        self.lock = threading.Lock()
+        self.open_stages = 0
+        self.previous_profiler = None
+
+    @property
+    def current_stage(self):
+        """StageMetrics of the stage running in the calling thread, or None."""
+        return getattr(self.thread_state, "stage", None)
+
+    @current_stage.setter
+    def current_stage(self, metrics):
+        self.thread_state.stage = metrics
+
+    @contextmanager
+    def stage(self, name: str):
+        """Context manager measuring one stage; yields its StageMetrics."""
+        global ACTIVE_PROFILER
+        metrics = StageMetrics(name)
+        with self.lock:
+            if self.open_stages == 0:
+                self.previous_profiler, ACTIVE_PROFILER = ACTIVE_PROFILER, self
+            self.open_stages += 1
+        self.current_stage = metrics
+        read_before, written_before = read_io_counters(self.process)
+        cpu_before = total_cpu_seconds(self.process)
+        sampler = RSSSampler().start()
+        start_time = time.time()
+        try:
+            yield metrics
+        finally:
+            metrics.wall_seconds = round(time.time() - start_time, 3)
+            metrics.peak_rss_bytes = sampler.stop()
+            metrics.cpu_seconds = round(total_cpu_seconds(self.process) - cpu_before, 3)
+            read_after, written_after = read_io_counters(self.process)
+            if read_before is not None:
+                metrics.bytes_read = read_after - read_before
+                metrics.bytes_written = written_after - written_before
+            self.current_stage = None
+            with self.lock:
+                self.stages.append(metrics)
+                self.open_stages -= 1
+                if self.open_stages == 0:
+                    ACTIVE_PROFILER = self.previous_profiler
+            print(f"Stage '{name}': {metrics.wall_seconds} s wall, {metrics.cpu_seconds} s CPU, "
+                  f"peak RSS {metrics.peak_rss_bytes / 1024**2:.0f} MiB")
+
+    def record_query(self, sql: str, seconds: float, profile_path: str = None):
+        """Attach a DuckDB query and its timing to the current stage."""
+        if self.current_stage is not None:
+            self.current_stage.queries.append({
+                "sql": " ".join(sql.split())[:500],
+                "seconds": round(seconds, 4),
+                "profile": profile_path,
+            })
+
+    def next_profile_path(self):
+        """Path for the DuckDB profile of the next query in the current stage."""
+        stage_name = self.current_stage.name if self.current_stage else "no_stage"
+        query_number = len(self.current_stage.queries) if self.current_stage else 0
+        profile_dir = os.path.join(self.report_dir, f"duckdb_profiles_{self.run_id}")
+        os.makedirs(profile_dir, exist_ok=True)
+        return os.path.join(profile_dir, f"{stage_name}_{query_number:03d}.json")
+
+    def write_report(self):
+        """
+        Write the run's metrics as JSON and as a Prometheus textfile.
+
+        Returns:
+            tuple: (JSON report path, Prometheus textfile path)
+        """
+        os.makedirs(self.report_dir, exist_ok=True)
+        json_path = os.path.join(self.report_dir, f"pipeline_metrics_{self.run_id}.json")
+        with open(json_path, "w") as f:
+            json.dump({"run_id": self.run_id, "run": self.run_metrics,
+                       "stages": [stage.to_dict() for stage in self.stages]}, f, indent=2)
+
+        metric_fields = {
+            "wall_seconds": "Wall clock time of the stage in seconds",
+            "cpu_seconds": "CPU time of the stage in seconds",
+            "peak_rss_bytes": "Peak resident set size during the stage",
+            "bytes_read": "Bytes read from storage during the stage",
+            "bytes_written": "Bytes written to storage during the stage",
+            "rows_in": "Rows going into the stage",
+            "rows_out": "Rows coming out of the stage",
+        }
+        lines = []
+        for field, help_text in metric_fields.items():
+            lines.append(f"# HELP etl_stage_{field} {help_text}")
+            lines.append(f"# TYPE etl_stage_{field} gauge")
+            for stage in self.stages:
+                value = getattr(stage, field)
+                if value is not None:
+                    lines.append(f'etl_stage_{field}{{stage="{stage.name}"}} {value}')
+        for name, value in self.run_metrics.items():
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE etl_run_{name} gauge")
+                lines.append(f"etl_run_{name} {value}")
+        prom_path = os.path.join(self.report_dir, "pipeline_metrics.prom")
+        tmp_path = prom_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, prom_path)
+
+        print(f"Pipeline metrics written to {json_path} and {prom_path}")
+        return json_path, prom_path
+
+
+class ProfiledConnection:
+    """
+    Wraps a DuckDB connection so every execute() is timed and attached to the active stage.
+    Everything else is passed through to the wrapped connection.
+    """
+
+    def __init__(self, con, profiler):
+        self._con = con
+        self._profiler = profiler
+        if profiler.duckdb_profiling:
+            con.execute("PRAGMA enable_profiling='json'")
+
+    def execute(self, sql, parameters=None):
+        profile_path = None
+        if self._profiler.duckdb_profiling:
+            profile_path = self._profiler.next_profile_path()
+            self._con.execute(f"PRAGMA profiling_output='{profile_path}'")
+        start_time = time.time()
+        result = self._con.execute(sql, parameters) if parameters is not None else self._con.execute(sql)
+        self._profiler.record_query(sql, time.time() - start_time, profile_path)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._con, name)
+
+
+def profile_connection(con):
+    """Returns con wrapped in a ProfiledConnection while a pipeline profiler is active, else con itself."""
+    if ACTIVE_PROFILER is None:
+        return con
+    return ProfiledConnection(con, ACTIVE_PROFILER)
+
+""" EXAMPLE USAGE
+from utils.profiling import measure_peak_memory, PipelineProfiler
+
+df, seconds, peak_rss = measure_peak_memory(transform_dataset, parquet_path)
+print(f"{seconds:.1f} s, peak RSS {peak_rss / 1024**2:.0f} MiB")
+
+profiler = PipelineProfiler(duckdb_profiling=True)
+with profiler.stage("load") as stage:
+    load_parquet_to_duckdb(db_path, "amazon_reviews", parquet_path)
+    stage.rows_out = 31_097_566
+profiler.write_report() """
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+
+
+def create_cache_table(con, cache_table: str = "product_resolution_cache"):
+    """
+    Creates the persistent ProductID -> (title, url) cache table if it does not exist.
+
+    Args:
+        con: DuckDB connection object
+        cache_table (str): Name of the cache table
+    """
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {cache_table} (
+            Product_ID VARCHAR PRIMARY KEY,
+            Product_Name VARCHAR,
+            URL VARCHAR,
+            is_negative BOOLEAN,
+            fetched_at TIMESTAMP,
+            expires_at TIMESTAMP,
+            last_accessed TIMESTAMP
+        )
+    """)
+
+
+def ids_to_arrow(product_ids):
+    """Returns a single-column Arrow table of product IDs that DuckDB can scan directly."""
+    return pa.table({"Product_ID": pa.array(list(product_ids), type=pa.string())})
+
+
+def get_cached_results(con, product_ids, cache_table: str = "product_resolution_cache", now=None):
+    """
+    Looks up product IDs in the cache and marks the hits as recently used.
+
+    Expired entries are treated as misses.
+
+    Args:
+        con: DuckDB connection object
+        product_ids (list): Product IDs to look up
+        cache_table (str): Name of the cache table
+        now (datetime): Current time (default datetime.now())
+
+    Returns:
+        dict: Product ID -> (title, url) for every fresh cache entry
+    """
+    now = now or datetime.now()
+    lookup_ids = ids_to_arrow(product_ids)
+    con.register("lookup_ids", lookup_ids)
+    rows = con.execute(f"""
+        SELECT c.Product_ID, c.Product_Name, c.URL
+        FROM {cache_table} c
+        JOIN lookup_ids l USING (Product_ID)
+        WHERE c.expires_at > ?
+    """, [now]).fetchall()
+    # Touch the hits so LRU eviction keeps them
+    con.execute(f"""
+        UPDATE {cache_table} c
+        SET last_accessed = ?
+        FROM lookup_ids l
+        WHERE c.Product_ID = l.Product_ID
+        AND c.expires_at > ?
+    """, [now, now])
+    con.unregister("lookup_ids")
+    return {product_id: (title, url) for product_id, title, url in rows}
+
+
+def store_results(con, results, cache_table: str = "product_resolution_cache",
+                  ttl=timedelta(days=30), negative_ttl=timedelta(days=7), now=None):
+    """
+    Writes resolved results to the cache in one set-based upsert.
+
+    "No result" answers are cached as negative entries with their own (shorter) TTL.
+
+    Args:
+        con: DuckDB connection object
+        results (dict): Product ID -> (title, url)
+        cache_table (str): Name of the cache table
+        ttl (timedelta): Time to live for positive results
+        negative_ttl (timedelta): Time to live for "No result" entries
+        now (datetime): Current time (default datetime.now())
+    """
+    if not results:
+        return
+    now = now or datetime.now()
+    product_ids = list(results)
+    titles = [results[product_id][0] for product_id in product_ids]
+    urls = [results[product_id][1] for product_id in product_ids]
+    negatives = [not url for url in urls]
+    new_entries = pa.table({
+        "Product_ID": pa.array(product_ids, type=pa.string()),
+        "Product_Name": pa.array(titles, type=pa.string()),
+        "URL": pa.array(urls, type=pa.string()),
+        "is_negative": pa.array(negatives, type=pa.bool_()),
+        "fetched_at": pa.array([now] * len(product_ids), type=pa.timestamp("us")),
+        "expires_at": pa.array([now + (negative_ttl if negative else ttl) for negative in negatives],
+                               type=pa.timestamp("us")),
+        "last_accessed": pa.array([now] * len(product_ids), type=pa.timestamp("us")),
+    })
+    con.register("new_cache_entries", new_entries)
+    con.execute(f"INSERT OR REPLACE INTO {cache_table} SELECT * FROM new_cache_entries")
+    con.unregister("new_cache_entries")
+
+
+def evict_cache(con, cache_table: str = "product_resolution_cache", max_entries: int = 100_000, now=None):
+    """
+    Removes expired entries, then the least recently used ones above max_entries.
+
+    Args:
+        con: DuckDB connection object
+        cache_table (str): Name of the cache table
+        max_entries (int): Maximum number of entries to keep (None for no bound)
+        now (datetime): Current time (default datetime.now())
+
+    Returns:
+        int: Number of entries removed
+    """
+    now = now or datetime.now()
+    before = con.execute(f"SELECT COUNT(*) FROM {cache_table}").fetchone()[0]
+    con.execute(f"DELETE FROM {cache_table} WHERE expires_at <= ?", [now])
+    if max_entries is not None:
+        con.execute(f"""
+            DELETE FROM {cache_table}
+            WHERE Product_ID IN (
+                SELECT Product_ID
+                FROM {cache_table}
+                ORDER BY last_accessed DESC, Product_ID
+                OFFSET {int(max_entries)}
+            )
+        """)
+    after = con.execute(f"SELECT COUNT(*) FROM {cache_table}").fetchone()[0]
+    return before - after
+
+
+def print_cache_report(hits: int, misses: int, evicted: int = 0):
+    """Prints the cache hit/miss report for one enrichment run."""
+    total = hits + misses
+    hit_rate = (hits / total * 100) if total else 0.0
+    print(f"Cache hits: {hits}, misses: {misses}, hit rate: {hit_rate:.1f}%, evicted: {evicted}")
+
+""" EXAMPLE USAGE
+con = duckdb.connect("./data/output/amazon_sales_db.duckDB")
+create_cache_table(con)
+cached = get_cached_results(con, ["B0CJZMP7L1"])
+store_results(con, {"B0CJZMP7L2": ("No result", "")})
+evict_cache(con, max_entries=50_000) """
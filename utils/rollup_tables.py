@@ -0,0 +1,252 @@
+import time
+from .create_duckdb_table import check_table_exists, build_limit_clause
+from .duckdb_session import connect_to_duckdb
+from .surrogate_keys import DIMENSION_TABLES
+
+# Default rollup grain: product x rating x review month (output column -> expression on the reviews table)
+ROLLUP_DIMENSIONS = {
+    "Product_ID": "asin",
+    "rating": "rating",
+    "review_month": 'CAST(date_trunc(\'month\', epoch_ms(CAST("timestamp" AS BIGINT))) AS DATE)',
+}
+# Same grain on a table loaded with surrogate keys: the product is stored as its integer key (see dim_product)
+KEYED_ROLLUP_DIMENSIONS = {
+    "asin_key": "asin_key",
+    **{name: expr for name, expr in ROLLUP_DIMENSIONS.items() if name != "Product_ID"},
+}
+
+# Additive measures, so a delta can be merged into the rollup by adding it
+ROLLUP_MEASURES = {
+    "review_count": "COUNT(*)",
+    "helpful_votes": "COALESCE(SUM(helpful_vote), 0)",
+}
+
+
+def build_rollup_select(source_table: str, dimensions=None):
+    """
+    Returns the grouped SELECT computing the rollup rows of source_table.
+
+    Rows where any dimension is NULL are left out, since the dimensions form the rollup's primary key.
+    """
+    dimensions = ROLLUP_DIMENSIONS if dimensions is None else dimensions
+    dimension_exprs = ", ".join(f"{expr} AS {name}" for name, expr in dimensions.items())
+    measure_exprs = ", ".join(f"{expr} AS {name}" for name, expr in ROLLUP_MEASURES.items())
+    not_null = " AND ".join(f"{expr} IS NOT NULL" for expr in dimensions.values())
+    return f"""
+        SELECT {dimension_exprs}, {measure_exprs}
+        FROM {source_table}
+        WHERE {not_null}
+        GROUP BY ALL
+    """
+
+
+def seed_rollup_table(con, rollup_table: str, source_table: str, dimensions=None):
+    """(Re)create the rollup table from the whole source table, with its dimensions as primary key."""
+    dimensions = ROLLUP_DIMENSIONS if dimensions is None else dimensions
+    rollup_select = build_rollup_select(source_table, dimensions)
+    column_defs = ", ".join(
+        f"{name} {col_type}" for name, col_type, *_ in con.execute(f"DESCRIBE {rollup_select}").fetchall()
+    )
+    con.execute(f"DROP TABLE IF EXISTS {rollup_table}")
+    con.execute(f"CREATE TABLE {rollup_table} ({column_defs}, PRIMARY KEY ({', '.join(dimensions)}))")
+    # Sorted by month and rating so filtered queries can skip row groups
+    con.execute(f"""
+        INSERT INTO {rollup_table}
+        {rollup_select}
+        ORDER BY {', '.join(reversed(list(dimensions)))}
+    """)
+
+
+def create_rollup_table(
+    db_path: str,
+    rollup_table: str = "reviews_rollup_asin_rating_month",
+    source_table: str = "amazon_reviews",
+    dimensions=None
+):
+    """
+    Materialize a rollup of the reviews table: review count and helpful votes per dimension combination.
+
+    Later loads keep it current with refresh_rollup_incrementally instead of rebuilding it.
+
+    Args:
+        db_path (str): Path to the DuckDB database file
+        rollup_table (str): Rollup table to create (replaced if it exists)
+        source_table (str): Input reviews table
+        dimensions (dict): Output column -> expression to group by (default ROLLUP_DIMENSIONS)
+
+    Returns:
+        str: Name of the rollup table
+    """
+    con = connect_to_duckdb(db_path)
+    seed_rollup_table(con, rollup_table, source_table, dimensions)
+    num_groups = con.execute(f"SELECT COUNT(*) FROM {rollup_table}").fetchone()[0]
+    con.close()
+    print(f"Rollup table '{rollup_table}' created with {num_groups} groups.")
+    return rollup_table
+
+
+def refresh_rollup_incrementally(
+    con,
+    rollup_table: str,
+    delta_table: str,
+    source_table: str = "amazon_reviews",
+    dimensions=None
+):
+    """
+    Merge the rollup of newly loaded rows into the rollup table.
+
+    Groups that already exist get the delta's measures added, new groups are inserted, so only
+    the delta rows are scanned. If the rollup table does not exist yet it is seeded from the whole
+    source table, which must already contain the delta rows.
+
+    Args:
+        con: DuckDB connection object
+        rollup_table (str): Rollup table to refresh
+        delta_table (str): Table holding only the newly loaded rows
+        source_table (str): Input reviews table (used once to seed the rollup)
+        dimensions (dict): Output column -> expression to group by (default ROLLUP_DIMENSIONS)
+    """
+    dimensions = ROLLUP_DIMENSIONS if dimensions is None else dimensions
+    if not check_table_exists(con, rollup_table):
+        seed_rollup_table(con, rollup_table, source_table, dimensions)
+        print(f"Rollup table '{rollup_table}' seeded from '{source_table}'.")
+        return
+
+    updates = ", ".join(f"{name} = {name} + EXCLUDED.{name}" for name in ROLLUP_MEASURES)
+    con.execute(f"""
+        INSERT INTO {rollup_table}
+        {build_rollup_select(delta_table, dimensions)}
+        ON CONFLICT ({', '.join(dimensions)}) DO UPDATE SET {updates}
+    """)
+    print(f"Rollup table '{rollup_table}' refreshed from '{delta_table}'.")
+
+
+def query_top_products_from_rollup(
+    db_path: str,
+    rollup_table: str = "reviews_rollup_asin_rating_month",
+    metric: str = "review_count",
+    rating=None,
+    start_month: str = None,
+    end_month: str = None,
+    limit: int = 10000,
+    output_table: str = None
+):
+    """
+    Answer a top-N product query from the rollup instead of the reviews table.
+
+    A rollup built with KEYED_ROLLUP_DIMENSIONS is grouped on asin_key and decoded through dim_product,
+    so Product_ID always holds the product ID.
+
+    Args:
+        db_path (str): Path to the DuckDB database file
+        rollup_table (str): Rollup table with Product_ID (or asin_key), rating and review_month dimensions
+        metric (str): Measure to rank by ('review_count' or 'helpful_votes')
+        rating: Only count reviews with this rating (optional)
+        start_month (str): First month to include, e.g. '2023-01-01' (optional)
+        end_month (str): Last month to include (optional)
+        limit (int): Number of products to return
+        output_table (str): Also store the result as this table, with columns Product_ID and count (optional)
+
+    Returns:
+        list: (Product_ID, count) tuples, highest first
+    """
+    if metric not in ROLLUP_MEASURES:
+        raise ValueError(f"Unknown metric '{metric}'. Expected one of {list(ROLLUP_MEASURES)}.")
+    conditions, params = [], []
+    if rating is not None:
+        conditions.append("rating = ?")
+        params.append(rating)
+    if start_month is not None:
+        conditions.append("review_month >= CAST(? AS DATE)")
+        params.append(start_month)
+    if end_month is not None:
+        conditions.append("review_month <= CAST(? AS DATE)")
+        params.append(end_month)
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    con = connect_to_duckdb(db_path)
+    rollup_columns = [col for col, *_ in con.execute(f"DESCRIBE {rollup_table}").fetchall()]
+    if "asin_key" in rollup_columns:
+        id_column, key_column = DIMENSION_TABLES["dim_product"]
+        grouped = f"""
+            SELECT d.{id_column} AS Product_ID, r.count
+            FROM (SELECT asin_key, SUM({metric}) AS count FROM {rollup_table} {where_clause} GROUP BY asin_key) r
+            JOIN dim_product d ON d.{key_column} = r.asin_key
+        """
+    else:
+        grouped = f"SELECT Product_ID, SUM({metric}) AS count FROM {rollup_table} {where_clause} GROUP BY Product_ID"
+    query = f"""
+        SELECT Product_ID, count
+        FROM ({grouped})
+        ORDER BY count DESC, Product_ID
+        {build_limit_clause(limit)}
+    """
+
+    start_time = time.time()
+    if output_table:
+        con.execute(f"CREATE OR REPLACE TABLE {output_table} AS {query}", params)
+        rows = con.execute(f"SELECT * FROM {output_table}").fetchall()
+    else:
+        rows = con.execute(query, params).fetchall()
+    con.close()
+    print(f"Top {len(rows)} products by {metric} answered from '{rollup_table}' in {(time.time() - start_time) * 1000:.1f} ms")
+    return rows
+
+
+def check_rollup_consistency(
+    db_path: str,
+    rollup_table: str = "reviews_rollup_asin_rating_month",
+    source_table: str = "amazon_reviews",
+    dimensions=None
+):
+    """
+    Recompute the rollup from the reviews table and compare it group by group with the stored rollup.
+
+    Args:
+        db_path (str): Path to the DuckDB database file
+        rollup_table (str): Rollup table to check
+        source_table (str): Input reviews table
+        dimensions (dict): Dimensions the rollup was built with (default ROLLUP_DIMENSIONS)
+
+    Returns:
+        dict: rollup_groups, base_groups, mismatched_groups and consistent (bool)
+    """
+    dimensions = ROLLUP_DIMENSIONS if dimensions is None else dimensions
+    join_keys = " AND ".join(f"r.{name} = b.{name}" for name in dimensions)
+    measure_mismatch = " OR ".join(f"r.{name} IS DISTINCT FROM b.{name}" for name in ROLLUP_MEASURES)
+
+    con = connect_to_duckdb(db_path, read_only=True)
+    rollup_groups, base_groups, mismatched_groups = con.execute(f"""
+        WITH base AS ({build_rollup_select(source_table, dimensions)})
+        SELECT
+            COUNT(*) FILTER (WHERE r.{next(iter(dimensions))} IS NOT NULL),
+            COUNT(*) FILTER (WHERE b.{next(iter(dimensions))} IS NOT NULL),
+            COUNT(*) FILTER (WHERE {measure_mismatch})
+        FROM {rollup_table} r
+        FULL OUTER JOIN base b ON {join_keys}
+    """).fetchone()
+    con.close()
+
+    report = {
+        "rollup_groups": rollup_groups,
+        "base_groups": base_groups,
+        "mismatched_groups": mismatched_groups,
+        "consistent": mismatched_groups == 0,
+    }
+    if report["consistent"]:
+        print(f"✔ Rollup '{rollup_table}' matches '{source_table}' ({rollup_groups} groups).")
+    else:
+        print(f"✘ Rollup '{rollup_table}' differs from '{source_table}' in {mismatched_groups} groups.")
+    return report
+
+""" EXAMPLE USAGE
+from utils.rollup_tables import create_rollup_table, query_top_products_from_rollup, check_rollup_consistency
+
+db_path = "./data/output/amazon_sales_db.duckDB"
+create_rollup_table(db_path)
+# Same ranking as create_grouped_table(..., filter_column='rating', filter_operator='=', filter_value=5)
+query_top_products_from_rollup(db_path, rating=5, limit=10000, output_table="top_products_count")
+query_top_products_from_rollup(db_path, metric="helpful_votes", start_month="2023-01-01", limit=100)
+# New review drops refresh the rollup from the new rows only
+load_parquet_incremental(db_path, "amazon_reviews", "./data/incoming/",
+                         rollup_tables=[{"rollup_table": "reviews_rollup_asin_rating_month"}])
+check_rollup_consistency(db_path) """
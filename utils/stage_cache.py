@@ -0,0 +1,236 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+from .duckdb_session import connect_to_duckdb
+
+
+def fingerprint_path(path: str, hash_contents: bool = False):
+    """
+    Fingerprint a file or a directory tree.
+
+    By default only file names, sizes and modification times are used (cheap on 30GB of Parquet);
+    hash_contents=True hashes the bytes instead.
+
+    Returns:
+        str: Hex digest, or None if the path does not exist
+    """
+    if not os.path.exists(path):
+        return None
+    if os.path.isdir(path):
+        files = sorted(
+            os.path.join(root, name)
+            for root, _dirs, names in os.walk(path)
+            for name in names
+        )
+    else:
+        files = [path]
+
+    digest = hashlib.sha256()
+    for file_path in files:
+        digest.update(os.path.relpath(file_path, path).encode())
+        if hash_contents:
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        else:
+            stat = os.stat(file_path)
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def fingerprint_code(fn, code_files=()):
+    """
+    Fingerprint the source of fn plus any extra source files it depends on.
+
+    Only fn's own source is hashed, so editing other functions (or docstrings) in the same module does
+    not invalidate the stage; helpers it calls belong in code_files.
+    """
+    digest = hashlib.sha256()
+    try:
+        digest.update(inspect.getsource(fn).encode())
+    except (OSError, TypeError):
+        digest.update(f"{getattr(fn, '__module__', '')}.{getattr(fn, '__qualname__', repr(fn))}".encode())
+    for source_file in code_files:
+        with open(source_file, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def remove_path(path: str):
+    """Delete a file or directory if it exists."""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def drop_tables(db_path: str, tables):
+    """Drop DuckDB tables so functions that skip existing tables rebuild them."""
+    if not tables or not os.path.exists(db_path):
+        return
+    con = connect_to_duckdb(db_path)
+    for table in tables:
+        con.execute(f"DROP TABLE IF EXISTS {table}")
+    con.close()
+
+
+class StageCache:
+    """
+    Skips pipeline stages whose inputs are unchanged and reruns everything downstream of a change.
+
+    A stage's fingerprint covers its parameters, its code, its input files and the fingerprints and
+    output files of its upstream stages. A stage is skipped only when the fingerprint matches the manifest and its
+    outputs still exist unchanged; otherwise its outputs are removed and it runs again. Outputs of a
+    stage with no manifest entry yet are never removed (they may predate the manifest), and outputs
+    or tables listed in keep_outputs are never removed at all.
+    Every decision and timing is appended to the JSON manifest. Stages may be run from several
+    threads at once; the manifest is only read and written under a lock.
+
+    Args:
+        manifest_path (str): JSON manifest file
+        hash_contents (bool): Hash file contents instead of size/mtime
+    """
+
+    def __init__(self, manifest_path: str = "./data/output/stage_manifest.json", hash_contents: bool = False):
+        self.manifest_path = manifest_path
+        self.hash_contents = hash_contents
+        self.manifest = {"stages": {}, "runs": []}
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        self.run_id = datetime.now().isoformat(timespec="seconds")
+        self.lock = threading.RLock()
+
+    def save(self):
+        """Write the manifest atomically."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with self.lock:
+            with open(tmp_path, "w") as f:
+                json.dump(self.manifest, f, indent=2, default=str)
+            os.replace(tmp_path, self.manifest_path)
+
+    def stage_fingerprint(self, fn, params, inputs, upstream, code_files):
+        """Combine params, code, input files and upstream fingerprints into one digest."""
+        upstream_fingerprints = {}
+        for stage in upstream:
+            if stage not in self.manifest["stages"]:
+                raise ValueError(f"Upstream stage '{stage}' has not run yet (no entry in {self.manifest_path}). "
+                                 f"Run it first, or include it in --only/--from.")
+            # The recorded outputs too, so a rerun that rewrote them (e.g. because they went missing) reruns this stage
+            upstream_fingerprints[stage] = [self.manifest["stages"][stage]["fingerprint"],
+                                            self.manifest["stages"][stage].get("outputs", {})]
+        payload = {
+            "params": params,
+            "code": fingerprint_code(fn, code_files),
+            "inputs": {path: fingerprint_path(path, self.hash_contents) for path in inputs},
+            "upstream": upstream_fingerprints,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def run_stage(self, name, fn, *args, params=None, inputs=(), upstream=(), outputs=(),
+                  output_db_path=None, output_tables=(), code_files=(), keep_outputs=(), run_options=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) unless the stage is cached.
+
+        Callable kwargs (e.g. progress callbacks) do not affect the output and are left out of the fingerprint.
+
+        Args:
+            name (str): Stage name
+            fn: Stage function
+            params (dict): Parameters that affect the output (e.g. filter_value, limit); args/kwargs are added
+            inputs (list): Input files/directories to fingerprint
+            upstream (list): Names of the stages this stage depends on
+            outputs (list): Output files/directories (removed before a rerun, checked on a hit)
+            output_db_path (str): DuckDB file holding output_tables
+            output_tables (list): Output tables (dropped before a rerun, checked on a hit)
+            code_files (list): Extra source files whose changes should invalidate the stage
+            keep_outputs (list): Outputs or output tables that fn updates in place instead of rebuilding
+                (downloaded shards, a resumable job's table); they are checked but not removed before a rerun
+            run_options (dict): Keyword arguments that change how fn runs but not what it produces
+                (e.g. worker counts); passed to fn but left out of the fingerprint
+
+        Returns:
+            The stage's return value (the recorded one on a cache hit)
+        """
+        fingerprinted_kwargs = {key: value for key, value in kwargs.items() if not callable(value)}
+        params = {"args": args, "kwargs": fingerprinted_kwargs, **(params or {})}
+        with self.lock:
+            fingerprint = self.stage_fingerprint(fn, params, inputs, upstream, code_files)
+            previous = self.manifest["stages"].get(name)
+
+        decision = "ran"
+        if previous and previous["fingerprint"] == fingerprint:
+            if self.outputs_intact(previous, outputs, output_db_path, output_tables):
+                decision = "skipped"
+            else:
+                decision = "ran (outputs missing or changed)"
+        elif previous:
+            decision = "ran (inputs changed)"
+
+        start_time = time.time()
+        if decision == "skipped":
+            result = previous["result"]
+            print(f"Stage '{name}' unchanged. Skipping.")
+        else:
+            if previous:
+                for path in outputs:
+                    if path not in keep_outputs:
+                        remove_path(path)
+                drop_tables(output_db_path, [table for table in output_tables if table not in keep_outputs])
+            print(f"Stage '{name}': {decision}")
+            result = fn(*args, **kwargs, **(run_options or {}))
+            output_fingerprints = {path: fingerprint_path(path, self.hash_contents) for path in outputs}
+            with self.lock:
+                self.manifest["stages"][name] = {
+                    "fingerprint": fingerprint,
+                    "result": result,
+                    "outputs": output_fingerprints,
+                    "completed_at": datetime.now().isoformat(timespec="seconds"),
+                }
+        seconds = time.time() - start_time
+
+        with self.lock:
+            self.manifest["runs"].append({
+                "run_id": self.run_id, "stage": name, "decision": decision,
+                "seconds": round(seconds, 3), "fingerprint": fingerprint,
+            })
+            self.save()
+        return result
+
+    def outputs_intact(self, previous, outputs, db_path, output_tables):
+        """
+        True if every output file is unchanged and every output table exists.
+
+        An output that several stages write (the serving snapshot) also counts as unchanged when it is
+        what one of the other stages last wrote, so those stages do not rerun each other.
+        """
+        recorded = previous.get("outputs", {})
+        with self.lock:
+            stage_outputs = [stage.get("outputs", {}) for stage in self.manifest["stages"].values()]
+        for path in outputs:
+            written = {written_outputs[path] for written_outputs in stage_outputs if path in written_outputs}
+            if path not in recorded or fingerprint_path(path, self.hash_contents) not in written:
+                return False
+        if output_tables:
+            if not os.path.exists(db_path):
+                return False
+            con = connect_to_duckdb(db_path, read_only=True)
+            existing = {row[0].lower() for row in con.execute("SELECT table_name FROM information_schema.tables").fetchall()}
+            con.close()
+            if any(table.lower() not in existing for table in output_tables):
+                return False
+        return True
+
+""" EXAMPLE USAGE
+cache = StageCache("./data/output/stage_manifest.json")
+parquet_path = cache.run_stage("transform", transform_dataset_to_parquet, raw_path, cleaned_path,
+                               inputs=[raw_path], outputs=[cleaned_path])
+cache.run_stage("load", load_parquet_to_duckdb, db_path, "amazon_reviews", parquet_path,
+                upstream=["transform"], output_db_path=db_path, output_tables=["amazon_reviews"]) """
@@ -0,0 +1,198 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .profiling import StageMetrics
+
+
+class PipelineStage:
+    """
+    One step of the pipeline DAG.
+
+    Args:
+        name (str): Stage name (also used by --only/--from and in the profiler report)
+        fn: Function called with the stage's StageMetrics, so it can set rows_in/rows_out
+        depends_on (list): Names of the stages that must finish first
+        output (bool): The stage produces a file the user is waiting for (counts for first-output latency)
+    """
+
+    def __init__(self, name: str, fn, depends_on=(), output: bool = False):
+        self.name = name
+        self.fn = fn
+        self.depends_on = list(depends_on)
+        self.output = output
+
+
+class StageScheduler:
+    """
+    Runs pipeline stages as a DAG on a thread pool, so independent branches overlap.
+
+    A stage is started as soon as every selected stage it depends on has finished. Stages that
+    are not selected are assumed to be done already (the stage cache checks their outputs).
+    If a stage fails, the stages downstream of it are not started, the running ones are
+    allowed to finish and the first error is raised.
+
+    The time from the start of the run to the first useful output (an output stage finishing,
+    or a partial result reported with mark_output) is recorded per run.
+
+    Args:
+        stages (list): PipelineStage objects
+        max_workers (int): Stages running at the same time
+        profiler: PipelineProfiler measuring every stage (optional)
+    """
+
+    def __init__(self, stages, max_workers: int = 3, profiler=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers
+        self.profiler = profiler
+        self.lock = threading.Lock()
+        self.start_time = None
+        self.first_output = None
+        self.timeline = {}
+        for stage in stages:
+            unknown = [name for name in stage.depends_on if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages {unknown}.")
+        self.order = self.topological_order()
+
+    def topological_order(self):
+        """Stage names with every stage after the stages it depends on; raises on cycles."""
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage dependencies form a cycle through '{name}'.")
+            visiting.add(name)
+            for dependency in self.stages[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def downstream_of(self, name: str):
+        """The stage and every stage that depends on it, directly or indirectly."""
+        selected = {name}
+        for stage_name in self.order:
+            if any(dependency in selected for dependency in self.stages[stage_name].depends_on):
+                selected.add(stage_name)
+        return selected
+
+    def select_stages(self, only=None, from_stage=None):
+        """
+        Stage names to run, in dependency order.
+
+        Args:
+            only (list): Run just these stages
+            from_stage (str): Run this stage and everything downstream of it
+
+        Returns:
+            list: Selected stage names
+        """
+        selected = set(self.stages)
+        if only:
+            unknown = [name for name in only if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Unknown stages {unknown}. Expected some of {self.order}.")
+            selected = set(only)
+        if from_stage:
+            if from_stage not in self.stages:
+                raise ValueError(f"Unknown stage '{from_stage}'. Expected one of {self.order}.")
+            selected &= self.downstream_of(from_stage)
+        return [name for name in self.order if name in selected]
+
+    def mark_output(self, label: str):
+        """Record that a useful output (e.g. a partial export) is available; only the first one counts."""
+        with self.lock:
+            if self.first_output is None and self.start_time is not None:
+                self.first_output = (label, time.time() - self.start_time)
+                print(f"✔ First output '{label}' after {self.first_output[1]:.1f} seconds")
+
+    def run_stage(self, name: str):
+        stage = self.stages[name]
+        started = time.time() - self.start_time
+        if self.profiler is not None:
+            with self.profiler.stage(name) as metrics:
+                stage.fn(metrics)
+        else:
+            stage.fn(StageMetrics(name))
+        self.timeline[name] = (round(started, 3), round(time.time() - self.start_time, 3))
+        if stage.output:
+            self.mark_output(name)
+
+    def run(self, only=None, from_stage=None):
+        """
+        Run the selected stages.
+
+        Args:
+            only (list): Run just these stages
+            from_stage (str): Run this stage and everything downstream of it
+
+        Returns:
+            dict: total_seconds, first_output, first_output_seconds and the (start, end) offsets per stage
+        """
+        selected = self.select_stages(only, from_stage)
+        pending = {name: {dep for dep in self.stages[name].depends_on if dep in selected} for name in selected}
+        self.start_time = time.time()
+        self.first_output = None
+        self.timeline = {}
+        print(f"Running stages {selected} with up to {self.max_workers} at a time")
+
+        errors = []
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                if not errors:
+                    for name in [name for name, deps in pending.items() if not deps]:
+                        del pending[name]
+                        running[pool.submit(self.run_stage, name)] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        print(f"✘ Stage '{name}' failed: {future.exception()}")
+                        errors.append(future.exception())
+                        continue
+                    for deps in pending.values():
+                        deps.discard(name)
+
+        report = {
+            "total_seconds": round(time.time() - self.start_time, 3),
+            "first_output": self.first_output[0] if self.first_output else None,
+            "first_output_seconds": round(self.first_output[1], 3) if self.first_output else None,
+            "stages": self.timeline,
+        }
+        if self.profiler is not None:
+            self.profiler.run_metrics.update(
+                total_seconds=report["total_seconds"], first_output=report["first_output"],
+                first_output_seconds=report["first_output_seconds"], stage_timeline=self.timeline)
+        for name, (started, ended) in self.timeline.items():
+            print(f"{name:<22} {started:>10.1f} s -> {ended:>10.1f} s")
+        if report["first_output"] is not None:
+            print(f"Time to first output ('{report['first_output']}'): {report['first_output_seconds']:.1f} seconds")
+        if errors:
+            not_run = sorted(pending)
+            if not_run:
+                print(f"Stages not run because of the failure: {not_run}")
+            raise errors[0]
+        return report
+
+""" EXAMPLE USAGE
+from utils.stage_scheduler import PipelineStage, StageScheduler
+
+scheduler = StageScheduler([
+    PipelineStage("load", lambda stage: load_parquet_to_duckdb(db_path, "amazon_reviews", parquet_path)),
+    PipelineStage("product_stats", lambda stage: create_product_stats_table(db_path), depends_on=["load"]),
+    PipelineStage("rollup", lambda stage: create_rollup_table(db_path), depends_on=["load"]),
+    PipelineStage("export", lambda stage: export_table_to_excel(db_path, "product_stats", "./data/output/"),
+                  depends_on=["product_stats"], output=True),
+], max_workers=2, profiler=profiler)
+scheduler.run()                     # product_stats and rollup run at the same time
+scheduler.run(from_stage="rollup")  # rollup and everything downstream of it
+scheduler.run(only=["export"]) """
@@ -0,0 +1,191 @@
+import os
+import time
+from .duckdb_session import connect_to_duckdb
+
+# Dimension tables: table -> (id column, integer key column)
+DIMENSION_TABLES = {
+    "dim_product": ("product_id", "product_key"),
+    "dim_user": ("user_id", "user_key"),
+}
+
+# Review ID columns replaced by integer keys in the fact table: column -> (dimension table, key column)
+# asin and parent_asin share the product dimension, so a parent product has the same key as the product.
+SURROGATE_KEYS = {
+    "asin": ("dim_product", "asin_key"),
+    "parent_asin": ("dim_product", "parent_asin_key"),
+    "user_id": ("dim_user", "user_key"),
+}
+
+
+def keyed_column_name(column: str):
+    """Name of a review column in the keyed fact table (asin -> asin_key, other columns unchanged)."""
+    return SURROGATE_KEYS[column][1] if column in SURROGATE_KEYS else column
+
+
+def create_dimension_tables(con):
+    """Create the dimension tables if they do not exist yet."""
+    for dim_table, (id_column, key_column) in DIMENSION_TABLES.items():
+        con.execute(f"CREATE TABLE IF NOT EXISTS {dim_table} ({key_column} INTEGER NOT NULL, {id_column} VARCHAR NOT NULL)")
+
+
+def extend_dimension_tables(con, source_sql: str, params=None, columns=None):
+    """
+    Give every ID in the source that is not in its dimension table yet the next free integer key.
+
+    Existing keys are never changed, so keys stay stable across incremental loads. New IDs are
+    numbered in sorted order after the current maximum key, so the same input gives the same keys.
+
+    Args:
+        con: DuckDB connection object
+        source_sql (str): FROM-able source, e.g. "read_parquet(?)" or a table name
+        params (list): Parameters of source_sql (it may contain one '?')
+        columns (list): Columns of the source (only the SURROGATE_KEYS columns present are used)
+
+    Returns:
+        dict: Dimension table -> number of IDs added
+    """
+    create_dimension_tables(con)
+    if columns is None:
+        columns = [col for col, *_ in con.execute(f"DESCRIBE SELECT * FROM {source_sql}", params or []).fetchall()]
+    added = {}
+    for dim_table, (id_column, key_column) in DIMENSION_TABLES.items():
+        id_columns = [col for col in columns if col in SURROGATE_KEYS and SURROGATE_KEYS[col][0] == dim_table]
+        if not id_columns:
+            continue
+        ids_union = " UNION ALL ".join(f'SELECT "{col}" AS id FROM src' for col in id_columns)
+        before = con.execute(f"SELECT COUNT(*) FROM {dim_table}").fetchone()[0]
+        con.execute(f"""
+            INSERT INTO {dim_table}
+            WITH src AS (SELECT {', '.join(f'"{col}"' for col in id_columns)} FROM {source_sql}),
+            new_ids AS (
+                SELECT DISTINCT id FROM ({ids_union}) ids
+                WHERE id IS NOT NULL
+                AND id NOT IN (SELECT {id_column} FROM {dim_table})
+            )
+            SELECT
+                (SELECT COALESCE(MAX({key_column}), 0) FROM {dim_table}) + CAST(row_number() OVER (ORDER BY id) AS INTEGER),
+                id
+            FROM new_ids
+        """, params or [])
+        added[dim_table] = con.execute(f"SELECT COUNT(*) FROM {dim_table}").fetchone()[0] - before
+    return added
+
+
+def build_keyed_select(source_sql: str, columns):
+    """
+    Returns a SELECT over the source with the ID columns replaced by their integer keys, in column order.
+
+    The dimension tables must already contain every ID of the source (extend_dimension_tables).
+    """
+    select_exprs, joins = [], []
+    for col in columns:
+        if col in SURROGATE_KEYS:
+            dim_table, key_name = SURROGATE_KEYS[col]
+            id_column, key_column = DIMENSION_TABLES[dim_table]
+            alias = f"d_{key_name}"
+            select_exprs.append(f"{alias}.{key_column} AS {key_name}")
+            joins.append(f'LEFT JOIN {dim_table} {alias} ON {alias}.{id_column} = s."{col}"')
+        else:
+            select_exprs.append(f's."{col}"')
+    return f"SELECT {', '.join(select_exprs)} FROM {source_sql} s {' '.join(joins)}"
+
+
+def build_decoded_select(table_name: str, columns):
+    """Returns a SELECT over a keyed table with the integer keys turned back into the original IDs."""
+    key_columns = {key_name: col for col, (_dim, key_name) in SURROGATE_KEYS.items()}
+    select_exprs, joins = [], []
+    for col in columns:
+        if col in key_columns:
+            dim_table = SURROGATE_KEYS[key_columns[col]][0]
+            id_column, key_column = DIMENSION_TABLES[dim_table]
+            alias = f"d_{col}"
+            select_exprs.append(f'{alias}.{id_column} AS "{key_columns[col]}"')
+            joins.append(f"LEFT JOIN {dim_table} {alias} ON {alias}.{key_column} = f.{col}")
+        else:
+            select_exprs.append(f'f."{col}"')
+    return f"SELECT {', '.join(select_exprs)} FROM {table_name} f {' '.join(joins)}"
+
+
+def create_decoded_view(con, table_name: str, view_name: str = None):
+    """
+    Create a view showing a keyed table with its original ID columns ('<table_name>_decoded' by default).
+
+    Returns:
+        str: Name of the view
+    """
+    view_name = view_name or f"{table_name}_decoded"
+    columns = [col for col, *_ in con.execute(f"DESCRIBE {table_name}").fetchall()]
+    con.execute(f"CREATE OR REPLACE VIEW {view_name} AS {build_decoded_select(table_name, columns)}")
+    return view_name
+
+
+def benchmark_surrogate_keys(parquet_path: str, work_dir: str = "./data/benchmark/surrogate_keys/", repeat: int = 3):
+    """
+    Measure the storage and query time of the reviews table with VARCHAR IDs vs integer surrogate keys.
+
+    Both tables are loaded from the same Parquet file into separate database files. The queries are the
+    product group-by behind the top-N table, the dedup on the natural key and a join of the reviews
+    to the top 10000 products.
+
+    Args:
+        parquet_path (str): Cleaned reviews Parquet file
+        work_dir (str): Folder for the two database files
+        repeat (int): Runs per query (the fastest is reported)
+
+    Returns:
+        dict: layout -> {"db_mb", "load_seconds", "<query>_seconds"...}
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    product_col = {"strings": "asin", "keys": "asin_key"}
+    user_col = {"strings": "user_id", "keys": "user_key"}
+    report = {}
+    for layout in ("strings", "keys"):
+        db_path = os.path.join(work_dir, f"reviews_{layout}.duckdb")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        con = connect_to_duckdb(db_path)
+        source_sql = f"read_parquet('{parquet_path}')"
+        columns = [col for col, *_ in con.execute(f"DESCRIBE SELECT * FROM {source_sql}").fetchall()]
+        start_time = time.time()
+        if layout == "keys":
+            extend_dimension_tables(con, source_sql, columns=columns)
+            con.execute(f"CREATE TABLE amazon_reviews AS {build_keyed_select(source_sql, columns)}")
+        else:
+            con.execute(f"CREATE TABLE amazon_reviews AS SELECT * FROM {source_sql}")
+        con.execute("CHECKPOINT")
+        load_seconds = time.time() - start_time
+        con.close()
+
+        product, user = product_col[layout], user_col[layout]
+        queries = {
+            "group_by": f"""SELECT {product}, COUNT(*) AS count FROM amazon_reviews WHERE rating = 5
+                            GROUP BY {product} ORDER BY count DESC LIMIT 10000""",
+            "dedup": f'SELECT COUNT(*) FROM (SELECT DISTINCT {user}, {product}, "timestamp" FROM amazon_reviews)',
+            "join": f"""WITH top AS (SELECT {product} AS p FROM amazon_reviews GROUP BY {product} ORDER BY COUNT(*) DESC LIMIT 10000)
+                        SELECT COUNT(*), SUM(helpful_vote) FROM amazon_reviews r JOIN top ON r.{product} = top.p""",
+        }
+        stats = {"db_mb": round(os.path.getsize(db_path) / 1024**2, 1), "load_seconds": round(load_seconds, 2)}
+        con = connect_to_duckdb(db_path, read_only=True)
+        for name, query in queries.items():
+            timings = []
+            for _ in range(repeat):
+                start_time = time.time()
+                con.execute(query).fetchall()
+                timings.append(time.time() - start_time)
+            stats[f"{name}_seconds"] = round(min(timings), 3)
+        con.close()
+        report[layout] = stats
+
+    for layout, stats in report.items():
+        print(f"{layout:<8} " + "  ".join(f"{name} {value}" for name, value in stats.items()))
+    return report
+
+""" EXAMPLE USAGE
+from utils.surrogate_keys import extend_dimension_tables, build_keyed_select, create_decoded_view, benchmark_surrogate_keys
+
+con = connect_to_duckdb("./data/output/amazon_sales_db.duckDB")
+extend_dimension_tables(con, "read_parquet(?)", ["./data/output/amazon_reviews_df_cleaned.parquet"])
+con.execute(f"CREATE TABLE amazon_reviews AS {build_keyed_select('amazon_reviews_staging', columns)}")
+create_decoded_view(con, "amazon_reviews")   # amazon_reviews_decoded shows asin/parent_asin/user_id again
+con.close()
+benchmark_surrogate_keys("./data/output/amazon_reviews_df_cleaned.parquet") """
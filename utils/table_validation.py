@@ -0,0 +1,254 @@
+import glob
+import re
+import time
+import pyarrow.parquet as pq
+from .file_handling import resolve_parquet_path
+
+# DuckDB column types whose min/max statistics are exact and comparable with the Parquet footer
+# (string statistics are truncated to a prefix in DuckDB, so strings are only checked for nulls)
+INTEGER_TYPES = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+                 "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT", "UHUGEINT")
+FLOAT_TYPES = ("FLOAT", "DOUBLE")
+
+
+def list_parquet_dataset_files(parquet_path: str):
+    """Returns the sorted files of a Parquet file, dataset directory or glob, in the order DuckDB scans them."""
+    return sorted(glob.glob(resolve_parquet_path(parquet_path), recursive=True))
+
+
+def read_parquet_footer_stats(parquet_path: str):
+    """
+    Collect row counts, null counts and min/max per top-level column from the Parquet footers only.
+
+    Nested columns (lists, structs) are left out of the column statistics. A column's min/max is None
+    when any row group has no min/max for it.
+
+    Args:
+        parquet_path (str): Parquet file, dataset directory or glob
+
+    Returns:
+        dict: num_rows, row_groups (list of (file, row group index, num_rows)) and
+            columns (name -> {"null_count", "min", "max"})
+    """
+    row_groups = []
+    columns = {}
+    for file_path in list_parquet_dataset_files(parquet_path):
+        metadata = pq.ParquetFile(file_path).metadata
+        for rg_index in range(metadata.num_row_groups):
+            row_group = metadata.row_group(rg_index)
+            row_groups.append((file_path, rg_index, row_group.num_rows))
+            for col_index in range(row_group.num_columns):
+                chunk = row_group.column(col_index)
+                if "." in chunk.path_in_schema:
+                    continue
+                stats = chunk.statistics
+                column = columns.setdefault(chunk.path_in_schema, {"null_count": 0, "min": None, "max": None,
+                                                                   "complete": True})
+                if stats is None or not stats.has_null_count:
+                    column["null_count"] = None
+                elif column["null_count"] is not None:
+                    column["null_count"] += stats.null_count
+                if stats is None or not stats.has_min_max:
+                    # A row group of only nulls has no min/max and does not affect them
+                    if stats is None or stats.null_count != row_group.num_rows:
+                        column["complete"] = False
+                    continue
+                column["min"] = stats.min if column["min"] is None else min(column["min"], stats.min)
+                column["max"] = stats.max if column["max"] is None else max(column["max"], stats.max)
+
+    for column in columns.values():
+        if not column.pop("complete"):
+            column["min"] = column["max"] = None
+    return {
+        "num_rows": sum(num_rows for _file, _rg, num_rows in row_groups),
+        "row_groups": row_groups,
+        "columns": columns,
+    }
+
+
+def parse_stats_value(value: str, col_type: str):
+    """Convert a min/max value from DuckDB's stats() text to a Python value, or None if not comparable."""
+    if col_type in INTEGER_TYPES:
+        return int(value)
+    if col_type in FLOAT_TYPES:
+        return float(value)
+    if col_type == "BOOLEAN":
+        return value == "true"
+    return None
+
+
+def read_duckdb_table_stats(con, table_name: str):
+    """
+    Collect the row count and per-column statistics DuckDB keeps for a table, without scanning it.
+
+    Args:
+        con: DuckDB connection object
+        table_name (str): Table to inspect
+
+    Returns:
+        dict: num_rows and columns (name -> {"type", "has_null", "has_no_null", "min", "max"});
+            min/max are None for types whose statistics are not exact
+    """
+    column_types = {
+        col: col_type.upper() for col, col_type, *_ in con.execute(f"DESCRIBE {table_name}").fetchall()
+        if not (col_type.endswith("]") or col_type.upper().startswith(("STRUCT", "MAP", "UNION")))
+    }
+    num_rows = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    columns = {}
+    if column_types and num_rows:
+        stats_exprs = ", ".join(f'stats("{col}")' for col in column_types)
+        stats_row = con.execute(f"SELECT {stats_exprs} FROM {table_name} LIMIT 1").fetchone()
+        for (col, col_type), stats_text in zip(column_types.items(), stats_row):
+            min_max = re.search(r"\[Min: (.*?), Max: (.*?)\]", stats_text)
+            nulls = re.search(r"Has Null: (true|false), Has No Null: (true|false)", stats_text)
+            comparable = min_max is not None and parse_stats_value("0", col_type) is not None
+            columns[col] = {
+                "type": col_type,
+                "has_null": nulls.group(1) == "true" if nulls else None,
+                "has_no_null": nulls.group(2) == "true" if nulls else None,
+                "min": parse_stats_value(min_max.group(1), col_type) if comparable else None,
+                "max": parse_stats_value(min_max.group(2), col_type) if comparable else None,
+            }
+    return {"num_rows": num_rows, "columns": columns}
+
+
+def compare_table_stats(parquet_stats, table_stats):
+    """
+    Compare Parquet footer statistics with DuckDB table statistics for the columns both have.
+
+    Returns:
+        list: Mismatch descriptions (empty when everything matches)
+    """
+    mismatches = []
+    num_rows = parquet_stats["num_rows"]
+    if num_rows != table_stats["num_rows"]:
+        mismatches.append(f"row count: Parquet {num_rows}, table {table_stats['num_rows']}")
+    for col, table_col in table_stats["columns"].items():
+        parquet_col = parquet_stats["columns"].get(col)
+        if parquet_col is None:
+            continue
+        null_count = parquet_col["null_count"]
+        if null_count is not None and table_col["has_null"] is not None:
+            if (null_count > 0) != table_col["has_null"] or (null_count < num_rows) != table_col["has_no_null"]:
+                mismatches.append(f"{col} nulls: Parquet {null_count} of {num_rows} null, table has_null="
+                                  f"{table_col['has_null']} has_no_null={table_col['has_no_null']}")
+        if table_col["min"] is not None and parquet_col["min"] is not None:
+            if (parquet_col["min"], parquet_col["max"]) != (table_col["min"], table_col["max"]):
+                mismatches.append(f"{col} min/max: Parquet ({parquet_col['min']}, {parquet_col['max']}), "
+                                  f"table ({table_col['min']}, {table_col['max']})")
+    return mismatches
+
+
+def select_checksum_row_groups(row_groups, checksum_row_groups):
+    """Pick the row groups to checksum: all of them, or n spread evenly from the first to the last."""
+    if checksum_row_groups == "all" or checksum_row_groups >= len(row_groups):
+        return list(range(len(row_groups)))
+    if checksum_row_groups <= 1:
+        return [len(row_groups) - 1]
+    step = (len(row_groups) - 1) / (checksum_row_groups - 1)
+    return sorted({round(i * step) for i in range(checksum_row_groups)})
+
+
+def compare_row_group_checksums(con, table_name: str, parquet_stats, checksum_row_groups):
+    """
+    Compare an order-independent hash sum of sampled Parquet row groups with the same rows of the table.
+
+    The table's rows are matched by rowid, so this assumes the table holds the files' rows in scan order
+    (as a CREATE TABLE AS SELECT from the Parquet path does) and nothing was deleted since.
+
+    Returns:
+        tuple: (indexes of the row groups checked, list of mismatch descriptions)
+    """
+    row_groups = parquet_stats["row_groups"]
+    if not row_groups:
+        return [], []
+    table_columns = {col for col, *_ in con.execute(f"DESCRIBE {table_name}").fetchall()}
+    file_columns = [col for col, *_ in con.execute(f"DESCRIBE SELECT * FROM read_parquet(?)",
+                                                   [row_groups[0][0]]).fetchall()]
+    hash_columns = ", ".join(f'"{col}"' for col in file_columns if col in table_columns)
+
+    # First row of every row group in the file and in the whole dataset
+    offsets, file_offset, table_offset, previous_file = [], 0, 0, None
+    for file_path, _rg_index, num_rows in row_groups:
+        if file_path != previous_file:
+            file_offset, previous_file = 0, file_path
+        offsets.append((file_offset, table_offset))
+        file_offset += num_rows
+        table_offset += num_rows
+
+    checked = select_checksum_row_groups(row_groups, checksum_row_groups)
+    mismatches = []
+    for index in checked:
+        file_path, rg_index, num_rows = row_groups[index]
+        file_start, table_start = offsets[index]
+        parquet_checksum = con.execute(f"""
+            SELECT COUNT(*), SUM(hash({hash_columns})::HUGEINT)
+            FROM read_parquet(?, file_row_number = true)
+            WHERE file_row_number >= ? AND file_row_number < ?
+        """, [file_path, file_start, file_start + num_rows]).fetchone()
+        table_checksum = con.execute(f"""
+            SELECT COUNT(*), SUM(hash({hash_columns})::HUGEINT)
+            FROM {table_name}
+            WHERE rowid >= ? AND rowid < ?
+        """, [table_start, table_start + num_rows]).fetchone()
+        if parquet_checksum != table_checksum:
+            mismatches.append(f"row group {rg_index} of {file_path} (table rows {table_start}-"
+                              f"{table_start + num_rows - 1}): checksum differs")
+    return checked, mismatches
+
+
+def validate_table_metadata(con, table_name: str, parquet_path: str, checksum_row_groups=None):
+    """
+    Validate a table loaded from Parquet using metadata instead of scanning both sides.
+
+    Row counts, null counts and min/max from the Parquet footers are compared with the row count and
+    column statistics DuckDB keeps for the table. This catches truncated or partial loads and most
+    value corruption in milliseconds. checksum_row_groups additionally compares a hash of the
+    content of n sampled row groups (or "all") with the same rows in the table.
+
+    Args:
+        con: DuckDB connection object
+        table_name (str): Loaded table
+        parquet_path (str): Parquet file, dataset directory or glob the table was loaded from
+        checksum_row_groups: None (metadata only), number of row groups to checksum or "all"
+
+    Returns:
+        dict: valid (bool), parquet_rows, table_rows, mismatches, checked_row_groups and seconds
+    """
+    start_time = time.time()
+    parquet_stats = read_parquet_footer_stats(parquet_path)
+    table_stats = read_duckdb_table_stats(con, table_name)
+    mismatches = compare_table_stats(parquet_stats, table_stats)
+
+    checked = []
+    # Row matching by rowid only makes sense when the row counts agree
+    if checksum_row_groups and parquet_stats["num_rows"] == table_stats["num_rows"]:
+        checked, checksum_mismatches = compare_row_group_checksums(con, table_name, parquet_stats,
+                                                                   checksum_row_groups)
+        mismatches.extend(checksum_mismatches)
+
+    report = {
+        "valid": not mismatches,
+        "parquet_rows": parquet_stats["num_rows"],
+        "table_rows": table_stats["num_rows"],
+        "mismatches": mismatches,
+        "checked_row_groups": len(checked),
+        "seconds": round(time.time() - start_time, 4),
+    }
+    if report["valid"]:
+        print(f"✔ '{table_name}' matches the Parquet metadata ({report['table_rows']} rows, "
+              f"{len(checked)} row group checksum(s)) in {report['seconds'] * 1000:.1f} ms.")
+    else:
+        print(f"✘ '{table_name}' does not match the Parquet metadata:")
+        for mismatch in mismatches:
+            print(f"    {mismatch}")
+    return report
+
+""" EXAMPLE USAGE
+from utils.table_validation import validate_table_metadata
+
+con = connect_to_duckdb("./data/output/amazon_sales_db.duckDB")
+validate_table_metadata(con, "amazon_reviews", "./data/output/amazon_reviews_df_cleaned.parquet")
+# Also compare the content of 8 row groups spread over the file
+validate_table_metadata(con, "amazon_reviews", "./data/output/amazon_reviews_df_cleaned.parquet", checksum_row_groups=8)
+con.close() """
@@ -1,33 +1,225 @@
-import pandas as pd
-import duckdb
+import os
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import Workbook
+from .duckdb_session import connect_to_duckdb
+from .profiling import measure_peak_memory
 
+# Excel's row limit per sheet is 1,048,576 including the header row
+EXCEL_MAX_DATA_ROWS = 1_048_575
+# Excel's character limit per cell
+EXCEL_MAX_CELL_CHARS = 32_767
 
-def export_table_to_excel(db_path, table_name, excel_output_path="./data/output"):
+
+def build_excel_select(con, table_name):
+    """
+    Returns a SELECT on the table that makes every value writable to a cell.
+
+    Nested values (lists, structs, maps) are rendered as text, strings are stripped of the control
+    characters XLSX cannot store and cut at Excel's cell limit, and time zones are dropped.
+    """
+    select_exprs = []
+    for col, col_type, *_ in con.execute(f"DESCRIBE {table_name}").fetchall():
+        col_type = col_type.upper()
+        if col_type.endswith("]") or col_type.startswith(("STRUCT", "MAP", "UNION")):
+            expr = f'CAST("{col}" AS VARCHAR)'
+        elif col_type == "TIMESTAMP WITH TIME ZONE":
+            select_exprs.append(f'CAST("{col}" AS TIMESTAMP) AS "{col}"')
+            continue
+        elif col_type == "VARCHAR":
+            expr = f'"{col}"'
+        else:
+            select_exprs.append(f'"{col}"')
+            continue
+        select_exprs.append(
+            f"left(regexp_replace({expr}, '[\\x00-\\x08\\x0b\\x0c\\x0e-\\x1f]', '', 'g'), {EXCEL_MAX_CELL_CHARS}) AS \"{col}\""
+        )
+    return f"SELECT {', '.join(select_exprs)} FROM {table_name}"
+
+
+def write_batches_to_xlsx(reader, excel_path: str, sheet_name: str, max_rows_per_sheet: int = EXCEL_MAX_DATA_ROWS,
+                          split: str = "sheets"):
+    """
+    Write Arrow record batches to one or more XLSX files with a write-only (streaming) workbook.
+
+    When a sheet reaches max_rows_per_sheet a new sheet is started (split="sheets") or a new
+    file '<name>_part<n>.xlsx' (split="files"). Files are written to a temporary path and renamed
+    when complete.
+
+    Args:
+        reader: pyarrow RecordBatchReader
+        excel_path (str): Path of the first XLSX file
+        sheet_name (str): Base name of the sheets
+        max_rows_per_sheet (int): Data rows per sheet (the header row comes on top)
+        split (str): "sheets" or "files"
+
+    Returns:
+        list: Paths of the XLSX files written
+    """
+    if split not in ("sheets", "files"):
+        raise ValueError("split must be 'sheets' or 'files'")
+    header = reader.schema.names
+    base_path, extension = os.path.splitext(excel_path)
+    written_files = []
+    workbook = sheet = None
+    sheet_number = 0
+    rows_in_sheet = max_rows_per_sheet  # forces a new sheet for the first row
+
+    def save_workbook():
+        tmp_path = written_files[-1] + ".tmp"
+        workbook.save(tmp_path)
+        os.replace(tmp_path, written_files[-1])
+
+    def new_sheet():
+        nonlocal workbook, sheet, sheet_number
+        if workbook is None or split == "files":
+            if workbook is not None:
+                save_workbook()
+            workbook = Workbook(write_only=True)
+            file_number = len(written_files) + 1
+            written_files.append(excel_path if file_number == 1 else f"{base_path}_part{file_number}{extension}")
+            sheet_number = 0
+        sheet_number += 1
+        # Sheet names are limited to 31 characters
+        title = sheet_name[:31] if sheet_number == 1 else f"{sheet_name[:25]}_{sheet_number}"
+        sheet = workbook.create_sheet(title)
+        sheet.append(header)
+
+    for batch in reader:
+        columns = [column.to_pylist() for column in batch.columns]
+        offset = 0
+        while offset < batch.num_rows:
+            if rows_in_sheet >= max_rows_per_sheet:
+                new_sheet()
+                rows_in_sheet = 0
+            stop = min(batch.num_rows, offset + max_rows_per_sheet - rows_in_sheet)
+            for row in zip(*(column[offset:stop] for column in columns)):
+                sheet.append(row)
+            rows_in_sheet += stop - offset
+            offset = stop
+
+    # An empty table still gets a file with the header
+    if workbook is None:
+        new_sheet()
+    save_workbook()
+    return written_files
+
+
+def export_table_to_excel(
+    db_path,
+    table_name,
+    excel_output_path="./data/output",
+    output_format="xlsx",
+    batch_size=100_000,
+    max_rows_per_sheet=EXCEL_MAX_DATA_ROWS,
+    split="sheets"
+):
     """
-    Export a DuckDB table to Excel if it has 1 million rows or fewer.
-    Otherwise, prints a message that it's too large.
-    
+    Export a DuckDB table to Excel, streaming it in Arrow batches so memory does not grow with the table.
+
+    Tables above Excel's row limit are split across sheets (or files with split="files").
+    output_format="csv" or "parquet" writes the table with DuckDB's COPY instead, which is much faster.
+
     Parameters:
         db_path (str): Path to the DuckDB database file
         table_name: Name of the table to export
         excel_output_path: Folder for the excel
+        output_format (str): "xlsx", "csv" or "parquet"
+        batch_size (int): Rows fetched from DuckDB per batch
+        max_rows_per_sheet (int): Data rows per sheet before a new sheet/file is started
+        split (str): Split large tables across "sheets" or "files"
+
+    Returns:
+        list: Paths of the files written
     """
-    con = duckdb.connect(db_path)
+    if output_format not in ("xlsx", "csv", "parquet"):
+        raise ValueError("output_format must be 'xlsx', 'csv' or 'parquet'")
+    output_file = f"{excel_output_path}{table_name}.{output_format}"
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+
+    con = connect_to_duckdb(db_path)
     # Count rows in the table
     row_count = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
 
-    if row_count <= 1_000_000:
-        # Fetch data to pandas
-        df = con.execute(f"SELECT * FROM {table_name}").df()
-        excel_file = f"{excel_output_path}{table_name}.xlsx"
+    try:
+        if output_format == "xlsx":
+            reader = con.execute(build_excel_select(con, table_name)).fetch_record_batch(batch_size)
+            written_files = write_batches_to_xlsx(reader, output_file, table_name, max_rows_per_sheet, split)
+        else:
+            copy_options = "FORMAT csv, HEADER" if output_format == "csv" else "FORMAT parquet, COMPRESSION zstd"
+            tmp_path = output_file + ".tmp"
+            con.execute(f"COPY {table_name} TO '{tmp_path}' ({copy_options})")
+            os.replace(tmp_path, output_file)
+            written_files = [output_file]
+    finally:
         # Close connection
         con.close()
-        df.to_excel(excel_file, index=False)
-        print(f"Table '{table_name}' exported to Excel: {excel_file} ({row_count} rows)")
-    else:
-        print(f"Table '{table_name}' has {row_count} rows. Records are more than a million. Cannot be written to Excel.")
+
+    print(f"Table '{table_name}' exported to {output_format}: {', '.join(written_files)} ({row_count} rows)")
+    return written_files
+
+
+def create_export_sample_table(db_path: str, table_name: str, num_rows: int):
+    """Create a table shaped like product_url_table (id, count, name, url) with num_rows rows."""
+    con = connect_to_duckdb(db_path)
+    con.execute(f"""
+        CREATE OR REPLACE TABLE {table_name} AS
+        SELECT
+            'B' || lpad(CAST(i AS VARCHAR), 9, '0') AS Product_ID,
+            CAST(hash(i) % 5000 AS BIGINT) AS count,
+            'Stanley Quencher H2.0 Tumbler with Handle and Straw 30 oz ' || i AS Product_Name,
+            'https://www.amazon.ca/dp/B' || lpad(CAST(i AS VARCHAR), 9, '0') AS URL
+        FROM range({num_rows}) t(i)
+    """)
+    con.close()
+
+
+def measure_export(db_path: str, table_name: str, output_dir: str, output_format: str):
+    """Export one table in one format and return its runtime, peak RSS and output size."""
+    files, seconds, peak_rss = measure_peak_memory(export_table_to_excel, db_path, table_name, output_dir,
+                                                   output_format=output_format)
+    return {
+        "seconds": round(seconds, 2),
+        "peak_rss_mb": round(peak_rss / 1024**2, 1),
+        "files": len(files),
+        "output_mb": round(sum(os.path.getsize(f) for f in files) / 1024**2, 1),
+    }
+
+
+def benchmark_table_export(output_dir: str = "./data/benchmark/export/", row_counts=(100_000, 5_000_000),
+                           formats=("xlsx", "csv", "parquet")):
+    """
+    Report export time and peak memory for tables of the given sizes in every format.
+
+    Each export runs in its own worker process so peak RSS is per export.
+
+    Args:
+        output_dir (str): Folder for the sample database and the exported files
+        row_counts (tuple): Sizes of the sample tables
+        formats (tuple): Output formats to compare
+
+    Returns:
+        dict: (rows, format) -> {"seconds", "peak_rss_mb", "files", "output_mb"}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    db_path = os.path.join(output_dir, "export_benchmark.duckdb")
+    report = {}
+    for num_rows in row_counts:
+        table_name = f"export_sample_{num_rows}"
+        create_export_sample_table(db_path, table_name, num_rows)
+        for output_format in formats:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                report[(num_rows, output_format)] = pool.submit(
+                    measure_export, db_path, table_name, output_dir, output_format).result()
+
+    for (num_rows, output_format), stats in report.items():
+        print(f"{num_rows:>10} rows {output_format:<8} {stats['seconds']:>8} s {stats['peak_rss_mb']:>8} MiB peak RSS "
+              f"{stats['files']:>3} file(s) {stats['output_mb']:>8} MiB")
+    return report
 
 # EXAMPLE USAGE
 # db_path = 'data/db/sales_database.duckdb'
 # table_name = "products_table"
-# export_table_to_excel(db_path, table_name)
\ No newline at end of file
+# export_table_to_excel(db_path, table_name)
+# export_table_to_excel(db_path, "amazon_reviews", "./data/output/", split="files")
+# export_table_to_excel(db_path, "amazon_reviews", "./data/output/", output_format="parquet")
+# benchmark_table_export()